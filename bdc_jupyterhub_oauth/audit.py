@@ -0,0 +1,174 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth audit log of the authentication decisions.
+
+The records are queued without blocking the event loop and written in batches,
+in a thread, by a sink: an object with ``write(records)``, such as
+``RotatingJSONLinesSink``.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import logging.handlers
+from collections import deque
+
+from tornado.ioloop import IOLoop
+
+_upstream_timings = contextvars.ContextVar("bdc_oauth_upstream_timings", default=None)
+
+
+def collect_upstream_timings():
+    """Collect the upstream request durations of the current task (and its child tasks).
+
+    Returns:
+        dict: Dict filled with the seconds spent in each endpoint.
+    """
+    timings = {}
+    _upstream_timings.set(timings)
+    return timings
+
+
+def record_upstream_timing(endpoint, seconds):
+    """Add the duration of an upstream request to the collected timings, if any."""
+    timings = _upstream_timings.get()
+    if timings is not None:
+        timings[str(endpoint)] = timings.get(str(endpoint), 0.0) + seconds
+
+
+class RotatingJSONLinesSink:
+    """Write the audit records as JSON lines, rotating the file by size.
+
+    Args:
+        path (str): File path.
+
+        max_bytes (int): Size of the file that triggers the rotation. Use 0 to never rotate.
+
+        backup_count (int): Number of rotated files kept (``path.1``, ``path.2``, ...).
+    """
+
+    def __init__(self, path, max_bytes=10 * 2 ** 20, backup_count=5):
+        """Open the file for appending."""
+        self.path = path
+        self._handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf8"
+        )
+
+    def write(self, records):
+        """Append the records."""
+        for record in records:
+            line = json.dumps(record, default=str)
+            self._handler.handle(logging.makeLogRecord(dict(msg=line)))
+        self._handler.flush()
+
+    def close(self):
+        """Close the file."""
+        self._handler.close()
+
+
+class AuditLog:
+    """Queue the audit records and write them in batches, in background.
+
+    ``record`` never blocks: the records are written by the sink in a thread, every
+    ``flush_interval`` seconds or as soon as ``batch_size`` records are queued. When
+    more than ``max_queue`` records are waiting, the new ones are dropped and counted.
+
+    Args:
+        sink: Object with ``write(records)``, called with a list of records (dicts).
+
+        batch_size (int): Maximum number of records of each write.
+
+        flush_interval (float): Maximum seconds a record waits to be written.
+
+        max_queue (int): Maximum number of queued records.
+
+        log (logging.Logger): Logger for the sink errors.
+
+        on_drop (Callable): Called with the number of records dropped, because the queue
+                            is full or the sink failed, e.g. to count them in a metric.
+    """
+
+    def __init__(
+        self, sink, batch_size=100, flush_interval=1, max_queue=10000, log=None, on_drop=None
+    ):
+        """Build an idle audit log, that starts with the first record."""
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.log = log or logging.getLogger(__name__)
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._pending = deque()
+        self._full = None
+        self._task = None
+
+    def __len__(self):
+        """Return the number of queued records."""
+        return len(self._pending)
+
+    def record(self, entry):
+        """Queue a record.
+
+        Args:
+            entry (dict): The record.
+
+        Returns:
+            bool: False if the record was dropped because the queue is full.
+        """
+        if len(self._pending) >= self.max_queue:
+            self._drop(1)
+            return False
+
+        self._pending.append(entry)
+
+        if self._task is None or self._task.done():
+            self._full = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+        elif len(self._pending) >= self.batch_size:
+            self._full.set()
+        return True
+
+    async def _run(self):
+        """Write the queued records until the queue is empty."""
+        while self._pending:
+            if len(self._pending) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write all the queued records now."""
+        while self._pending:
+            batch = [
+                self._pending.popleft()
+                for _ in range(min(self.batch_size, len(self._pending)))
+            ]
+            try:
+                await IOLoop.current().run_in_executor(None, self.sink.write, batch)
+            except Exception as e:
+                self._drop(len(batch))
+                self.log.error(f"Could not write {len(batch)} audit records: {e}")
+
+    def _drop(self, count):
+        """Count dropped records."""
+        self.dropped += count
+        if self.on_drop is not None:
+            self.on_drop(count)
+
+    async def close(self):
+        """Write the queued records and wait for the background writer."""
+        await self.flush()
+        if self._task is not None:
+            self._full.set()
+            await self._task
@@ -0,0 +1,120 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth Cache."""
+
+import hashlib
+import time
+from collections import OrderedDict
+
+
+def token_cache_key(token):
+    """Build a cache key from a token, so the raw token is never kept in memory as a key.
+
+    Args:
+        token (str): Access token.
+
+    Returns:
+        str: SHA-256 hex digest of the token.
+    """
+    return hashlib.sha256(token.encode("utf8")).hexdigest()
+
+
+class TTLCache:
+    """Memory bounded cache with time-to-live and least recently used eviction.
+
+    Args:
+        maxsize (int): Maximum number of entries. The least recently used entry is
+                       evicted when the cache is full.
+
+        ttl (float): Default time-to-live of the entries, in seconds.
+                     A ``ttl`` lower or equal than zero disables the cache.
+
+        timer (Callable): Clock used to expire the entries.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, timer=time.monotonic):
+        """Build an empty cache."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        """Return the number of entries, including the expired ones not yet evicted."""
+        return len(self._data)
+
+    @property
+    def enabled(self):
+        """Check if the cache stores anything at all."""
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, key, default=None):
+        """Retrieve a value from cache.
+
+        Args:
+            key (Hashable): Entry key.
+
+            default (Any): Value returned when the key is missing or expired.
+
+        Returns:
+            Any: The cached value or ``default``.
+        """
+        entry = self._data.get(key)
+
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > self.timer():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        """Store a value in cache.
+
+        Args:
+            key (Hashable): Entry key.
+
+            value (Any): Value to be stored.
+
+            ttl (float): Time-to-live of this entry, capped by the cache ``ttl``.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if not self.enabled or ttl <= 0:
+            return
+
+        self._data[key] = (self.timer() + ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove an entry from cache and return its value, expired or not."""
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        """Remove all the entries and reset the counters."""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Return the cache counters.
+
+        Returns:
+            dict: Dict with ``hits``, ``misses`` and ``size`` of the cache.
+        """
+        return dict(hits=self.hits, misses=self.misses, size=len(self._data))
@@ -0,0 +1,185 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth Concurrency helpers."""
+
+import asyncio
+import math
+import time
+
+from tornado import web
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share the same key into one in-flight call.
+
+    The first caller for a given key starts the coroutine; every caller that
+    arrives while it is still running awaits the very same result (or exception).
+    Once the call finishes the key is released, so the next call starts a new one.
+    """
+
+    def __init__(self):
+        """Build an empty single-flight group."""
+        self._calls = {}
+
+    def __len__(self):
+        """Return the number of calls currently in flight."""
+        return len(self._calls)
+
+    def __contains__(self, key):
+        """Check if there is a call in flight for the given key."""
+        return key in self._calls
+
+    async def do(self, key, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` once for all the concurrent callers of ``key``.
+
+        Args:
+            key (Hashable): Key that identifies the call.
+
+            fn (Callable): Coroutine function to be called.
+
+        Returns:
+            Any: The value returned by ``fn``.
+        """
+        future = self._calls.get(key)
+
+        if future is None:
+            future = asyncio.ensure_future(fn(*args, **kwargs))
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+
+        # a cancelled caller must not cancel the call shared with the others.
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        """Release the key once its call is done."""
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+
+class AdmissionRejected(web.HTTPError):
+    """The request was not admitted in time, the client should retry shortly.
+
+    JupyterHub sends the ``headers`` of the error, so the response carries ``Retry-After``.
+    """
+
+    def __init__(self, retry_after):
+        """Build the error with the seconds the client should wait before retrying."""
+        super().__init__(503, "Too many authentication requests, please retry shortly")
+        self.retry_after = retry_after
+        self.headers = {"Retry-After": str(max(1, math.ceil(retry_after)))}
+
+
+class AdmissionController:
+    """Bound the concurrency and the rate of the requests, with a bounded wait.
+
+    A request is admitted after it gets a token of the token bucket, refilled at
+    ``rate`` tokens per second up to ``burst`` tokens, and a slot among the
+    ``max_concurrency`` slots. Tokens are reserved in arrival order, so the waits
+    are fair. Requests that would wait more than ``max_wait`` seconds are rejected
+    with ``AdmissionRejected``.
+
+    Args:
+        max_concurrency (int): Maximum number of admitted requests at a time. Use 0 for no limit.
+
+        rate (float): Requests admitted per second, on average. Use 0 for no limit.
+
+        burst (int): Requests admitted at once after an idle period.
+
+        max_wait (float): Maximum seconds a request waits to be admitted.
+
+        timer (Callable): Monotonic clock.
+    """
+
+    def __init__(self, max_concurrency=0, rate=0, burst=1, max_wait=5, timer=time.monotonic):
+        """Build the controller, with a full token bucket."""
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        self.timer = timer
+        self.waiting = 0
+        self._tokens = self.burst
+        self._updated_at = timer()
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+
+    def __len__(self):
+        """Return the number of requests waiting to be admitted."""
+        return self.waiting
+
+    def _refill(self):
+        """Add the tokens earned since the last update to the bucket, returning the current time."""
+        now = self.timer()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        return now
+
+    def _reserve_token(self, deadline):
+        """Reserve a token of the bucket, returning the seconds to wait for it."""
+        now = self._refill()
+
+        delay = (1 - self._tokens) / self.rate if self._tokens < 1 else 0
+        if now + delay > deadline:
+            raise AdmissionRejected(delay)
+
+        self._tokens -= 1
+        return delay
+
+    async def acquire(self):
+        """Wait until the request is admitted.
+
+        Raises:
+            AdmissionRejected: When the request is not admitted in ``max_wait`` seconds.
+        """
+        deadline = self.timer() + self.max_wait
+        self.waiting += 1
+        try:
+            if self.rate > 0:
+                delay = self._reserve_token(deadline)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            if self._semaphore is None:
+                return
+
+            if not self._semaphore.locked():
+                await self._semaphore.acquire()
+                return
+
+            try:
+                await asyncio.wait_for(
+                    self._semaphore.acquire(), max(0, deadline - self.timer())
+                )
+            except asyncio.TimeoutError:
+                raise AdmissionRejected(self.max_wait) from None
+        finally:
+            self.waiting -= 1
+
+    async def try_acquire(self):
+        """Admit the request only if it does not have to wait, e.g. for optional requests.
+
+        Returns:
+            bool: True if the request was admitted, its slot must be released.
+        """
+        if self.waiting or (self._semaphore is not None and self._semaphore.locked()):
+            return False
+
+        if self.rate > 0:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+        return True
+
+    def release(self):
+        """Release the slot of an admitted request."""
+        if self._semaphore is not None:
+            self._semaphore.release()
@@ -0,0 +1,132 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth OpenID Connect Discovery."""
+
+import json
+import logging
+import os
+import time
+
+from tornado.ioloop import IOLoop, PeriodicCallback
+
+#: Authenticator traits filled from the keys of the OpenID Connect discovery document.
+DISCOVERY_ENDPOINTS = {
+    "authorize_url": "authorization_endpoint",
+    "token_url": "token_endpoint",
+    "userdata_url": "userinfo_endpoint",
+    "jwks_url": "jwks_uri",
+    "introspection_url": "introspection_endpoint",
+    "oauth_issuer": "issuer",
+}
+
+
+class OIDCDiscovery:
+    """OpenID Connect discovery document, cached in memory and on disk.
+
+    The disk cache is read synchronously, so a restarted hub starts with the last
+    known endpoints, while the document is fetched again in background. A failed
+    fetch keeps the previous document.
+
+    Args:
+        fetch (Callable): Coroutine function that returns the discovery document (dict).
+
+        cache_path (str): File to keep the document across restarts. Empty disables the disk cache.
+
+        ttl (float): Seconds the document is considered fresh.
+
+        on_update (Callable): Called with the document every time it is loaded or fetched.
+
+        log (logging.Logger): Logger for the fetch errors.
+    """
+
+    def __init__(self, fetch, cache_path="", ttl=86400, on_update=None, log=None):
+        """Build the discovery, without any document."""
+        self.fetch = fetch
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.on_update = on_update
+        self.log = log or logging.getLogger(__name__)
+        self.document = None
+        self.fetched_at = None
+        self._periodic = None
+
+    @property
+    def stale(self):
+        """Check if the document must be fetched again."""
+        return self.fetched_at is None or time.time() - self.fetched_at >= self.ttl
+
+    def _update(self, document, fetched_at):
+        """Keep the document in memory and notify the listener."""
+        self.document = document
+        self.fetched_at = fetched_at
+        if self.on_update is not None:
+            self.on_update(document)
+
+    def load_cached(self):
+        """Load the document from the disk cache, even if it is stale.
+
+        Returns:
+            Union[None, dict]: The cached document, or None if there is no valid cache.
+        """
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+
+        try:
+            with open(self.cache_path) as fp:
+                cached = json.load(fp)
+            self._update(cached["document"], cached["fetched_at"])
+        except (OSError, ValueError, KeyError) as e:
+            self.log.warning(f"Ignoring the discovery cache {self.cache_path}: {e}")
+            return None
+
+        return self.document
+
+    def _store_cached(self):
+        """Write the document to the disk cache, atomically."""
+        if not self.cache_path:
+            return
+
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w") as fp:
+                json.dump(dict(document=self.document, fetched_at=self.fetched_at), fp)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            self.log.warning(f"Could not write the discovery cache {self.cache_path}: {e}")
+
+    async def refresh(self):
+        """Fetch the document, keeping the previous one when the fetch fails.
+
+        Returns:
+            bool: True if the document was fetched.
+        """
+        try:
+            document = await self.fetch()
+        except Exception as e:
+            self.log.warning(f"Could not fetch the OpenID Connect discovery document: {e}")
+            return False
+
+        self._update(document, time.time())
+        self._store_cached()
+        return True
+
+    def start(self):
+        """Fetch the document in background now, if stale, and then every ``ttl`` seconds."""
+        if self.stale:
+            IOLoop.current().add_callback(self.refresh)
+
+        if self._periodic is None:
+            self._periodic = PeriodicCallback(self.refresh, self.ttl * 1000)
+            self._periodic.start()
+
+    def stop(self):
+        """Stop the background refresh."""
+        if self._periodic is not None:
+            self._periodic.stop()
+            self._periodic = None
@@ -0,0 +1,70 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth group synchronization."""
+
+from jupyterhub import orm
+from sqlalchemy.orm import object_session
+
+
+def role_group_names(roles, prefix, synced_roles=None):
+    """Map application roles to JupyterHub group names.
+
+    Args:
+        roles (Iterable[str]): Role names, without the application prefix.
+        prefix (str): Prefix of the managed group names.
+        synced_roles (Iterable[str]): Roles mapped to groups. Empty maps every role.
+
+    Returns:
+        frozenset: Group names.
+
+    Example:
+        role_group_names({'admin', 'user'}, 'bdc-') -> {'bdc-admin', 'bdc-user'}
+    """
+    if synced_roles:
+        roles = set(roles) & set(synced_roles)
+    return frozenset(f"{prefix}{role}" for role in roles)
+
+
+def sync_user_groups(user, group_names, prefix):
+    """Make the managed groups of a user match the given group names.
+
+    Only the groups starting with ``prefix`` are managed, the other groups of the
+    user are never touched. Nothing is written when the groups did not change.
+
+    Args:
+        user (Union[jupyterhub.user.User, jupyterhub.orm.User]): The user.
+        group_names (Iterable[str]): Managed groups the user must belong to.
+        prefix (str): Prefix of the managed group names.
+
+    Returns:
+        tuple: The sets of added and removed group names.
+    """
+    orm_user = getattr(user, "orm_user", user)
+
+    current = {group.name for group in orm_user.groups if group.name.startswith(prefix)}
+    wanted = set(group_names)
+
+    added, removed = wanted - current, current - wanted
+    if not added and not removed:
+        return added, removed
+
+    db = object_session(orm_user)
+
+    for name in sorted(added):
+        group = orm.Group.find(db, name)
+        if group is None:
+            group = orm.Group(name=name)
+            db.add(group)
+        orm_user.groups.append(group)
+
+    for group in [group for group in orm_user.groups if group.name in removed]:
+        orm_user.groups.remove(group)
+
+    db.commit()
+    return added, removed
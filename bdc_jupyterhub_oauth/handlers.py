@@ -0,0 +1,53 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth hub handlers."""
+
+import json
+
+from jupyterhub.apihandlers.base import APIHandler
+from jupyterhub.user import User
+from oauthenticator.oauth2 import OAuthLogoutHandler
+from tornado import web
+
+#: Path of the access token broker, relative to the hub API (``/hub/api/bdc/token``).
+ACCESS_TOKEN_PATH = "bdc/token"
+
+
+class AccessTokenHandler(APIHandler):
+    """Give the authenticated user a fresh Brazil Data Cube access token.
+
+    The single-user servers and kernels call it with their JupyterHub API token
+    (``JUPYTERHUB_API_TOKEN``), instead of authenticating with the Brazil Data Cube
+    OAuth on their own. The token comes from the user auth state and it is refreshed
+    by the authenticator, once per user, when it is about to expire.
+    """
+
+    async def get(self):
+        """Return the access token of the current user."""
+        user = self.current_user
+        if not isinstance(user, User):
+            raise web.HTTPError(403, "Only users have Brazil Data Cube access tokens")
+
+        token = await self.authenticator.get_access_token(user)
+        if token is None:
+            raise web.HTTPError(403, f"{user.name} must login again to get an access token")
+
+        self.set_header("Cache-Control", "no-store")
+        self.write(json.dumps(token))
+
+
+class LogoutHandler(OAuthLogoutHandler):
+    """Logout the user and stop refreshing its tokens in background."""
+
+    async def default_handle_logout(self):
+        """Logout the current user, forgetting it in the authenticator."""
+        user = self.current_user
+        await super().default_handle_logout()
+        if user:
+            self.authenticator.forget_user(user.name)
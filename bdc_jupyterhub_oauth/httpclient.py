@@ -0,0 +1,233 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth HTTP Client."""
+
+import asyncio
+import random
+import time
+
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+from tornado.simple_httpclient import SimpleAsyncHTTPClient
+
+try:
+    from tornado.curl_httpclient import CurlAsyncHTTPClient
+except ImportError:  # pycurl is not installed
+    CurlAsyncHTTPClient = None
+
+HTTP_CLIENT_KINDS = ("auto", "curl", "simple", "default")
+
+
+def build_http_client(kind="auto", max_clients=64):
+    """Build the HTTP client used to talk with the Brazil Data Cube OAuth 2.0 service.
+
+    Args:
+        kind (str): Which client should be used:
+
+            - ``curl``: a dedicated pool of ``CurlAsyncHTTPClient``, that keeps the connections alive;
+            - ``simple``: a dedicated pool of ``SimpleAsyncHTTPClient``;
+            - ``default``: the ``AsyncHTTPClient`` configured in tornado, shared by the whole hub;
+            - ``auto``: ``curl`` when pycurl is installed, ``default`` otherwise.
+
+        max_clients (int): Maximum number of concurrent requests. Pending requests are queued.
+
+    Returns:
+        tornado.httpclient.AsyncHTTPClient: The HTTP client.
+
+    Raises:
+        ValueError: When the kind is unknown or curl was requested without pycurl.
+    """
+    if kind not in HTTP_CLIENT_KINDS:
+        raise ValueError(f"Invalid HTTP client {kind}, expected one of {HTTP_CLIENT_KINDS}")
+
+    if kind == "auto":
+        kind = "default" if CurlAsyncHTTPClient is None else "curl"
+
+    if kind == "curl":
+        if CurlAsyncHTTPClient is None:
+            raise ValueError("The curl HTTP client requires pycurl")
+        return CurlAsyncHTTPClient(force_instance=True, max_clients=max_clients)
+
+    if kind == "simple":
+        return SimpleAsyncHTTPClient(force_instance=True, max_clients=max_clients)
+
+    # max_clients only applies when the shared instance does not exist yet.
+    return AsyncHTTPClient(max_clients=max_clients)
+
+
+#: Status codes of responses that may succeed if the request is sent again.
+RETRIABLE_STATUS_CODES = frozenset([429, 502, 503, 504, 599])
+
+
+class CircuitOpenError(HTTPClientError):
+    """The Brazil Data Cube OAuth 2.0 service is considered down and was not requested."""
+
+    def __init__(self, retry_after):
+        """Build the error with the seconds left until the next attempt."""
+        super().__init__(503, f"Circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def is_retriable(error):
+    """Check if a request that failed with the given error may be sent again.
+
+    Args:
+        error (Exception): Error raised by the HTTP client.
+
+    Returns:
+        bool: True for network errors, timeouts and overloaded (5xx) responses.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, HTTPClientError):
+        return error.code in RETRIABLE_STATUS_CODES
+    return isinstance(error, OSError)
+
+
+def is_service_failure(error):
+    """Check if a request failed because the OAuth 2.0 service is unavailable.
+
+    Unlike ``is_retriable``, it includes every 5xx response, e.g. a 500 that is not safe
+    to send again but still shows that the service is broken.
+
+    Args:
+        error (Exception): Error raised by the HTTP client.
+
+    Returns:
+        bool: True for network errors, timeouts, throttling and 5xx responses.
+    """
+    if isinstance(error, HTTPClientError):
+        return error.code >= 500 or error.code in RETRIABLE_STATUS_CODES
+    return isinstance(error, OSError)
+
+
+def backoff_delays(retries, base=0.1, cap=2.0):
+    """Yield the waiting time before each retry, with exponential backoff and full jitter.
+
+    Args:
+        retries (int): Number of retries.
+
+        base (float): Waiting time before the first retry, in seconds.
+
+        cap (float): Maximum waiting time, in seconds.
+
+    Yields:
+        float: Seconds to wait before the retry.
+    """
+    for attempt in range(retries):
+        yield random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def hedged(fn, delay, duplicate=None):
+    """Call ``fn`` and, if it takes longer than ``delay``, call it once again concurrently.
+
+    The first successful result wins and the other call is cancelled.
+
+    Args:
+        fn (Callable): Coroutine function without arguments, e.g. an idempotent GET.
+
+        delay (float): Seconds to wait before sending the duplicated call.
+
+        duplicate (Callable): Coroutine function of the duplicated call, ``fn`` by default.
+
+    Returns:
+        Any: The result of the first successful call.
+    """
+    first = asyncio.ensure_future(fn())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    pending = {first, asyncio.ensure_future((duplicate or fn)())}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+
+    # both calls failed.
+    return first.result()
+
+
+class CircuitBreaker:
+    """Fail fast while the Brazil Data Cube OAuth 2.0 service is down.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and the
+    requests fail immediately with ``CircuitOpenError``. Once ``reset_timeout``
+    seconds have passed, a single request probes the service: if it succeeds the
+    circuit closes, otherwise it opens again.
+
+    Args:
+        failure_threshold (int): Consecutive failures to open the circuit. Zero disables the breaker.
+
+        reset_timeout (float): Seconds the circuit stays open.
+
+        timer (Callable): Clock used to close the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, timer=time.monotonic):
+        """Build a closed circuit."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timer = timer
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        """Return the circuit state: ``closed``, ``open`` or ``half-open``."""
+        if self._opened_at is None:
+            return "closed"
+        if self.timer() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def check(self):
+        """Check if a request may be sent.
+
+        Returns:
+            bool: True when the request is the probe of a half-open circuit. A probe
+                  that ends without a result must be given up with ``abandon_probe``.
+
+        Raises:
+            CircuitOpenError: When the circuit is open.
+        """
+        state = self.state
+        if state == "closed":
+            return False
+
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+
+        raise CircuitOpenError(
+            max(self.reset_timeout - (self.timer() - self._opened_at), 0)
+        )
+
+    def abandon_probe(self):
+        """Let another request probe the service, when the probe was not sent or was cancelled."""
+        self._probing = False
+
+    def record_success(self):
+        """Close the circuit."""
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        """Count a failure, opening the circuit when the threshold is reached."""
+        self.failures += 1
+        self._probing = False
+
+        if self.failure_threshold and (
+            self.failures >= self.failure_threshold or self._opened_at is not None
+        ):
+            self._opened_at = self.timer()
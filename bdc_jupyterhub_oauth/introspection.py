@@ -0,0 +1,54 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth token introspection (RFC 7662)."""
+
+import time
+
+from .jwks import REGISTERED_CLAIMS, profile_from_claims
+
+#: Fields of the introspection response that describe the token, not the user.
+INTROSPECTION_FIELDS = REGISTERED_CLAIMS | frozenset(
+    ["active", "scope", "client_id", "username", "token_type"]
+)
+
+
+def introspection_ttl(response, timer=time.time):
+    """Compute how long an introspection response can be reused.
+
+    Args:
+        response (dict): Introspection response.
+
+        timer (Callable): Clock of the expiration time (epoch seconds).
+
+    Returns:
+        Union[None, float]: Seconds until the token expires, or None when the response
+                            does not expire (inactive tokens never become active again).
+    """
+    if not response.get("active") or response.get("exp") is None:
+        return None
+
+    return float(response["exp"]) - timer()
+
+
+def profile_from_introspection(response, required_claims):
+    """Build the user profile from an introspection response.
+
+    Args:
+        response (dict): Introspection response.
+
+        required_claims (list): Fields the response must provide.
+
+    Returns:
+        Union[None, dict]: The profile, or None if any required field is missing.
+    """
+    profile = profile_from_claims(response, required_claims)
+    if profile is None:
+        return None
+
+    return {key: value for key, value in profile.items() if key not in INTROSPECTION_FIELDS}
@@ -0,0 +1,213 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth JSON Web Key Set."""
+
+import logging
+import time
+
+from tornado.ioloop import PeriodicCallback
+
+from .concurrency import SingleFlight
+
+try:
+    import jwt
+except ImportError:  # pragma: no cover
+    jwt = None
+
+#: Claims of the JWT specification that are not part of the user profile.
+REGISTERED_CLAIMS = frozenset(
+    ["iss", "sub", "aud", "exp", "nbf", "iat", "jti", "azp", "nonce", "auth_time", "at_hash"]
+)
+
+
+def require_jwt():
+    """Ensure the optional JWT dependency is installed."""
+    if jwt is None:
+        raise RuntimeError(
+            "Local token validation requires PyJWT. "
+            "Please, install it with 'pip install bdc-jupyterhub-oauth[jwt]'"
+        )
+
+
+class JWKSKeySet:
+    """Signing keys of the Brazil Data Cube OAuth 2.0 service, cached in memory.
+
+    The keys are fetched on first use and then kept up to date in background, so
+    the token validation does not wait for the OAuth 2.0 service. A token signed
+    with an unknown key (e.g. after a key rotation) triggers one extra fetch,
+    at most once every ``min_refresh_interval`` seconds.
+
+    Args:
+        fetch (Callable): Coroutine function that returns the JWKS document (dict).
+
+        ttl (float): Seconds the keys are reused before fetching the JWKS again.
+
+        min_refresh_interval (float): Minimum seconds between two fetches triggered by unknown keys.
+
+        background (bool): Refresh the keys in background, before they expire.
+
+        timer (Callable): Clock used to expire the keys.
+
+        log (logging.Logger): Logger for the background refresh errors.
+    """
+
+    def __init__(
+        self,
+        fetch,
+        ttl=3600,
+        min_refresh_interval=60,
+        background=True,
+        timer=time.monotonic,
+        log=None,
+    ):
+        """Build an empty key set."""
+        require_jwt()
+        self.fetch = fetch
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.background = background
+        self.timer = timer
+        self.log = log or logging.getLogger(__name__)
+        self._keys = {}
+        self._expires_at = 0
+        self._fetched_at = None
+        self._fetches = SingleFlight()
+        self._periodic = None
+
+    def __len__(self):
+        """Return the number of cached keys."""
+        return len(self._keys)
+
+    @property
+    def expired(self):
+        """Check if the cached keys must be fetched again."""
+        return self.timer() >= self._expires_at
+
+    async def refresh(self):
+        """Fetch the JWKS document and replace the cached keys.
+
+        Concurrent calls share the same request.
+        """
+        await self._fetches.do("jwks", self._refresh)
+
+    async def _refresh(self):
+        """Fetch the JWKS document."""
+        self._fetched_at = self.timer()
+        document = await self.fetch()
+
+        keys = {}
+        for jwk in jwt.PyJWKSet.from_dict(document).keys:
+            keys[jwk.key_id] = jwk
+
+        self._keys = keys
+        self._expires_at = self.timer() + self.ttl
+
+    async def _background_refresh(self):
+        """Refresh the keys, keeping the current ones when the OAuth 2.0 service fails."""
+        try:
+            await self.refresh()
+        except Exception as e:
+            self.log.warning(f"Could not refresh the signing keys: {e}")
+
+    def start(self):
+        """Start refreshing the keys in background, at half of their ``ttl``."""
+        if self._periodic is None:
+            self._periodic = PeriodicCallback(
+                self._background_refresh, self.ttl * 1000 / 2
+            )
+            self._periodic.start()
+
+    def stop(self):
+        """Stop the background refresh."""
+        if self._periodic is not None:
+            self._periodic.stop()
+            self._periodic = None
+
+    async def get_key(self, kid):
+        """Retrieve a signing key.
+
+        Args:
+            kid (str): Key identifier, from the JWT header.
+
+        Returns:
+            jwt.PyJWK: The signing key.
+
+        Raises:
+            KeyError: When there is no key with the given identifier.
+
+            Exception: When the keys were never fetched and the OAuth 2.0 service fails.
+        """
+        if self.expired:
+            try:
+                await self.refresh()
+            except Exception as e:
+                if not self._keys:
+                    raise
+                # keep validating with the expired keys while the OAuth 2.0 service is down.
+                self.log.warning(f"Could not refresh the signing keys, using the expired ones: {e}")
+                self._expires_at = self.timer() + self.min_refresh_interval
+            if self.background:
+                self.start()
+        elif kid not in self._keys and self._can_refetch():
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.log.warning(f"Could not fetch the signing key {kid}: {e}")
+
+        return self._keys[kid]
+
+    def _can_refetch(self):
+        """Check if an unknown key may trigger a new fetch."""
+        return (
+            self._fetched_at is None
+            or self.timer() - self._fetched_at >= self.min_refresh_interval
+        )
+
+    async def decode(self, token, **kwargs):
+        """Verify the JWT signature and return its claims.
+
+        Args:
+            token (str): Encoded JWT.
+
+            kwargs: Remaining keyword args passed to ``jwt.decode``
+                    (e.g. ``algorithms``, ``audience``, ``issuer``).
+
+        Returns:
+            dict: The token claims.
+
+        Raises:
+            jwt.InvalidTokenError: When the token is not valid.
+
+            Exception: When the keys were never fetched and the OAuth 2.0 service fails.
+        """
+        header = jwt.get_unverified_header(token)
+
+        try:
+            key = await self.get_key(header.get("kid"))
+        except KeyError:
+            raise jwt.InvalidSignatureError(f"Unknown signing key {header.get('kid')}")
+
+        return jwt.decode(token, key.key, **kwargs)
+
+
+def profile_from_claims(claims, required_claims):
+    """Build the user profile from the token claims.
+
+    Args:
+        claims (dict): Verified token claims.
+
+        required_claims (list): Claims that must be present in the token.
+
+    Returns:
+        Union[None, dict]: The profile, or None if any required claim is missing.
+    """
+    if any(claim not in claims for claim in required_claims):
+        return None
+
+    return {key: value for key, value in claims.items() if key not in REGISTERED_CLAIMS}
@@ -0,0 +1,137 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth Prometheus metrics.
+
+The metrics are registered in the default Prometheus registry, so they are
+exposed by JupyterHub in ``/hub/metrics`` with the metrics of the hub.
+"""
+
+from enum import Enum
+
+from prometheus_client import Counter, Gauge, Histogram
+
+UPSTREAM_REQUEST_DURATION_SECONDS = Histogram(
+    "jupyterhub_bdc_oauth_upstream_request_duration_seconds",
+    "time taken by the requests to the Brazil Data Cube OAuth",
+    ["endpoint"],
+    buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf")],
+)
+
+UPSTREAM_RESPONSES = Counter(
+    "jupyterhub_bdc_oauth_upstream_responses",
+    "HTTP status codes returned by the Brazil Data Cube OAuth",
+    ["endpoint", "code"],
+)
+
+UPSTREAM_RETRIES = Counter(
+    "jupyterhub_bdc_oauth_upstream_retries",
+    "requests to the Brazil Data Cube OAuth sent again after a failure",
+    ["endpoint"],
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "jupyterhub_bdc_oauth_admission_queue_depth",
+    "requests to the Brazil Data Cube OAuth waiting for admission",
+)
+
+ADMISSION_REJECTIONS = Counter(
+    "jupyterhub_bdc_oauth_admission_rejections",
+    "requests to the Brazil Data Cube OAuth rejected by the admission control",
+    ["endpoint"],
+)
+
+ROLE_EVALUATION_DURATION_SECONDS = Histogram(
+    "jupyterhub_bdc_oauth_role_evaluation_duration_seconds",
+    "time taken to evaluate the user roles",
+    buckets=[0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, float("inf")],
+)
+
+AUTH_STATE_SIZE_BYTES = Histogram(
+    "jupyterhub_bdc_oauth_auth_state_size_bytes",
+    "size of the auth state stored for each login and refresh, serialized as JSON",
+    buckets=[256, 512, 1024, 2048, 4096, 8192, 16384, 65536, float("inf")],
+)
+
+DEGRADED_REFRESHES = Counter(
+    "jupyterhub_bdc_oauth_degraded_refreshes",
+    "refreshes that failed because the Brazil Data Cube OAuth was unavailable,"
+    " accepted with the last validated profile or rejected after the grace period",
+    ["outcome"],
+)
+
+DEGRADED_STALENESS_SECONDS = Histogram(
+    "jupyterhub_bdc_oauth_degraded_staleness_seconds",
+    "age of the last validated profile accepted while the Brazil Data Cube OAuth was unavailable",
+    buckets=[60, 300, 900, 1800, 3600, 7200, 14400, 43200, 86400, float("inf")],
+)
+
+AUDIT_DROPPED_RECORDS = Counter(
+    "jupyterhub_bdc_oauth_audit_dropped_records",
+    "audit records dropped because the audit queue was full or the sink failed",
+)
+
+AUTHENTICATION_OUTCOMES = Counter(
+    "jupyterhub_bdc_oauth_authentication_outcomes",
+    "outcome of the authentications with the Brazil Data Cube OAuth",
+    ["outcome"],
+)
+
+
+class UpstreamEndpoint(Enum):
+    """Endpoints of the Brazil Data Cube OAuth.
+
+    token: ``token_url``
+    userdata: ``userdata_url``
+    jwks: ``jwks_url``
+    introspection: ``introspection_url``
+    discovery: ``oidc_discovery_url``
+    """
+
+    token = "token"
+    userdata = "userdata"
+    jwks = "jwks"
+    introspection = "introspection"
+    discovery = "discovery"
+
+    def __str__(self):
+        """Use the value in the metric labels."""
+        return self.value
+
+
+for endpoint in UpstreamEndpoint:
+    UPSTREAM_REQUEST_DURATION_SECONDS.labels(endpoint=endpoint)
+
+
+class AuthenticationOutcome(Enum):
+    """Outcome of an authentication.
+
+    allowed: the user roles are valid
+    admin: the user roles are valid and grant admin privileges
+    denied: the user roles are not valid
+    upstream_error: the Brazil Data Cube OAuth failed
+    rejected: the hub admission control rejected the request to the Brazil Data Cube OAuth
+    """
+
+    allowed = "allowed"
+    admin = "admin"
+    denied = "denied"
+    upstream_error = "upstream_error"
+    rejected = "rejected"
+
+    def __str__(self):
+        """Use the value in the metric labels."""
+        return self.value
+
+
+for outcome in AuthenticationOutcome:
+    AUTHENTICATION_OUTCOMES.labels(outcome=outcome)
+
+
+for outcome in ("accepted", "rejected"):
+    DEGRADED_REFRESHES.labels(outcome=outcome)
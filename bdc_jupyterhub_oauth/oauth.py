@@ -8,16 +8,78 @@
 
 """Brazil Data Cube JupyterHub OAuth Module."""
 
+import asyncio
 import base64
+import json
 import os
+import time
+from datetime import timezone
 from urllib.parse import urlencode
 
+from jupyterhub.utils import url_path_join
 from oauthenticator.oauth2 import OAuthenticator
 from tornado.auth import OAuth2Mixin
-from tornado.httpclient import HTTPRequest
-from traitlets import List, Unicode, default
+from tornado.httpclient import HTTPClientError, HTTPRequest
+from traitlets import (
+    Any,
+    Bool,
+    CaselessStrEnum,
+    Float,
+    Integer,
+    List,
+    Unicode,
+    default,
+    observe,
+)
 
-from .utils import convert_user_name_pattern, filter_roles_by_application_name
+from .audit import (
+    AuditLog,
+    RotatingJSONLinesSink,
+    collect_upstream_timings,
+    record_upstream_timing,
+)
+from .cache import TTLCache, token_cache_key
+from .concurrency import AdmissionController, AdmissionRejected, SingleFlight
+from .discovery import DISCOVERY_ENDPOINTS, OIDCDiscovery
+from .groups import role_group_names, sync_user_groups
+from .handlers import ACCESS_TOKEN_PATH, AccessTokenHandler, LogoutHandler
+from .httpclient import (
+    HTTP_CLIENT_KINDS,
+    CircuitBreaker,
+    CircuitOpenError,
+    backoff_delays,
+    build_http_client,
+    hedged,
+    is_retriable,
+    is_service_failure,
+)
+from .introspection import introspection_ttl, profile_from_introspection
+from .jwks import JWKSKeySet, jwt, profile_from_claims
+from .metrics import (
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTIONS,
+    AUDIT_DROPPED_RECORDS,
+    AUTH_STATE_SIZE_BYTES,
+    AUTHENTICATION_OUTCOMES,
+    DEGRADED_REFRESHES,
+    DEGRADED_STALENESS_SECONDS,
+    ROLE_EVALUATION_DURATION_SECONDS,
+    UPSTREAM_REQUEST_DURATION_SECONDS,
+    UPSTREAM_RESPONSES,
+    UPSTREAM_RETRIES,
+    AuthenticationOutcome,
+    UpstreamEndpoint,
+)
+from .policy import RolePolicyWatcher
+from .roles import DenyingRoleMatcher, PolicyRoleMatcher, RoleMatcher
+from .scheduler import TokenRefreshScheduler
+from .tracing import JSONLinesFileExporter, OpenTelemetryExporter, Tracer
+from .utils import (
+    auth_state_size_report,
+    convert_user_name_pattern,
+    project_user_profile,
+)
+from .warmcache import ProfileStore, Revalidator
 
 
 class BrazilDataCubeOAuthMixin(OAuth2Mixin):
@@ -37,6 +99,7 @@ class BrazilDataCubeOAuthenticator(OAuthenticator, BrazilDataCubeOAuthMixin):
     refresh_pre_spawn = True
     enable_auth_state = True
     login_service = "Brazil Data Cube OAuth"
+    logout_handler = LogoutHandler
 
     oauth_application_name = Unicode(
         config=True,
@@ -69,6 +132,569 @@ class BrazilDataCubeOAuthenticator(OAuthenticator, BrazilDataCubeOAuthMixin):
         """Admin roles."""
         return [""]  # No one is admin
 
+    compact_auth_state = Bool(
+        False,
+        config=True,
+        help="""Store in the auth state only the auth_state_profile_keys and the roles of
+        oauth_application_name (of every application with role_policy_file), instead of the
+        whole user profile.""",
+    )
+
+    auth_state_profile_keys = List(
+        Unicode(),
+        ["email", "id", "name"],
+        config=True,
+        help="""User profile keys stored in the auth state when compact_auth_state is enabled.
+        The email, used as the user name, is always stored.""",
+    )
+
+    username_collision_safe = Bool(
+        False,
+        config=True,
+        help="""Append a short hash of the email to the normalized usernames, so that distinct
+        emails (e.g. a.b@x and a_b@x) never get the same username. Changing it renames the users,
+        see bdc_jupyterhub_oauth.utils.convert_user_names to migrate them.""",
+    )
+
+    sync_groups = Bool(
+        False,
+        config=True,
+        help="""Keep the user JupyterHub groups in sync with the roles of oauth_application_name,
+        at login and refresh. The role <application>:<role> maps to the group <group_prefix><role>.""",
+    )
+
+    group_prefix = Unicode(
+        "bdc-",
+        config=True,
+        help="""Prefix of the groups managed by sync_groups. Groups without this prefix are
+        never changed. An empty prefix manages every group of the users.""",
+    )
+
+    group_roles = List(
+        Unicode(),
+        config=True,
+        help="Roles mapped to groups by sync_groups. Empty maps all the roles of the application",
+    )
+
+    _pending_groups = Any()
+
+    @default("_pending_groups")
+    def _pending_groups_default(self):
+        """Profiles of the users that logged in for the first time, until they are added."""
+        return TTLCache(maxsize=1024, ttl=300)
+
+    role_policy_file = Unicode(
+        "",
+        config=True,
+        help="""JSON file with the allowed_roles and admin_roles patterns, replacing the
+        allowed_roles and admin_roles traits. The patterns may be exact roles, wildcards
+        (e.g. *:admin) or regular expressions prefixed with re:. The file is reloaded when
+        it changes, without restarting the hub, see bdc_jupyterhub_oauth.policy. While the
+        file is missing or invalid and no previous policy was loaded, every user is denied.""",
+    )
+
+    role_policy_reload_interval = Integer(
+        10,
+        config=True,
+        help="Seconds between two checks of the role_policy_file changes",
+    )
+
+    role_policy = Any(help="Watcher of the role_policy_file")
+
+    @default("role_policy")
+    def _role_policy_default(self):
+        """Role policy watcher."""
+        return RolePolicyWatcher(
+            self.role_policy_file,
+            self._apply_role_policy,
+            interval=self.role_policy_reload_interval,
+            log=self.log,
+        )
+
+    def _apply_role_policy(self, policy):
+        """Compile a new role policy, used by the next logins and refreshes."""
+        self.role_matcher = PolicyRoleMatcher(
+            self.oauth_application_name, policy["allowed_roles"], policy["admin_roles"]
+        )
+
+    role_matcher = Any(help="Compiled allowed_roles and admin_roles, or role_policy_file")
+
+    @default("role_matcher")
+    def _role_matcher_default(self):
+        """Role matcher."""
+        if self.role_policy_file:
+            policy = self.role_policy.policy
+            if policy is None:
+                # fail closed: the allowed_roles trait would allow every user.
+                return DenyingRoleMatcher(self.oauth_application_name)
+            return PolicyRoleMatcher(
+                self.oauth_application_name, policy["allowed_roles"], policy["admin_roles"]
+            )
+
+        return RoleMatcher(
+            self.oauth_application_name, self.allowed_roles, self.admin_roles
+        )
+
+    @observe("oauth_application_name", "allowed_roles", "admin_roles")
+    def _roles_changed(self, change):
+        """Compile the role matcher again."""
+        self.role_matcher = self._role_matcher_default()
+
+    userdata_cache_ttl = Integer(
+        300,
+        config=True,
+        help="Seconds a user data response is reused for the same access token. Use 0 to disable the cache",
+    )
+
+    userdata_cache_size = Integer(
+        1024,
+        config=True,
+        help="Maximum number of user data responses kept in memory",
+    )
+
+    userdata_cache = Any(help="Cache of user data responses, keyed by the access token hash")
+
+    @default("userdata_cache")
+    def _userdata_cache_default(self):
+        """User data cache."""
+        return TTLCache(maxsize=self.userdata_cache_size, ttl=self.userdata_cache_ttl)
+
+    @observe("userdata_cache_ttl", "userdata_cache_size")
+    def _userdata_cache_changed(self, change):
+        """Apply the new limits to the user data cache."""
+        self.userdata_cache.ttl = self.userdata_cache_ttl
+        self.userdata_cache.maxsize = self.userdata_cache_size
+
+    id_token_profile = Bool(
+        False,
+        config=True,
+        help="""Build the user profile from the claims of the OpenID Connect id_token,
+        skipping the request to userdata_url. Requires jwks_url.""",
+    )
+
+    id_token_required_claims = List(
+        Unicode(),
+        ["email", "roles"],
+        config=True,
+        help="Claims the id_token must provide, otherwise the user data is fetched from userdata_url",
+    )
+
+    token_introspection = Bool(
+        False,
+        config=True,
+        help="""Build the user profile from the token introspection (RFC 7662) response of
+        introspection_url, instead of the request to userdata_url. Inactive tokens are denied.""",
+    )
+
+    introspection_required_claims = List(
+        Unicode(),
+        ["email", "roles"],
+        config=True,
+        help="Fields the introspection response must provide, otherwise the user data is fetched from userdata_url",
+    )
+
+    introspection_cache_ttl = Integer(
+        300,
+        config=True,
+        help="""Maximum seconds an introspection response is reused for the same access token.
+        Active tokens are never cached beyond their expiration. Use 0 to disable the cache""",
+    )
+
+    introspection_cache = Any(help="Cache of introspection responses, keyed by the access token hash")
+
+    @default("introspection_cache")
+    def _introspection_cache_default(self):
+        """Introspection cache."""
+        return TTLCache(maxsize=self.userdata_cache_size, ttl=self.introspection_cache_ttl)
+
+    @observe("introspection_cache_ttl", "userdata_cache_size")
+    def _introspection_cache_changed(self, change):
+        """Apply the new limits to the introspection cache."""
+        self.introspection_cache.ttl = self.introspection_cache_ttl
+        self.introspection_cache.maxsize = self.userdata_cache_size
+
+    jwks = Any(help="Signing keys of the Brazil Data Cube OAuth, see jwks_url")
+
+    @default("jwks")
+    def _jwks_default(self):
+        """JSON Web Key Set."""
+        return JWKSKeySet(
+            self._get_jwks,
+            ttl=self.jwks_cache_ttl,
+            background=self.jwks_background_refresh,
+            log=self.log,
+        )
+
+    http_client_kind = CaselessStrEnum(
+        HTTP_CLIENT_KINDS,
+        "auto",
+        config=True,
+        help="""HTTP client used to talk with the Brazil Data Cube OAuth.
+        'curl' keeps a pool of alive connections (requires pycurl), 'simple' uses a
+        dedicated tornado client, 'default' shares the tornado client configured in the hub
+        and 'auto' picks 'curl' when pycurl is installed.""",
+    )
+
+    http_max_clients = Integer(
+        64,
+        config=True,
+        help="Maximum number of concurrent requests to the Brazil Data Cube OAuth. Pending requests are queued",
+    )
+
+    http_decompress_response = Bool(
+        True,
+        config=True,
+        help="Ask the Brazil Data Cube OAuth for compressed (gzip) responses",
+    )
+
+    token_connect_timeout = Float(
+        5, config=True, help="Seconds to wait for the connection with token_url"
+    )
+
+    token_request_timeout = Float(
+        20, config=True, help="Seconds to wait for the whole request to token_url"
+    )
+
+    userdata_connect_timeout = Float(
+        5, config=True, help="Seconds to wait for the connection with userdata_url and jwks_url"
+    )
+
+    userdata_request_timeout = Float(
+        10, config=True, help="Seconds to wait for the whole request to userdata_url and jwks_url"
+    )
+
+    upstream_retries = Integer(
+        2,
+        config=True,
+        help="Retries of the idempotent requests (userdata_url, jwks_url) that fail with network or 5xx errors",
+    )
+
+    upstream_retry_backoff = Float(
+        0.1,
+        config=True,
+        help="Seconds before the first retry. It doubles on each retry, with random jitter",
+    )
+
+    upstream_retry_max_backoff = Float(
+        2, config=True, help="Maximum seconds between two retries"
+    )
+
+    userdata_hedge_delay = Float(
+        0,
+        config=True,
+        help="""Seconds to wait for userdata_url before sending a duplicated request,
+        keeping the first response. Use 0 to disable the hedged requests.""",
+    )
+
+    circuit_breaker_threshold = Integer(
+        5,
+        config=True,
+        help="""Consecutive network or 5xx errors of the Brazil Data Cube OAuth that open the
+        circuit, failing the next requests immediately. Use 0 to disable the circuit breaker.""",
+    )
+
+    circuit_breaker_reset_timeout = Float(
+        30,
+        config=True,
+        help="Seconds the circuit stays open before probing the Brazil Data Cube OAuth again",
+    )
+
+    circuit_breaker = Any(help="Circuit breaker of the requests to the Brazil Data Cube OAuth")
+
+    @default("circuit_breaker")
+    def _circuit_breaker_default(self):
+        """Circuit breaker."""
+        return CircuitBreaker(
+            self.circuit_breaker_threshold, self.circuit_breaker_reset_timeout
+        )
+
+    admission_max_concurrency = Integer(
+        0,
+        config=True,
+        help="""Maximum number of concurrent requests of the logins and refreshes to the
+        Brazil Data Cube OAuth. Use 0 for no limit.""",
+    )
+
+    admission_rate = Float(
+        0,
+        config=True,
+        help="Requests per second admitted to the Brazil Data Cube OAuth, on average. Use 0 for no limit",
+    )
+
+    admission_burst = Integer(
+        20,
+        config=True,
+        help="Requests admitted at once to the Brazil Data Cube OAuth after an idle period, see admission_rate",
+    )
+
+    admission_max_wait = Float(
+        5,
+        config=True,
+        help="""Maximum seconds a request waits for admission. Logins and refreshes that would
+        wait longer fail with 503 and a Retry-After header.""",
+    )
+
+    admission = Any(help="Admission control of the requests to the Brazil Data Cube OAuth")
+
+    @default("admission")
+    def _admission_default(self):
+        """Admission controller."""
+        return AdmissionController(
+            max_concurrency=self.admission_max_concurrency,
+            rate=self.admission_rate,
+            burst=self.admission_burst,
+            max_wait=self.admission_max_wait,
+        )
+
+    tracing = CaselessStrEnum(
+        ["none", "file", "opentelemetry"],
+        "none",
+        config=True,
+        help="""Record the spans of the logins and refreshes (token and user data requests,
+        role evaluation, auth state creation). 'file' appends them to tracing_file as JSON lines
+        and 'opentelemetry' sends them to the OpenTelemetry tracer provider (requires opentelemetry-api).""",
+    )
+
+    tracing_file = Unicode(
+        "bdc_oauth_traces.jsonl",
+        config=True,
+        help="File of the spans when tracing is 'file'",
+    )
+
+    tracing_exporter = Any(
+        None,
+        allow_none=True,
+        config=True,
+        help="""Custom span exporter, an object with export(span), overriding tracing.
+        See bdc_jupyterhub_oauth.tracing for the available exporters.""",
+    )
+
+    audit_log_file = Unicode(
+        "",
+        config=True,
+        help="""File of the audit log of the authentication decisions, one JSON document per
+        login with the user, matched roles, decision and upstream timings. Use an empty value
+        to disable the audit log, unless audit_log_sink is set.""",
+    )
+
+    audit_log_max_bytes = Integer(
+        10 * 2 ** 20, config=True, help="Size of the audit_log_file that triggers its rotation"
+    )
+
+    audit_log_backup_count = Integer(
+        5, config=True, help="Number of rotated audit log files kept"
+    )
+
+    audit_log_sink = Any(
+        None,
+        allow_none=True,
+        config=True,
+        help="""Custom audit log sink, an object with write(records) called in a thread with
+        each batch of records, overriding audit_log_file.""",
+    )
+
+    audit_log_batch_size = Integer(
+        100, config=True, help="Maximum number of audit records written at once"
+    )
+
+    audit_log_flush_interval = Float(
+        1, config=True, help="Maximum seconds an audit record waits to be written"
+    )
+
+    audit_log = Any(help="Audit log of the authentication decisions, see audit_log_file")
+
+    @default("audit_log")
+    def _audit_log_default(self):
+        """Audit log."""
+        sink = self.audit_log_sink
+        if sink is None and self.audit_log_file:
+            sink = RotatingJSONLinesSink(
+                self.audit_log_file, self.audit_log_max_bytes, self.audit_log_backup_count
+            )
+        if sink is None:
+            return None
+
+        return AuditLog(
+            sink,
+            batch_size=self.audit_log_batch_size,
+            flush_interval=self.audit_log_flush_interval,
+            log=self.log,
+            on_drop=AUDIT_DROPPED_RECORDS.inc,
+        )
+
+    tracer = Any(help="Tracer of the logins and refreshes, see tracing")
+
+    @default("tracer")
+    def _tracer_default(self):
+        """Tracer."""
+        exporter = self.tracing_exporter
+        if exporter is None and self.tracing == "file":
+            exporter = JSONLinesFileExporter(self.tracing_file)
+        elif exporter is None and self.tracing == "opentelemetry":
+            exporter = OpenTelemetryExporter()
+        return Tracer(exporter, log=self.log)
+
+    @default("http_client")
+    def _default_http_client(self):
+        """HTTP client."""
+        return build_http_client(self.http_client_kind, self.http_max_clients)
+
+    proactive_refresh = Bool(
+        False,
+        config=True,
+        help="""Refresh the user tokens in background, before they expire, instead of
+        on the spawn and request paths. Requires expires_in in the token responses.""",
+    )
+
+    proactive_refresh_lead_time = Integer(
+        300, config=True, help="Seconds before the token expiration to refresh it"
+    )
+
+    proactive_refresh_jitter = Integer(
+        60,
+        config=True,
+        help="Maximum random seconds added to the lead time, spreading the refreshes",
+    )
+
+    proactive_refresh_concurrency = Integer(
+        10, config=True, help="Maximum number of concurrent background refreshes"
+    )
+
+    proactive_refresh_interval = Integer(
+        15, config=True, help="Seconds between two checks of the tokens to refresh"
+    )
+
+    proactive_refresh_idle_timeout = Integer(
+        3600,
+        config=True,
+        help="""Seconds without activity after which a user without running servers is no
+        longer refreshed in background. Use 0 to refresh the users until they logout.""",
+    )
+
+    proactive_refresh_max_users = Integer(
+        10000,
+        config=True,
+        help="""Maximum number of users refreshed in background, the least recently seen
+        are dropped first. Use 0 for no limit.""",
+    )
+
+    degraded_grace_period = Integer(
+        0,
+        config=True,
+        help="""Seconds after the last successful validation of a user during which the refreshes
+        (and so the spawns) are accepted with the stored profile when the Brazil Data Cube OAuth
+        fails with network or 5xx errors. Use 0 to always require the OAuth service.""",
+    )
+
+    access_token_broker = Bool(
+        False,
+        config=True,
+        help="""Serve the user access token to the user servers in /hub/api/bdc/token,
+        refreshing it in the hub when it is about to expire. The servers get the url in the
+        BDC_ACCESS_TOKEN_URL environment variable and call it with their JupyterHub API token.""",
+    )
+
+    spawn_access_token = Bool(
+        False,
+        config=True,
+        help="""Give the user servers the access token at spawn, in the BDC_ACCESS_TOKEN
+        environment variable. It expires with the token, prefer access_token_broker.""",
+    )
+
+    refresh_scheduler = Any(help="Background token refresh, see proactive_refresh")
+
+    @default("refresh_scheduler")
+    def _refresh_scheduler_default(self):
+        """Background token refresh scheduler."""
+        return TokenRefreshScheduler(
+            self._refresh_and_store,
+            lead_time=self.proactive_refresh_lead_time,
+            jitter=self.proactive_refresh_jitter,
+            max_concurrency=self.proactive_refresh_concurrency,
+            interval=self.proactive_refresh_interval,
+            log=self.log,
+            is_active=self._is_user_active,
+            max_users=self.proactive_refresh_max_users,
+        )
+
+    warm_cache_path = Unicode(
+        "",
+        config=True,
+        help="""SQLite file keeping the recently validated user profiles and role decisions
+        across hub restarts (e.g. in the hub data directory). After a restart, the first refresh
+        of each user is served from it while the user is validated again in background.
+        Use an empty value to disable the warm cache.""",
+    )
+
+    warm_cache_ttl = Integer(
+        3600,
+        config=True,
+        help="Seconds a validated user profile is served from the warm cache",
+    )
+
+    warm_cache_revalidate_rate = Float(
+        5,
+        config=True,
+        help="Maximum number of users validated again per second, after being served from the warm cache",
+    )
+
+    warm_cache = Any(help="Persistent cache of validated user profiles, see warm_cache_path")
+
+    @default("warm_cache")
+    def _warm_cache_default(self):
+        """Warm cache."""
+        if not self.warm_cache_path:
+            return None
+
+        warm_cache = ProfileStore(self.warm_cache_path, ttl=self.warm_cache_ttl, log=self.log)
+        warm_cache.purge_expired()
+        return warm_cache
+
+    revalidator = Any(help="Background validation of the users served from the warm cache")
+
+    @default("revalidator")
+    def _revalidator_default(self):
+        """Warm cache revalidator."""
+        return Revalidator(
+            self._refresh_and_store, rate=self.warm_cache_revalidate_rate, log=self.log
+        )
+
+    _warm_checked = Any()
+
+    @default("_warm_checked")
+    def _warm_checked_default(self):
+        """Users whose warm cache entry was already checked since the hub started."""
+        return set()
+
+    login_dedup_ttl = Integer(
+        30,
+        config=True,
+        help="""Seconds the result of an authorization code exchange is reused for repeated
+        callbacks with the same code and state (browser retries, double clicks). Use 0 to only
+        merge the concurrent callbacks.""",
+    )
+
+    _login_calls = Any()
+
+    @default("_login_calls")
+    def _login_calls_default(self):
+        """Group of in-flight authorization code exchanges, keyed by the code and state hash."""
+        return SingleFlight()
+
+    _login_results = Any()
+
+    @default("_login_results")
+    def _login_results_default(self):
+        """Recent authorization code exchanges, keyed by the code and state hash."""
+        return TTLCache(maxsize=1024, ttl=self.login_dedup_ttl)
+
+    _refresh_calls = Any()
+
+    @default("_refresh_calls")
+    def _refresh_calls_default(self):
+        """Group of in-flight token refreshes, keyed by user name."""
+        return SingleFlight()
+
     @default("scope")
     def _scope_default(self):
         """Scope."""
@@ -89,6 +715,147 @@ class BrazilDataCubeOAuthenticator(OAuthenticator, BrazilDataCubeOAuthMixin):
         """Access token URL."""
         return os.environ.get("OAUTH_ACCESS_TOKEN_URL", self._OAUTH_ACCESS_TOKEN_URL)
 
+    jwks_url = Unicode(
+        config=True,
+        help="The url of the JSON Web Key Set used to verify tokens signed by the Brazil Data Cube OAuth",
+    )
+
+    @default("jwks_url")
+    def _jwks_url_default(self):
+        """JSON Web Key Set URL."""
+        return os.environ.get("OAUTH_JWKS_URL", "")
+
+    introspection_url = Unicode(
+        config=True,
+        help="The url of the token introspection (RFC 7662) endpoint of the Brazil Data Cube OAuth",
+    )
+
+    @default("introspection_url")
+    def _introspection_url_default(self):
+        """Token introspection URL."""
+        return os.environ.get("OAUTH_INTROSPECTION_URL", "")
+
+    oidc_discovery_url = Unicode(
+        config=True,
+        help="""The url of the OpenID Connect discovery document (.well-known/openid-configuration).
+        When set, the endpoints that are not configured are taken from the document.""",
+    )
+
+    @default("oidc_discovery_url")
+    def _oidc_discovery_url_default(self):
+        """OpenID Connect discovery URL."""
+        return os.environ.get("OAUTH_DISCOVERY_URL", "")
+
+    oidc_discovery_cache_path = Unicode(
+        "bdc_oauth_discovery.json",
+        config=True,
+        help="File to keep the discovery document across hub restarts. Use an empty value to keep it only in memory",
+    )
+
+    oidc_discovery_ttl = Integer(
+        86400,
+        config=True,
+        help="Seconds the discovery document is reused before fetching it again, in background",
+    )
+
+    discovery = Any(help="OpenID Connect discovery, see oidc_discovery_url")
+
+    @default("discovery")
+    def _discovery_default(self):
+        """OpenID Connect discovery."""
+        return OIDCDiscovery(
+            self._get_discovery_document,
+            cache_path=self.oidc_discovery_cache_path,
+            ttl=self.oidc_discovery_ttl,
+            on_update=self._apply_discovery,
+            log=self.log,
+        )
+
+    _discovered_traits = Any()
+
+    @default("_discovered_traits")
+    def _discovered_traits_default(self):
+        """Traits filled from the discovery document."""
+        return set()
+
+    oauth_issuer = Unicode(
+        config=True,
+        help="Expected issuer (iss) of the tokens. Leave empty to skip the issuer check",
+    )
+
+    @default("oauth_issuer")
+    def _oauth_issuer_default(self):
+        """Token issuer."""
+        return os.environ.get("OAUTH_ISSUER", "")
+
+    jwt_algorithms = List(
+        Unicode(),
+        ["RS256"],
+        config=True,
+        help="Algorithms accepted in the signature of the tokens",
+    )
+
+    jwks_cache_ttl = Integer(
+        3600,
+        config=True,
+        help="Seconds the JSON Web Key Set is reused before fetching it again",
+    )
+
+    jwks_background_refresh = Bool(
+        True,
+        config=True,
+        help="Refresh the JSON Web Key Set in background, before it expires",
+    )
+
+    access_token_validation = Bool(
+        False,
+        config=True,
+        help="""Validate JWT access tokens locally, with the keys from jwks_url,
+        in refresh and pre-spawn checks. The token is only refreshed with the
+        Brazil Data Cube OAuth when it is not valid or about to expire.""",
+    )
+
+    access_token_min_validity = Integer(
+        60,
+        config=True,
+        help="Seconds an access token must still be valid to skip its refresh",
+    )
+
+    def __init__(self, **kwargs):
+        """Build the authenticator, loading the role policy and the cached discovery document when enabled."""
+        super().__init__(**kwargs)
+
+        if self.role_policy_file:
+            self.role_policy.start()
+            if self.role_policy.policy is None:
+                self.log.error(
+                    f"No valid role policy in {self.role_policy_file}, every user is denied until it is fixed"
+                )
+
+        if self.oidc_discovery_url:
+            # never block the hub startup on the OAuth service: the endpoints come from
+            # the disk cache now and from the service later, in background.
+            self.discovery.load_cached()
+            self.discovery.start()
+
+    def _apply_discovery(self, document):
+        """Fill the endpoints that were not configured with the discovery document."""
+        placeholders = {
+            "",
+            self._OAUTH_AUTHORIZE_URL,
+            self._OAUTH_USERDATA_URL,
+            self._OAUTH_ACCESS_TOKEN_URL,
+        }
+
+        for trait, key in DISCOVERY_ENDPOINTS.items():
+            value = document.get(key)
+            if not value:
+                continue
+
+            if trait in self._discovered_traits or getattr(self, trait) in placeholders:
+                setattr(self, trait, value)
+                self._discovered_traits.add(trait)
+
     def _check_user_roles(self, user_profile, valid_roles):
         """Check user roles.
 
@@ -99,75 +866,248 @@ class BrazilDataCubeOAuthenticator(OAuthenticator, BrazilDataCubeOAuthMixin):
             valid_roles (list): List with the name of valid roles.
 
         Returns:
-            bool: Boolean indicating if the user has valid roles.
+            bool: Boolean indicating if the user has valid roles.
+        """
+        return self.role_matcher.match(user_profile, frozenset(valid_roles))
+
+    def _is_user_admin(self, user_profile):
+        """Check if user is admin.
+
+        Verify if the user profile provides ``admin roles``.
+        Args:
+            user_profile (dict): User profile.
+
+        Returns:
+            bool: Boolean indicating if the user is admin.
+
+        Note:
+            The ``admin roles`` used is defined by the
+            ``admin_roles`` property.
+        """
+        return self.role_matcher.decide(user_profile).admin
+
+    def _is_user_roles_valid(self, user_profile):
+        """Check if user has valid roles.
+
+        Verify if the user profile provides as least one ``valid role``.
+        Args:
+            user_profile (dict): User profile.
+
+        Returns:
+            bool: Boolean indicating if at least one role in
+            the user profile is valid.
+
+        Note:
+            The ``admin roles`` used is defined by the
+            ``admin_roles`` property.
+        """
+        return self.role_matcher.decide(user_profile).allowed
+
+    def decide_user_roles(self, user_profiles):
+        """Decide the access of many user profiles at once.
+
+        It is useful to evaluate the stored profiles (``auth_state["oauth_user"]``)
+        again after a change of ``allowed_roles`` or ``admin_roles``.
+
+        Args:
+            user_profiles (Iterable[dict]): User profiles.
+
+        Returns:
+            list: List of ``RoleDecision`` with the ``allowed`` and ``admin`` decisions,
+                  in the same order of the profiles.
+        """
+        return self.role_matcher.decide_many(user_profiles)
+
+    def _user_group_names(self, user_profile):
+        """Return the managed groups the user must belong to."""
+        return role_group_names(
+            self.role_matcher.application_roles(user_profile),
+            self.group_prefix,
+            self.group_roles,
+        )
+
+    def _sync_groups(self, user, user_profile):
+        """Synchronize the managed groups of the user with the profile roles."""
+        added, removed = sync_user_groups(
+            user, self._user_group_names(user_profile), self.group_prefix
+        )
+        if added or removed:
+            self.log.info(
+                f"Groups of {getattr(user, 'name', '')} updated: added {sorted(added)}, removed {sorted(removed)}"
+            )
+
+    def add_user(self, user):
+        """Add the groups of a user that logged in for the first time.
+
+        Args:
+            user (jupyterhub.user.User): the new user.
+        """
+        super().add_user(user)
+
+        user_profile = self._pending_groups.pop(user.name, None)
+        if user_profile is not None:
+            self._sync_groups(user, user_profile)
+
+    def _get_headers(self):
+        """Create a valid HTTP request header."""
+        headers = {"Accept": "application/json", "User-Agent": "JupyterHub"}
+
+        b64key = base64.b64encode(
+            bytes(f"{self.client_id}:{self.client_secret}", "utf8")
+        )
+        headers.update({"Authorization": f"Basic {b64key.decode('utf8')}"})
+        return headers
+
+    async def _fetch_upstream(self, endpoint, req, label, idempotent=False):
+        """Fetch an endpoint of the OAuth 2.0 service.
+
+        Idempotent requests are sent again when they fail with network or 5xx errors
+        (see ``upstream_retries``) and the user data requests may be hedged (see
+        ``userdata_hedge_delay``). While the service is down the circuit breaker fails
+        the requests immediately with ``CircuitOpenError``. Every attempt waits for its
+        admission (see ``admission_max_concurrency`` and ``admission_rate``) and fails
+        with ``AdmissionRejected`` when it would wait too long.
+
+        Args:
+            endpoint (UpstreamEndpoint): The requested endpoint.
+
+            req (tornado.httpclient.HTTPRequest): The request.
+
+            label (str): Label describing what is happening, used in the error messages.
+
+            idempotent (bool): If the request can be safely sent more than once.
+
+        Returns:
+            r: parsed JSON response
         """
-        if valid_roles:
-            user_roles = user_profile.get("roles", [])
-            application_roles = filter_roles_by_application_name(
-                self.oauth_application_name, user_roles
-            )
+        delays = backoff_delays(
+            self.upstream_retries if idempotent else 0,
+            self.upstream_retry_backoff,
+            self.upstream_retry_max_backoff,
+        )
 
-            user_roles = list(map(lambda x: x.split(":")[1], application_roles))
+        hedge = (
+            idempotent
+            and endpoint == UpstreamEndpoint.userdata
+            and self.userdata_hedge_delay > 0
+        )
 
-            return bool(set(user_roles) & set(valid_roles))
-        return True
+        def fetch_once():
+            return self._fetch_once(endpoint, req, label)
 
-    def _is_user_admin(self, user_profile):
-        """Check if user is admin.
+        async def fetch_duplicate():
+            # the duplicated request needs its own slot, but never waits for it.
+            if not await self.admission.try_acquire():
+                raise AdmissionRejected(0)
+            try:
+                return await fetch_once()
+            finally:
+                self.admission.release()
 
-        Verify if the user profile provides ``admin roles``.
-        Args:
-            user_profile (dict): User profile.
+        while True:
+            try:
+                probe = self.circuit_breaker.check()
+            except CircuitOpenError:
+                UPSTREAM_RESPONSES.labels(endpoint=endpoint, code="circuit_open").inc()
+                raise
 
-        Returns:
-            bool: Boolean indicating if the user is admin.
+            try:
+                await self._admit(endpoint)
+                try:
+                    if hedge:
+                        resp = await hedged(
+                            fetch_once, self.userdata_hedge_delay, fetch_duplicate
+                        )
+                    else:
+                        resp = await fetch_once()
+                except Exception as e:
+                    error = e
+                else:
+                    error = None
+                finally:
+                    self.admission.release()
+            except BaseException:
+                # rejected by the admission control or cancelled: the service was not judged.
+                if probe:
+                    self.circuit_breaker.abandon_probe()
+                raise
 
-        Note:
-            The ``admin roles`` used is defined by the
-            ``admin_roles`` property.
-        """
-        return self._check_user_roles(user_profile, self.admin_roles)
+            if error is None:
+                self.circuit_breaker.record_success()
+                return resp
 
-    def _is_user_roles_valid(self, user_profile):
-        """Check if user has valid roles.
+            if not is_service_failure(error):
+                # the service is up, the request itself is wrong.
+                self.circuit_breaker.record_success()
+                raise error
 
-        Verify if the user profile provides as least one ``valid role``.
-        Args:
-            user_profile (dict): User profile.
+            self.circuit_breaker.record_failure()
+            delay = next(delays, None) if is_retriable(error) else None
+            if delay is None:
+                raise error
 
-        Returns:
-            bool: Boolean indicating if at least one role in
-            the user profile is valid.
+            UPSTREAM_RETRIES.labels(endpoint=endpoint).inc()
+            await asyncio.sleep(delay)
 
-        Note:
-            The ``admin roles`` used is defined by the
-            ``admin_roles`` property.
-        """
-        return self._check_user_roles(user_profile, self.allowed_roles)
+    async def _admit(self, endpoint):
+        """Wait for the admission of a request to the OAuth 2.0 service, see ``admission_max_wait``."""
+        ADMISSION_QUEUE_DEPTH.inc()
+        try:
+            await self.admission.acquire()
+        except AdmissionRejected:
+            ADMISSION_REJECTIONS.labels(endpoint=endpoint).inc()
+            self.log.warning(f"Request to the {endpoint} endpoint rejected by the admission control")
+            raise
+        finally:
+            ADMISSION_QUEUE_DEPTH.dec()
 
-    def _get_headers(self):
-        """Create a valid HTTP request header."""
-        headers = {"Accept": "application/json", "User-Agent": "JupyterHub"}
+    async def _fetch_once(self, endpoint, req, label):
+        """Fetch an endpoint of the OAuth 2.0 service once, recording its latency and status code."""
+        with self.tracer.span("upstream_request", endpoint=str(endpoint)) as span:
+            start = time.perf_counter()
+            try:
+                resp = await self.fetch(req, label, parse_json=False)
+            except HTTPClientError as e:
+                UPSTREAM_RESPONSES.labels(endpoint=endpoint, code=e.code).inc()
+                span.set_attribute("status_code", e.code)
+                raise
+            except Exception:
+                UPSTREAM_RESPONSES.labels(endpoint=endpoint, code="error").inc()
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                UPSTREAM_REQUEST_DURATION_SECONDS.labels(endpoint=endpoint).observe(elapsed)
+                record_upstream_timing(endpoint, elapsed)
 
-        b64key = base64.b64encode(
-            bytes(f"{self.client_id}:{self.client_secret}", "utf8")
-        )
-        headers.update({"Authorization": f"Basic {b64key.decode('utf8')}"})
-        return headers
+            UPSTREAM_RESPONSES.labels(endpoint=endpoint, code=resp.code).inc()
+            span.set_attribute("status_code", resp.code)
+            span.set_attribute("payload_size", len(resp.body or b""))
+
+            if resp.body:
+                return json.loads(resp.body.decode("utf8", "replace"))
+            return None
 
-    def _get_token(self, headers, params):
+    async def _get_token(self, headers, params):
         """Retrieve the access token to the OAuth 2.0 service."""
         req = HTTPRequest(
             self.token_url,
             method="POST",
             headers=headers,
             body=urlencode(params),
+            connect_timeout=self.token_connect_timeout,
+            request_timeout=self.token_request_timeout,
+            decompress_response=self.http_decompress_response,
         )
-        return self.fetch(req, "fetching access token")
+        with self.tracer.span("get_token", grant_type=params.get("grant_type")):
+            return await self._fetch_upstream(
+                UpstreamEndpoint.token, req, "fetching access token"
+            )
 
-    def _get_user_data(self, token_response):
+    async def _get_user_data(self, token_response):
         """Retrieve the user data to the OAuth 2.0 service.
 
+        The responses are cached by access token, see ``userdata_cache_ttl``.
+
         Args:
             token_response (dict): Dict with the token response from OAuth 2.0 authorization.
 
@@ -177,6 +1117,17 @@ class BrazilDataCubeOAuthenticator(OAuthenticator, BrazilDataCubeOAuthMixin):
         token_type = token_response["token_type"]
         access_token = token_response["access_token"]
 
+        with self.tracer.span("get_user_data") as span:
+            return await self._fetch_user_data(token_type, access_token, span)
+
+    async def _fetch_user_data(self, token_type, access_token, span):
+        """Retrieve the user data from the cache or from ``userdata_url``."""
+        cache_key = token_cache_key(access_token)
+        user_data = self.userdata_cache.get(cache_key)
+        span.set_attribute("cache_hit", user_data is not None)
+        if user_data is not None:
+            return user_data
+
         # Determine what user is logged.
         headers = {
             "Accept": "application/json",
@@ -184,8 +1135,184 @@ class BrazilDataCubeOAuthenticator(OAuthenticator, BrazilDataCubeOAuthMixin):
             "Authorization": f"{token_type} {access_token}",
         }
 
-        req = HTTPRequest(self.userdata_url, headers=headers)
-        return self.fetch(req, "fetching user data")
+        req = HTTPRequest(
+            self.userdata_url,
+            headers=headers,
+            connect_timeout=self.userdata_connect_timeout,
+            request_timeout=self.userdata_request_timeout,
+            decompress_response=self.http_decompress_response,
+        )
+        user_data = await self._fetch_upstream(
+            UpstreamEndpoint.userdata, req, "fetching user data", idempotent=True
+        )
+
+        if user_data is not None:
+            self.userdata_cache.set(cache_key, user_data)
+        return user_data
+
+    async def _introspect_token(self, access_token):
+        """Introspect an access token with the OAuth 2.0 service (RFC 7662).
+
+        The responses are cached by access token until the token expires,
+        see ``introspection_cache_ttl``.
+
+        Args:
+            access_token (str): Access token.
+
+        Returns:
+            r: parsed JSON response
+        """
+        cache_key = token_cache_key(access_token)
+        response = self.introspection_cache.get(cache_key)
+        if response is not None:
+            return response
+
+        headers = self._get_headers()
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        req = HTTPRequest(
+            self.introspection_url,
+            method="POST",
+            headers=headers,
+            body=urlencode(dict(token=access_token, token_type_hint="access_token")),
+            connect_timeout=self.userdata_connect_timeout,
+            request_timeout=self.userdata_request_timeout,
+            decompress_response=self.http_decompress_response,
+        )
+        response = await self._fetch_upstream(
+            UpstreamEndpoint.introspection, req, "introspecting access token", idempotent=True
+        )
+
+        if response is not None:
+            self.introspection_cache.set(cache_key, response, ttl=introspection_ttl(response))
+        return response
+
+    async def _get_introspection_profile(self, token_response):
+        """Build the user profile from the introspection of the access token.
+
+        Args:
+            token_response (dict): Dict with the token response from OAuth 2.0 authorization.
+
+        Returns:
+            Union[bool, dict]: The user profile, False if the token is not active, or None
+                               if the response does not provide the required fields.
+        """
+        response = await self._introspect_token(token_response["access_token"])
+
+        if not response or not response.get("active"):
+            return False
+
+        return profile_from_introspection(response, self.introspection_required_claims)
+
+    async def _get_jwks(self):
+        """Retrieve the JSON Web Key Set of the OAuth 2.0 service."""
+        req = HTTPRequest(
+            self.jwks_url,
+            headers={"Accept": "application/json"},
+            connect_timeout=self.userdata_connect_timeout,
+            request_timeout=self.userdata_request_timeout,
+            decompress_response=self.http_decompress_response,
+        )
+        return await self._fetch_upstream(
+            UpstreamEndpoint.jwks, req, "fetching signing keys", idempotent=True
+        )
+
+    async def _get_discovery_document(self):
+        """Retrieve the OpenID Connect discovery document of the OAuth 2.0 service."""
+        req = HTTPRequest(
+            self.oidc_discovery_url,
+            headers={"Accept": "application/json"},
+            connect_timeout=self.userdata_connect_timeout,
+            request_timeout=self.userdata_request_timeout,
+            decompress_response=self.http_decompress_response,
+        )
+        return await self._fetch_upstream(
+            UpstreamEndpoint.discovery, req, "fetching discovery document", idempotent=True
+        )
+
+    async def _get_id_token_profile(self, token_response):
+        """Build the user profile from the verified ``id_token`` claims.
+
+        Args:
+            token_response (dict): Dict with the token response from OAuth 2.0 authorization.
+
+        Returns:
+            Union[None, dict]: The user profile, or None if the id_token is missing,
+                               invalid or does not provide the required claims.
+        """
+        id_token = token_response.get("id_token")
+        if not id_token:
+            return None
+
+        try:
+            claims = await self.jwks.decode(
+                id_token,
+                algorithms=self.jwt_algorithms,
+                audience=self.client_id or None,
+                issuer=self.oauth_issuer or None,
+                options=dict(verify_aud=bool(self.client_id)),
+            )
+        except jwt.InvalidTokenError as e:
+            self.log.warning(f"Could not verify the id_token: {e}")
+            return None
+        except Exception as e:
+            self.log.warning(f"Could not fetch the signing keys to verify the id_token: {e}")
+            return None
+
+        return profile_from_claims(claims, self.id_token_required_claims)
+
+    async def _validate_access_token(self, access_token):
+        """Validate a JWT access token locally.
+
+        Args:
+            access_token (str): Access token.
+
+        Returns:
+            Union[None, dict]: The token claims, or None if the token is not valid
+                               for at least ``access_token_min_validity`` seconds
+                               or the signing keys are unavailable.
+        """
+        try:
+            claims = await self.jwks.decode(
+                access_token,
+                algorithms=self.jwt_algorithms,
+                issuer=self.oauth_issuer or None,
+                options=dict(require=["exp"], verify_aud=False),
+            )
+        except jwt.InvalidTokenError as e:
+            self.log.debug(f"Access token is not valid: {e}")
+            return None
+        except Exception as e:
+            # the token could not be validated locally, the OAuth 2.0 service decides.
+            self.log.warning(f"Could not fetch the signing keys to validate the access token: {e}")
+            return None
+
+        if claims["exp"] - time.time() < self.access_token_min_validity:
+            return None
+        return claims
+
+    async def _get_user_profile(self, token_response):
+        """Retrieve the user profile, from the id_token claims, the token introspection or ``userdata_url``.
+
+        Args:
+            token_response (dict): Dict with the token response from OAuth 2.0 authorization.
+
+        Returns:
+            Union[None, dict]: The user profile, or None if the access token is not active.
+        """
+        if self.id_token_profile:
+            user_profile = await self._get_id_token_profile(token_response)
+            if user_profile is not None:
+                return user_profile
+
+        if self.token_introspection:
+            user_profile = await self._get_introspection_profile(token_response)
+            if user_profile is False:
+                return None
+            if user_profile is not None:
+                return user_profile
+
+        return await self._get_user_data(token_response)
 
     @staticmethod
     def _create_auth_state(token_response, user_data_response):
@@ -206,13 +1333,18 @@ class BrazilDataCubeOAuthenticator(OAuthenticator, BrazilDataCubeOAuthMixin):
         if isinstance(scope, str):
             scope = scope.split(" ")  # a list of scopes!
 
-        return {
+        auth_state = {
             "scope": scope,
             "access_token": access_token,
             "refresh_token": refresh_token,
             "oauth_user": user_data_response,
         }
 
+        if token_response.get("expires_in"):
+            auth_state["expires_at"] = time.time() + int(token_response["expires_in"])
+
+        return auth_state
+
     async def authenticate(self, handler, data=None):
         """Overwritten method for authentication with the Brazil Data Cube OAuth 2.0.
 
@@ -226,35 +1358,481 @@ class BrazilDataCubeOAuthenticator(OAuthenticator, BrazilDataCubeOAuthMixin):
             Union[None, dict]: If user roles are not valid, return None. Otherwise, return the user
                                profile in a dict.
         """
-        code = handler.get_argument("code")
+        with self.tracer.span("authenticate") as span:
+            start = time.perf_counter()
+            timings = collect_upstream_timings()
+            code = handler.get_argument("code")
+            # a leaked code replayed from another session (state) must not reuse the exchange.
+            login_key = token_cache_key(f"{code}\n{handler.get_argument('state', '')}")
+
+            try:
+                exchange = self._login_results.get(login_key)
+                span.set_attribute("cache_hit", exchange is not None)
+                if exchange is None:
+                    exchange = await self._login_calls.do(
+                        login_key, self._exchange_code, handler, code, login_key
+                    )
+                token_resp_json, user_data_resp_json = exchange
+            except Exception as e:
+                # hub-side throttling is not a failure of the OAuth 2.0 service.
+                if isinstance(e, AdmissionRejected):
+                    outcome = AuthenticationOutcome.rejected
+                else:
+                    outcome = AuthenticationOutcome.upstream_error
+                AUTHENTICATION_OUTCOMES.labels(outcome=outcome).inc()
+                span.set_attribute("outcome", str(outcome))
+                self._audit_authentication(outcome, None, timings, start, error=e)
+                raise
+
+            user_info = self._build_user_info(token_resp_json, user_data_resp_json)
+
+            if user_info is not None and self.sync_groups:
+                self._sync_groups_on_login(handler, user_info)
+
+            if user_info is not None:
+                self._remember_user(self.normalize_username(user_info["name"]), user_info)
+
+            if user_info is None:
+                outcome = AuthenticationOutcome.denied
+            elif user_info["admin"]:
+                outcome = AuthenticationOutcome.admin
+            else:
+                outcome = AuthenticationOutcome.allowed
+            AUTHENTICATION_OUTCOMES.labels(outcome=outcome).inc()
+            span.set_attribute("outcome", str(outcome))
+            self._audit_authentication(outcome, user_data_resp_json, timings, start)
+
+        return user_info
+
+    def _audit_authentication(self, outcome, user_profile, timings, start, error=None):
+        """Queue the audit record of an authentication decision, when enabled.
+
+        Args:
+            outcome (AuthenticationOutcome): The decision.
+
+            user_profile (dict): User profile, or None if it is unknown.
+
+            timings (dict): Seconds spent in each endpoint of the OAuth 2.0 service.
+
+            start (float): ``time.perf_counter`` at the start of the authentication.
+
+            error (Exception): Error of the OAuth 2.0 service.
+        """
+        if self.audit_log is None:
+            return
+
+        user_profile = user_profile or {}
+        entry = dict(
+            time=time.time(),
+            event="authenticate",
+            user=user_profile.get("email"),
+            outcome=str(outcome),
+            allowed=outcome in (AuthenticationOutcome.allowed, AuthenticationOutcome.admin),
+            admin=outcome == AuthenticationOutcome.admin,
+            roles_matched=self.role_matcher.matched_roles(user_profile),
+            upstream=dict(timings),
+            duration=time.perf_counter() - start,
+        )
+        if error is not None:
+            entry["error"] = repr(error)
+
+        self.audit_log.record(entry)
 
+    async def _exchange_code(self, handler, code, login_key):
+        """Exchange the authorization code for the tokens and the user profile.
+
+        Repeated callbacks with the same code and state share this exchange, since
+        the OAuth 2.0 service accepts each code only once (see ``login_dedup_ttl``).
+
+        Args:
+            handler (tornado.web.RequestHandler): the current request handler.
+
+            code (str): Authorization code.
+
+            login_key (str): Hash of the authorization code and the callback state.
+
+        Returns:
+            tuple: The token response and the user profile.
+        """
         params = dict(
             redirect_uri=self.get_callback_url(handler),
             code=code,
             grant_type="authorization_code",
         )
 
-        headers = self._get_headers()
+        token_resp_json = await self._get_token(self._get_headers(), params)
+        user_data_resp_json = await self._get_user_profile(token_resp_json)
+
+        # stored before the in-flight call is released, so no callback misses both.
+        self._login_results.set(login_key, (token_resp_json, user_data_resp_json))
+        return token_resp_json, user_data_resp_json
+
+    def _build_user_info(self, token_response, user_data_response):
+        """Build the JupyterHub user info from the OAuth 2.0 responses.
+
+        Args:
+            token_response (dict): Token response.
+
+            user_data_response (dict): User data response.
+
+        Returns:
+            Union[None, dict]: If user roles are not valid, return None. Otherwise, return the user
+                               profile in a dict.
+        """
+        with self.tracer.span("evaluate_roles") as span, ROLE_EVALUATION_DURATION_SECONDS.time():
+            decision = user_data_response and self.role_matcher.decide(
+                user_data_response
+            )
+            span.set_attribute("allowed", bool(decision and decision.allowed))
+            span.set_attribute("admin", bool(decision and decision.admin))
+
+        if decision and decision.allowed:
+            if self.compact_auth_state:
+                # the role policy may match the roles of any application.
+                user_data_response = project_user_profile(
+                    user_data_response,
+                    self.auth_state_profile_keys,
+                    None if self.role_policy_file else self.oauth_application_name,
+                )
 
-        token_resp_json = await self._get_token(headers, params)
-        user_data_resp_json = await self._get_user_data(token_resp_json)
+            with self.tracer.span("create_auth_state") as span:
+                auth_state = self._create_auth_state(token_response, user_data_response)
+                if self.degraded_grace_period > 0:
+                    auth_state["validated_at"] = time.time()
 
-        if user_data_resp_json and self._is_user_roles_valid(user_data_resp_json):
-            user_info = {
-                "name": user_data_resp_json["email"],
-                "auth_state": self._create_auth_state(
-                    token_resp_json, user_data_resp_json
-                ),
-                "admin": self._is_user_admin(user_data_resp_json),
+                report = auth_state_size_report(auth_state)
+                AUTH_STATE_SIZE_BYTES.observe(report["total"])
+                span.set_attribute("payload_size", report["total"])
+                self.log.debug(f"Auth state size (bytes): {report}")
+
+            return {
+                "name": user_data_response["email"],
+                "auth_state": auth_state,
+                "admin": decision.admin,
             }
+
+        self.log.info(
+            "The user does not have the necessary permissions to access the service. Please, check the user roles"
+        )
+        return None
+
+    def _sync_groups_on_login(self, handler, user_info):
+        """Synchronize the groups of an existing user, or keep them until the user is added."""
+        user_profile = user_info["auth_state"]["oauth_user"]
+        name = self.normalize_username(user_info["name"])
+
+        user = handler.find_user(name)
+        if user is None:
+            self._pending_groups.set(name, user_profile)
         else:
-            self.log.info(
-                "The user does not have the necessary permissions to access the service. Please, check the user roles"
+            self._sync_groups(user, user_profile)
+
+    async def refresh_user(self, user, handler=None):
+        """Refresh the user tokens with the Brazil Data Cube OAuth 2.0 ``refresh_token`` grant.
+
+        Concurrent refreshes of the same user (e.g. several tabs or servers) are
+        merged into a single request to the OAuth 2.0 service. Nothing is refreshed
+        while the stored access token is valid for ``access_token_min_validity`` seconds.
+
+        Args:
+            user (jupyterhub.user.User): the user to refresh.
+
+            handler (tornado.web.RequestHandler): the current request handler.
+
+        Returns:
+            Union[bool, dict]: True if there is nothing to refresh, False if the user
+                               must login again. Otherwise, the refreshed user info.
+        """
+        if self._serve_warm(user):
+            return True
+
+        with self.tracer.span("refresh_user") as span:
+            user_info = await self._refresh_calls.do(user.name, self._refresh_user, user)
+            span.set_attribute("refreshed", isinstance(user_info, dict))
+            return user_info
+
+    def _serve_warm(self, user):
+        """Accept the first refresh of a user after a restart from the warm cache.
+
+        The stored profile is evaluated again with the current roles, and the user is
+        validated with the OAuth 2.0 service in background (see ``warm_cache_revalidate_rate``).
+
+        Returns:
+            bool: True if the user was served from the warm cache.
+        """
+        if self.warm_cache is None or user.name in self._warm_checked:
+            return False
+
+        self._warm_checked.add(user.name)
+
+        entry = self.warm_cache.get(user.name)
+        if entry is None:
+            return False
+
+        decision = self.role_matcher.decide(entry["profile"])
+        if not decision.allowed or decision.admin != user.admin:
+            return False
+
+        self.revalidator.submit(user)
+        return True
+
+    def _remember_user(self, name, user_info):
+        """Keep the validated profile of a user in the warm cache, when enabled."""
+        if self.warm_cache is not None:
+            # the user was just validated, the next refresh must not be served from the cache.
+            self._warm_checked.add(name)
+            self.warm_cache.put(
+                name, user_info["auth_state"]["oauth_user"], user_info["admin"]
             )
 
-            user_info = None
+    def _is_user_active(self, user):
+        """Check if the tokens of a user must still be refreshed in background.
+
+        Args:
+            user (jupyterhub.user.User): The user.
+
+        Returns:
+            bool: True if the user has a running server or was active within
+                  ``proactive_refresh_idle_timeout`` seconds.
+        """
+        if self.proactive_refresh_idle_timeout <= 0 or getattr(user, "active", False):
+            return True
+
+        last_activity = getattr(user, "last_activity", None)
+        if last_activity is None:
+            return False
+        if last_activity.tzinfo is None:
+            # JupyterHub keeps naive UTC datetimes.
+            last_activity = last_activity.replace(tzinfo=timezone.utc)
+
+        return time.time() - last_activity.timestamp() < self.proactive_refresh_idle_timeout
+
+    def forget_user(self, name):
+        """Stop refreshing a user that logged out or must login again.
+
+        Args:
+            name (str): User name.
+        """
+        self.refresh_scheduler.unschedule(name)
+        if self.warm_cache is not None:
+            self.warm_cache.delete(name)
+
+    async def _refresh_user(self, user, force=False):
+        """Exchange the stored refresh token for a new access token."""
+        auth_state = await user.get_auth_state()
+
+        if not auth_state or not auth_state.get("refresh_token"):
+            return True
+
+        self._schedule_refresh(user, auth_state)
+
+        expires_at = auth_state.get("expires_at")
+        if (
+            not force
+            and expires_at is not None
+            and expires_at - time.time() >= self.access_token_min_validity
+        ):
+            # the access token is still valid, as in get_access_token.
+            return True
+
+        if (
+            not force
+            and self.access_token_validation
+            and auth_state.get("access_token")
+            and await self._validate_access_token(auth_state["access_token"])
+        ):
+            return True
+
+        params = dict(
+            grant_type="refresh_token",
+            refresh_token=auth_state["refresh_token"],
+        )
+
+        try:
+            token_resp_json = await self._get_token(self._get_headers(), params)
+        except Exception as e:
+            if isinstance(e, HTTPClientError) and e.code in (400, 401):
+                # refresh token expired or revoked
+                self.forget_user(user.name)
+                return False
+            if self._accept_degraded(user, auth_state, e):
+                return True
+            raise
+
+        # the old access token was rotated, so its user data must not be reused.
+        if auth_state.get("access_token"):
+            cache_key = token_cache_key(auth_state["access_token"])
+            self.userdata_cache.pop(cache_key)
+            self.introspection_cache.pop(cache_key)
+
+        # the service may not rotate the refresh token.
+        if not token_resp_json.get("refresh_token"):
+            token_resp_json["refresh_token"] = auth_state["refresh_token"]
+
+        try:
+            user_data_resp_json = await self._get_user_profile(token_resp_json)
+            degraded = False
+        except Exception as e:
+            # keep the new tokens, that may have replaced the stored ones.
+            if not self._accept_degraded(user, auth_state, e):
+                raise
+            user_data_resp_json = auth_state["oauth_user"]
+            degraded = True
+
+        user_info = self._build_user_info(token_resp_json, user_data_resp_json)
+
+        if user_info is None:
+            self.forget_user(user.name)
+            return False
+
+        if degraded:
+            user_info["auth_state"]["validated_at"] = auth_state["validated_at"]
+        else:
+            self._remember_user(user.name, user_info)
+
+        self._schedule_refresh(user, user_info["auth_state"])
+
+        if self.sync_groups:
+            self._sync_groups(user, user_info["auth_state"]["oauth_user"])
+
+        return user_info
+
+    def _accept_degraded(self, user, auth_state, error):
+        """Check if a refresh that failed with the error can keep the stored profile.
+
+        It is accepted when the OAuth 2.0 service is unavailable (network or 5xx errors,
+        open circuit), the profile was validated less than ``degraded_grace_period``
+        seconds ago and its roles are still allowed.
+
+        Returns:
+            bool: True if the stored profile is accepted.
+        """
+        if self.degraded_grace_period <= 0:
+            return False
+        if not is_service_failure(error):
+            return False
+
+        validated_at = auth_state.get("validated_at")
+        user_profile = auth_state.get("oauth_user")
+        if validated_at is None or not user_profile:
+            return False
+
+        staleness = time.time() - validated_at
+        if (
+            staleness > self.degraded_grace_period
+            or not self.role_matcher.decide(user_profile).allowed
+        ):
+            DEGRADED_REFRESHES.labels(outcome="rejected").inc()
+            return False
+
+        DEGRADED_REFRESHES.labels(outcome="accepted").inc()
+        DEGRADED_STALENESS_SECONDS.observe(staleness)
+        self.log.warning(
+            f"Brazil Data Cube OAuth unavailable ({error}), accepting the profile of {user.name}"
+            f" validated {int(staleness)} seconds ago"
+        )
+        return True
+
+    def _schedule_refresh(self, user, auth_state):
+        """Schedule the background refresh of the user tokens, when enabled."""
+        if self.proactive_refresh and auth_state.get("expires_at"):
+            self.refresh_scheduler.schedule(user, auth_state["expires_at"])
+
+    async def _refresh_and_store(self, user):
+        """Refresh the user tokens outside of a user request and store them.
+
+        Used by the background refresh, the warm cache and the access token broker.
+
+        Returns:
+            Union[bool, dict]: The result of the refresh, see ``refresh_user``.
+        """
+        user_info = await self._refresh_calls.do(
+            user.name, self._refresh_user, user, force=True
+        )
+
+        if isinstance(user_info, dict):
+            await user.save_auth_state(user_info["auth_state"])
+            if user_info["admin"] != user.admin:
+                user.admin = user_info["admin"]
+                user.db.commit()
+
         return user_info
 
+    async def get_access_token(self, user):
+        """Get a fresh access token of the user, for the access token broker.
+
+        The token is refreshed, once for all the concurrent callers, when it expires
+        in less than ``access_token_min_validity`` seconds.
+
+        Args:
+            user (jupyterhub.user.User): the user.
+
+        Returns:
+            Union[None, dict]: Dict with the ``access_token``, ``token_type`` and ``expires_at``
+                               (or None when unknown), or None if the user must login again.
+        """
+        auth_state = await user.get_auth_state()
+        if not auth_state or not auth_state.get("access_token"):
+            return None
+
+        expires_at = auth_state.get("expires_at")
+        if expires_at is not None and expires_at - time.time() < self.access_token_min_validity:
+            user_info = await self._refresh_and_store(user)
+            if not user_info:
+                return None
+            if isinstance(user_info, dict):
+                auth_state = user_info["auth_state"]
+
+        return dict(
+            access_token=auth_state["access_token"],
+            token_type="Bearer",
+            expires_at=auth_state.get("expires_at"),
+        )
+
+    def get_handlers(self, app):
+        """Add the access token broker to the OAuth handlers, when enabled.
+
+        Args:
+            app (jupyterhub.app.JupyterHub): the JupyterHub application.
+
+        Returns:
+            list: List of ``('/url', Handler)`` tuples.
+        """
+        handlers = super().get_handlers(app)
+        if self.access_token_broker:
+            handlers.append((url_path_join("/api", ACCESS_TOKEN_PATH), AccessTokenHandler))
+        return handlers
+
+    async def pre_spawn_start(self, user, spawner):
+        """Prepare the spawn of a user server.
+
+        Schedule the background refresh of the user tokens and give the server
+        the access token and the url of the access token broker, when enabled.
+
+        Args:
+            user (jupyterhub.user.User): the user spawning a server.
+
+            spawner (jupyterhub.spawner.Spawner): the user server spawner.
+        """
+        schedule = self.proactive_refresh and user.name not in self.refresh_scheduler
+        if not schedule and not self.spawn_access_token and not self.access_token_broker:
+            return
+
+        auth_state = await user.get_auth_state()
+        if not auth_state:
+            return
+
+        if schedule:
+            self._schedule_refresh(user, auth_state)
+
+        if self.spawn_access_token and auth_state.get("access_token"):
+            spawner.environment["BDC_ACCESS_TOKEN"] = auth_state["access_token"]
+
+        if self.access_token_broker:
+            spawner.environment["BDC_ACCESS_TOKEN_URL"] = url_path_join(
+                spawner.hub.api_url, ACCESS_TOKEN_PATH
+            )
+
     def normalize_username(self, username):
         """Normalize username to a generic and useful pattern."""
-        return convert_user_name_pattern(username)
+        return convert_user_name_pattern(username, self.username_collision_safe)
@@ -0,0 +1,133 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth role policy file.
+
+The policy is a JSON document with the role patterns (see ``RolePatternSet``)::
+
+    {
+        "allowed_roles": ["jupyter:*", "re:bdc-(stac|wtss):user"],
+        "admin_roles": ["jupyter:admin", "*:superuser"]
+    }
+"""
+
+import json
+import logging
+import os
+import re
+
+from tornado.ioloop import PeriodicCallback
+
+#: Keys of the role policy document.
+POLICY_KEYS = ("allowed_roles", "admin_roles")
+
+
+def load_role_policy(path):
+    """Read and validate a role policy file.
+
+    Args:
+        path (str): Policy file path.
+
+    Returns:
+        dict: Dict with the ``allowed_roles`` and ``admin_roles`` patterns.
+
+    Raises:
+        ValueError: When the document is not a valid policy.
+    """
+    with open(path) as fp:
+        document = json.load(fp)
+
+    if not isinstance(document, dict):
+        raise ValueError("The role policy must be a JSON object")
+
+    unknown = set(document) - set(POLICY_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown role policy keys: {sorted(unknown)}")
+
+    policy = {}
+    for key in POLICY_KEYS:
+        patterns = document.get(key, [])
+        if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+            raise ValueError(f"The role policy {key} must be a list of strings")
+        policy[key] = patterns
+
+    return policy
+
+
+class RolePolicyWatcher:
+    """Reload a role policy file when it changes, polling its modification time.
+
+    An invalid policy is logged and ignored, keeping the previous one.
+
+    Args:
+        path (str): Policy file path.
+
+        on_change (Callable): Called with each loaded policy (dict). It may raise
+                              ``ValueError`` or ``re.error`` to reject the policy.
+
+        interval (float): Seconds between two checks of the file.
+
+        log (logging.Logger): Logger for the reloads and errors.
+    """
+
+    def __init__(self, path, on_change, interval=10, log=None):
+        """Build the watcher, without any policy."""
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.log = log or logging.getLogger(__name__)
+        self.policy = None
+        self._mtime = None
+        self._missing = False
+        self._periodic = None
+
+    def check(self):
+        """Load the policy if the file changed since the last check.
+
+        Returns:
+            bool: True if a new policy was loaded.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            if not self._missing:
+                self.log.error(f"Role policy {self.path} is unavailable, keeping the current roles: {e}")
+                self._missing = True
+            self._mtime = None
+            return False
+
+        self._missing = False
+
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        try:
+            policy = load_role_policy(self.path)
+            self.on_change(policy)
+        except (OSError, ValueError, re.error) as e:
+            self.log.error(f"Ignoring the role policy {self.path}: {e}")
+            return False
+
+        self.policy = policy
+        self.log.info(f"Role policy loaded from {self.path}")
+        return True
+
+    def start(self):
+        """Load the policy now and check the file every ``interval`` seconds."""
+        self.check()
+
+        if self._periodic is None:
+            self._periodic = PeriodicCallback(self.check, self.interval * 1000)
+            self._periodic.start()
+
+    def stop(self):
+        """Stop checking the file."""
+        if self._periodic is not None:
+            self._periodic.stop()
+            self._periodic = None
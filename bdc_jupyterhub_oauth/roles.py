@@ -0,0 +1,329 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth Roles."""
+
+import fnmatch
+import re
+from collections import namedtuple
+
+RoleDecision = namedtuple("RoleDecision", ["allowed", "admin"])
+"""Access decision for a user profile: ``allowed`` to login and ``admin`` privileges."""
+
+
+def index_roles(roles):
+    """Group the Brazil Data Cube OAuth roles by application name.
+
+    Args:
+        roles (list): List of user roles, in the ``<application>:<role>`` format.
+
+    Returns:
+        dict: Dict with the application name as key and the frozenset of its roles as value.
+
+    Example:
+        index_roles(['jupyter:admin', 'bdc:user']) -> {'jupyter': {'admin'}, 'bdc': {'user'}}
+    """
+    index = {}
+
+    for role in roles or []:
+        application_name, sep, role_name = role.partition(":")
+        if sep:
+            index.setdefault(application_name, set()).add(role_name.split(":", 1)[0])
+
+    return {name: frozenset(names) for name, names in index.items()}
+
+
+def qualified_roles(roles):
+    """Normalize the Brazil Data Cube OAuth roles to ``<application>:<role>``.
+
+    Args:
+        roles (list): List of user roles.
+
+    Returns:
+        frozenset: The roles with an application name.
+
+    Example:
+        qualified_roles(['jupyter:admin:x', 'invalid']) -> {'jupyter:admin'}
+    """
+    qualified = set()
+
+    for role in roles or []:
+        application_name, sep, role_name = role.partition(":")
+        if sep:
+            qualified.add(f"{application_name}:{role_name.split(':', 1)[0]}")
+
+    return frozenset(qualified)
+
+
+class RolePatternSet:
+    """Role patterns compiled into a single matcher.
+
+    Each pattern matches the whole ``<application>:<role>`` string and may be:
+
+    - an exact role, such as ``jupyter:admin``;
+    - a wildcard pattern, such as ``*:admin`` or ``jupyter:teacher-*``;
+    - a regular expression prefixed with ``re:``, such as ``re:bdc-(stac|wtss):.+``.
+
+    Patterns without an application name belong to ``application_name``. The exact roles
+    are kept in a frozenset and the other patterns are merged into one regular expression,
+    whose result is memoized by role. So each role costs one set lookup, and one regular
+    expression match the first time it is seen, whatever the number of patterns.
+
+    Args:
+        patterns (Iterable[str]): Role patterns.
+
+        application_name (str): Application of the patterns without an application name.
+
+        cache_size (int): Maximum number of memoized roles.
+    """
+
+    def __init__(self, patterns, application_name, cache_size=4096):
+        """Compile the patterns."""
+        exact, expressions = set(), []
+
+        for pattern in patterns:
+            if pattern.startswith("re:"):
+                expressions.append(pattern[3:])
+                continue
+
+            if ":" not in pattern:
+                pattern = f"{application_name}:{pattern}"
+
+            if any(char in pattern for char in "*?["):
+                expressions.append(fnmatch.translate(pattern))
+            else:
+                exact.add(pattern)
+
+        self.exact = frozenset(exact)
+        self.regex = (
+            re.compile("|".join(f"(?:{expression})" for expression in expressions))
+            if expressions
+            else None
+        )
+        self.cache_size = cache_size
+        self._cache = {}
+
+    def __bool__(self):
+        """Check if there is any pattern."""
+        return bool(self.exact) or self.regex is not None
+
+    def matches(self, role):
+        """Check if a qualified role matches any pattern."""
+        if role in self.exact:
+            return True
+        if self.regex is None:
+            return False
+
+        matched = self._cache.get(role)
+        if matched is None:
+            matched = self.regex.fullmatch(role) is not None
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[role] = matched
+        return matched
+
+    def match_any(self, roles):
+        """Check if any of the qualified roles matches a pattern."""
+        return any(self.matches(role) for role in roles)
+
+
+class RoleMatcher:
+    """Decide the access of user profiles from the roles of one application.
+
+    The ``allowed_roles`` and ``admin_roles`` are compiled once into frozensets,
+    so a decision parses the profile roles once and only does set lookups.
+
+    Args:
+        application_name (str): Name of the application registered in the Brazil Data Cube OAuth.
+
+        allowed_roles (list): Roles allowed to login.
+
+        admin_roles (list): Roles with admin privileges.
+
+    Note:
+        As in ``BrazilDataCubeOAuthenticator._check_user_roles``, an empty list of roles
+        matches every user.
+    """
+
+    def __init__(self, application_name, allowed_roles, admin_roles):
+        """Compile the role sets."""
+        self.application_name = application_name
+        self.allowed_roles = frozenset(allowed_roles)
+        self.admin_roles = frozenset(admin_roles)
+
+    def application_roles(self, user_profile):
+        """Return the roles of the user profile in this application.
+
+        Args:
+            user_profile (dict): User profile.
+
+        Returns:
+            frozenset: Role names, without the application prefix.
+        """
+        return index_roles(user_profile.get("roles")).get(
+            self.application_name, frozenset()
+        )
+
+    def decide(self, user_profile):
+        """Decide the access of a user profile.
+
+        Args:
+            user_profile (dict): User profile.
+
+        Returns:
+            RoleDecision: The allow and admin decisions.
+        """
+        roles = self.application_roles(user_profile)
+
+        return RoleDecision(
+            self._match(self.allowed_roles, roles), self._match(self.admin_roles, roles)
+        )
+
+    def decide_many(self, user_profiles):
+        """Decide the access of many user profiles with the same compiled roles.
+
+        Args:
+            user_profiles (Iterable[dict]): User profiles.
+
+        Returns:
+            list: List of ``RoleDecision``, in the same order of the profiles.
+        """
+        allowed_roles, admin_roles, match = self.allowed_roles, self.admin_roles, self._match
+
+        decisions = []
+        for user_profile in user_profiles:
+            roles = self.application_roles(user_profile or {})
+            decisions.append(
+                RoleDecision(match(allowed_roles, roles), match(admin_roles, roles))
+            )
+        return decisions
+
+    def matched_roles(self, user_profile):
+        """Return the roles of the user profile that are allowed or grant admin privileges.
+
+        Args:
+            user_profile (dict): User profile.
+
+        Returns:
+            list: Sorted role names, in the ``<application>:<role>`` format.
+        """
+        roles = self.application_roles(user_profile)
+        if self.allowed_roles:
+            roles = roles & (self.allowed_roles | self.admin_roles)
+        return sorted(f"{self.application_name}:{role}" for role in roles)
+
+    def match(self, user_profile, valid_roles):
+        """Check if the user profile provides at least one of the given roles.
+
+        Args:
+            user_profile (dict): User profile.
+
+            valid_roles (frozenset): Role names.
+
+        Returns:
+            bool: Boolean indicating if the user has valid roles.
+        """
+        if not valid_roles:
+            return True
+        return self._match(valid_roles, self.application_roles(user_profile))
+
+    @staticmethod
+    def _match(valid_roles, roles):
+        """Check if any role is valid, an empty set of valid roles matches everything."""
+        return not valid_roles or not valid_roles.isdisjoint(roles)
+
+
+class PolicyRoleMatcher(RoleMatcher):
+    """Decide the access of user profiles from role patterns of any application.
+
+    See ``RolePatternSet`` for the pattern syntax. As in ``RoleMatcher``, no allowed
+    pattern allows every user, but no admin pattern grants admin privileges to nobody.
+
+    Args:
+        application_name (str): Name of the application registered in the Brazil Data Cube OAuth.
+
+        allowed_roles (list): Patterns of the roles allowed to login.
+
+        admin_roles (list): Patterns of the roles with admin privileges.
+    """
+
+    def __init__(self, application_name, allowed_roles, admin_roles):
+        """Compile the role patterns."""
+        super().__init__(application_name, allowed_roles, admin_roles)
+        self.allowed_patterns = RolePatternSet(allowed_roles, application_name)
+        self.admin_patterns = RolePatternSet(admin_roles, application_name)
+
+    def decide(self, user_profile):
+        """Decide the access of a user profile.
+
+        Args:
+            user_profile (dict): User profile.
+
+        Returns:
+            RoleDecision: The allow and admin decisions.
+        """
+        roles = qualified_roles(user_profile.get("roles"))
+
+        return RoleDecision(
+            not self.allowed_patterns or self.allowed_patterns.match_any(roles),
+            self.admin_patterns.match_any(roles),
+        )
+
+    def matched_roles(self, user_profile):
+        """Return the roles of the user profile that match the allowed or admin patterns.
+
+        Args:
+            user_profile (dict): User profile.
+
+        Returns:
+            list: Sorted role names, in the ``<application>:<role>`` format.
+        """
+        return sorted(
+            role
+            for role in qualified_roles(user_profile.get("roles"))
+            if self.allowed_patterns.matches(role) or self.admin_patterns.matches(role)
+        )
+
+    def decide_many(self, user_profiles):
+        """Decide the access of many user profiles with the same compiled patterns.
+
+        Args:
+            user_profiles (Iterable[dict]): User profiles.
+
+        Returns:
+            list: List of ``RoleDecision``, in the same order of the profiles.
+        """
+        return [self.decide(user_profile or {}) for user_profile in user_profiles]
+
+
+class DenyingRoleMatcher(RoleMatcher):
+    """Deny every user profile, used while no valid role policy is loaded.
+
+    Args:
+        application_name (str): Name of the application registered in the Brazil Data Cube OAuth.
+    """
+
+    def __init__(self, application_name):
+        """Build the matcher without any role."""
+        super().__init__(application_name, [], [])
+
+    def decide(self, user_profile):
+        """Deny the user profile."""
+        return RoleDecision(False, False)
+
+    def decide_many(self, user_profiles):
+        """Deny all the user profiles."""
+        return [RoleDecision(False, False) for _ in user_profiles]
+
+    def matched_roles(self, user_profile):
+        """Return no role."""
+        return []
+
+    def match(self, user_profile, valid_roles):
+        """Match no role."""
+        return False
@@ -0,0 +1,159 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth proactive token refresh."""
+
+import asyncio
+import logging
+import random
+import time
+
+from tornado.ioloop import PeriodicCallback
+
+
+class TokenRefreshScheduler:
+    """Refresh the user tokens in background, before they expire.
+
+    Each user is scheduled ``lead_time`` seconds (minus a random ``jitter``) before
+    the expiration of the access token. The scheduler wakes up every ``interval``
+    seconds and refreshes the due users, at most ``max_concurrency`` at a time, so
+    the token endpoint sees a smooth load instead of bursts on the spawn path.
+
+    Only the users accepted by ``is_active`` are refreshed, the others are dropped from
+    the schedule when they are due, so the load follows the active users. At most
+    ``max_users`` are scheduled, the least recently scheduled are dropped first.
+
+    Args:
+        refresh (Callable): Coroutine function called with the user to refresh.
+
+        lead_time (float): Seconds before the expiration to refresh the token.
+
+        jitter (float): Maximum random seconds subtracted from the refresh time.
+
+        max_concurrency (int): Maximum number of concurrent refreshes.
+
+        interval (float): Seconds between two checks of the due users.
+
+        timer (Callable): Clock of the expiration times (epoch seconds).
+
+        log (logging.Logger): Logger for the refresh errors.
+
+        is_active (Callable): Called with a due user, returns False to stop refreshing it.
+                              Every user is active when it is None.
+
+        max_users (int): Maximum number of scheduled users. Use 0 for no limit.
+    """
+
+    def __init__(
+        self,
+        refresh,
+        lead_time=300,
+        jitter=60,
+        max_concurrency=10,
+        interval=15,
+        timer=time.time,
+        log=None,
+        is_active=None,
+        max_users=0,
+    ):
+        """Build an empty scheduler, that starts with the first scheduled user."""
+        self.refresh = refresh
+        self.lead_time = lead_time
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.interval = interval
+        self.timer = timer
+        self.log = log or logging.getLogger(__name__)
+        self.is_active = is_active
+        self.max_users = max_users
+        self._due = {}  # user name -> (due time, user), the least recently scheduled first
+        self._running = set()
+        self._periodic = None
+
+    def __len__(self):
+        """Return the number of scheduled users."""
+        return len(self._due)
+
+    def __contains__(self, name):
+        """Check if the user is scheduled."""
+        return name in self._due
+
+    def schedule(self, user, expires_at):
+        """Schedule the refresh of the user tokens.
+
+        Args:
+            user (jupyterhub.user.User): The user.
+
+            expires_at (float): Expiration time of the access token, in epoch seconds.
+        """
+        due = expires_at - self.lead_time - random.uniform(0, self.jitter)
+        self._due.pop(user.name, None)
+        self._due[user.name] = (due, user)
+
+        if self.max_users and len(self._due) > self.max_users:
+            evicted = next(iter(self._due))
+            self._due.pop(evicted)
+            self.log.debug(f"Too many scheduled users, no longer refreshing {evicted}")
+
+        self.start()
+
+    def unschedule(self, name):
+        """Stop refreshing the user tokens."""
+        self._due.pop(name, None)
+
+    def start(self):
+        """Start checking the due users in background."""
+        if self._periodic is None:
+            self._periodic = PeriodicCallback(self.run_due, self.interval * 1000)
+            self._periodic.start()
+
+    def stop(self):
+        """Stop checking the due users."""
+        if self._periodic is not None:
+            self._periodic.stop()
+            self._periodic = None
+
+    async def run_due(self):
+        """Refresh the users whose tokens are about to expire.
+
+        The users are removed from the schedule before their refresh,
+        a successful refresh schedules them again with the new expiration.
+        The inactive users are only removed.
+        """
+        now = self.timer()
+        due = sorted(
+            (due_at, name)
+            for name, (due_at, _) in self._due.items()
+            if due_at <= now and name not in self._running
+        )
+        if not due:
+            return
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def refresh(name):
+            entry = self._due.pop(name, None)
+            if entry is None:
+                # unscheduled (e.g. logout) or evicted since the due users were listed.
+                return
+
+            _, user = entry
+            if self.is_active is not None and not self.is_active(user):
+                self.log.debug(f"No longer refreshing the tokens of the inactive user {name}")
+                return
+
+            async with semaphore:
+                self._running.add(name)
+                try:
+                    await self.refresh(user)
+                except Exception as e:
+                    self.log.warning(f"Could not refresh the tokens of {name}: {e}")
+                finally:
+                    self._running.discard(name)
+
+        await asyncio.gather(*(refresh(name) for _, name in due))
@@ -0,0 +1,248 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth tracing.
+
+The spans of a login (authenticate, token and user data requests, role
+evaluation, auth state creation) are nested with ``contextvars``, so the
+spans of concurrent logins never mix. Finished spans go to an exporter:
+
+- ``InMemoryExporter``: keeps the spans in a list, for tests;
+- ``JSONLinesFileExporter``: appends one JSON document per span to a file;
+- ``OpenTelemetryExporter``: bridges the spans to OpenTelemetry (requires ``opentelemetry-api``).
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # pragma: no cover
+    otel_trace = None
+
+_current_span = contextvars.ContextVar("bdc_oauth_current_span", default=None)
+
+
+def _new_id():
+    """Return a random 64-bit identifier, as hexadecimal."""
+    return os.urandom(8).hex()
+
+
+class Span:
+    """A timed operation, with attributes.
+
+    Args:
+        name (str): Operation name.
+
+        parent (Span): Enclosing span, or None for the root span of a trace.
+
+        attributes (dict): Initial attributes.
+    """
+
+    def __init__(self, name, parent=None, attributes=None):
+        """Start the span."""
+        self.name = name
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else _new_id() + _new_id()
+        self.span_id = _new_id()
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start_time = time.time()
+        self.duration = None
+        self._start = time.perf_counter()
+
+    def set_attribute(self, key, value):
+        """Set an attribute of the span."""
+        self.attributes[key] = value
+
+    def set_error(self, error):
+        """Mark the span as failed."""
+        self.status = "error"
+        self.attributes["error"] = repr(error)
+
+    def end(self):
+        """Stop the span timer."""
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self):
+        """Serialize the span.
+
+        Returns:
+            dict: Dict with the span name, ids, times, status and attributes.
+        """
+        return dict(
+            name=self.name,
+            trace_id=self.trace_id,
+            span_id=self.span_id,
+            parent_id=self.parent_id,
+            start_time=self.start_time,
+            duration=self.duration,
+            status=self.status,
+            attributes=self.attributes,
+        )
+
+
+class _NoopSpan:
+    """Span of a disabled tracer, that records nothing."""
+
+    def set_attribute(self, key, value):
+        """Ignore the attribute."""
+
+    def set_error(self, error):
+        """Ignore the error."""
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Create the spans and send them to an exporter.
+
+    Args:
+        exporter: Object with ``export(span)``, called with each finished span, and
+                  optionally ``start(span)``, called with each started span.
+                  None disables the tracing.
+
+        log (logging.Logger): Logger for the exporter errors.
+    """
+
+    def __init__(self, exporter=None, log=None):
+        """Build the tracer."""
+        self.exporter = exporter
+        self.log = log or logging.getLogger(__name__)
+
+    @property
+    def enabled(self):
+        """Check if the spans are recorded."""
+        return self.exporter is not None
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Record the enclosed block as a span, child of the current span.
+
+        Args:
+            name (str): Operation name.
+
+            attributes: Initial attributes of the span.
+
+        Yields:
+            Span: The span, to set more attributes.
+        """
+        if self.exporter is None:
+            yield NOOP_SPAN
+            return
+
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        self._call("start", span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            span.end()
+            _current_span.reset(token)
+            self._call("export", span)
+
+    def _call(self, method, span):
+        """Call an exporter method, never failing the traced operation."""
+        fn = getattr(self.exporter, method, None)
+        if fn is None:
+            return
+
+        try:
+            fn(span)
+        except Exception as e:
+            self.log.warning(f"Could not {method} the span {span.name}: {e}")
+
+
+class InMemoryExporter:
+    """Keep the finished spans in memory."""
+
+    def __init__(self):
+        """Build an empty exporter."""
+        self.spans = []
+
+    def export(self, span):
+        """Keep the span."""
+        self.spans.append(span)
+
+    def clear(self):
+        """Remove all the spans."""
+        self.spans.clear()
+
+
+class JSONLinesFileExporter:
+    """Append the finished spans to a file, as JSON lines.
+
+    Args:
+        path (str): File path.
+    """
+
+    def __init__(self, path):
+        """Open the file for appending."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._fp = open(path, "a", buffering=1)
+
+    def export(self, span):
+        """Write the span."""
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._fp.write(line + "\n")
+
+    def close(self):
+        """Close the file."""
+        self._fp.close()
+
+
+class OpenTelemetryExporter:
+    """Bridge the spans to OpenTelemetry, keeping their hierarchy.
+
+    Args:
+        tracer_provider: OpenTelemetry tracer provider. Defaults to the global provider.
+    """
+
+    def __init__(self, tracer_provider=None):
+        """Get the OpenTelemetry tracer."""
+        if otel_trace is None:
+            raise RuntimeError(
+                "The OpenTelemetry bridge requires opentelemetry-api. "
+                "Please, install it with 'pip install bdc-jupyterhub-oauth[opentelemetry]'"
+            )
+
+        self._tracer = otel_trace.get_tracer("bdc_jupyterhub_oauth", tracer_provider=tracer_provider)
+        self._spans = {}
+
+    def start(self, span):
+        """Start the OpenTelemetry span, as child of the parent span."""
+        parent = self._spans.get(span.parent_id)
+        context = otel_trace.set_span_in_context(parent) if parent is not None else None
+        self._spans[span.span_id] = self._tracer.start_span(
+            span.name, context=context, start_time=int(span.start_time * 1e9)
+        )
+
+    def export(self, span):
+        """End the OpenTelemetry span, with the attributes and status."""
+        otel_span = self._spans.pop(span.span_id, None)
+        if otel_span is None:
+            return
+
+        for key, value in span.attributes.items():
+            otel_span.set_attribute(key, value if isinstance(value, (bool, int, float, str)) else str(value))
+
+        if span.status == "error":
+            otel_span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+
+        otel_span.end(end_time=int((span.start_time + span.duration) * 1e9))
@@ -8,7 +8,13 @@
 
 """Brazil Data Cube JupyterHub OAuth Utilities."""
 
-import re
+import hashlib
+import json
+
+#: Characters of an email that are not valid in a Unix username.
+USER_NAME_SEPARATORS = " ,.@"
+
+_USER_NAME_TABLE = str.maketrans(USER_NAME_SEPARATORS, "_" * len(USER_NAME_SEPARATORS))
 
 
 def filter_roles_by_application_name(application_name, roles):
@@ -28,11 +34,14 @@ def filter_roles_by_application_name(application_name, roles):
     )
 
 
-def convert_user_name_pattern(name):
+def convert_user_name_pattern(name, collision_safe=False):
     """Convert the user's email into a valid Unix username.
 
     Args:
         name (str): User Email
+        collision_safe (bool): Append a short hash of the email when any character was
+            replaced, so that e.g. ``a.b@x`` and ``a_b@x`` get distinct usernames.
+            Names that are already normalized are kept as is.
 
     Returns:
         str: formatted email
@@ -40,4 +49,84 @@ def convert_user_name_pattern(name):
     Example:
         user_name_pattern('myemail@brazildatacube.org') -> myemail_brazildatacube_org
     """
-    return re.sub("[ ,.@]", "_", name)
+    username = name.translate(_USER_NAME_TABLE)
+
+    if collision_safe and username != name:
+        digest = hashlib.sha256(name.encode("utf8")).hexdigest()[:8]
+        username = f"{username}-{digest}"
+
+    return username
+
+
+def convert_user_names(names, collision_safe=False):
+    """Convert many emails at once, e.g. to migrate an existing user table.
+
+    Args:
+        names (Iterable[str]): User Emails
+        collision_safe (bool): See ``convert_user_name_pattern``.
+
+    Returns:
+        dict: Dict with the email as key and the username as value
+    """
+    return {name: convert_user_name_pattern(name, collision_safe) for name in names}
+
+
+def find_user_name_collisions(names, collision_safe=False):
+    """Find the emails that are converted to the same username.
+
+    Args:
+        names (Iterable[str]): User Emails
+        collision_safe (bool): See ``convert_user_name_pattern``.
+
+    Returns:
+        dict: Dict with the colliding username as key and the sorted list of its emails as value
+    """
+    usernames = {}
+    for name, username in convert_user_names(names, collision_safe).items():
+        usernames.setdefault(username, []).append(name)
+
+    return {
+        username: sorted(names)
+        for username, names in usernames.items()
+        if len(names) > 1
+    }
+
+
+def project_user_profile(user_profile, keys, application_name):
+    """Keep only the selected keys and the application roles of the user profile.
+
+    Args:
+        user_profile (dict): User profile (returned by Brazil Data Cube OAuth Service)
+        keys (list): Profile keys to keep. ``email`` (the user name) and ``roles`` are always kept.
+        application_name (str): application name, or None to keep the roles of every application
+    Returns:
+        dict: The projected user profile
+    """
+    projection = {
+        key: user_profile[key] for key in ["email", *keys] if key in user_profile
+    }
+    if application_name is None:
+        projection["roles"] = list(user_profile.get("roles") or [])
+    else:
+        projection["roles"] = filter_roles_by_application_name(
+            application_name, user_profile.get("roles")
+        )
+    return projection
+
+
+def auth_state_size_report(auth_state):
+    """Report the size of each auth state key, serialized as JSON.
+
+    Args:
+        auth_state (dict): Auth state
+    Returns:
+        dict: Dict with the size in bytes of each key and the ``total`` size
+
+    Example:
+        auth_state_size_report({'scope': ['openid']}) -> {'scope': 10, 'total': 21}
+    """
+    report = {
+        key: len(json.dumps(value).encode("utf8")) for key, value in auth_state.items()
+    }
+    report["total"] = len(json.dumps(auth_state).encode("utf8"))
+    return report
@@ -0,0 +1,229 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Brazil Data Cube JupyterHub OAuth persistent warm cache."""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from tornado.ioloop import IOLoop
+
+
+class ProfileStore:
+    """Recently validated user profiles and role decisions, kept in a local SQLite file.
+
+    It survives hub restarts, so the users can be served from it while they are
+    validated again with the Brazil Data Cube OAuth 2.0 service in background.
+
+    The changes made inside the event loop are kept in memory and written in a
+    single transaction, in a thread, every ``flush_interval`` seconds, so the logins
+    and refreshes never wait for the disk.
+
+    Args:
+        path (str): SQLite database file.
+
+        ttl (float): Seconds an entry is valid.
+
+        timer (Callable): Clock of the expiration times (epoch seconds).
+
+        flush_interval (float): Maximum seconds a change waits to be written.
+
+        log (logging.Logger): Logger for the write errors.
+    """
+
+    def __init__(self, path, ttl=3600, timer=time.time, flush_interval=1, log=None):
+        """Open the database, creating the table when needed."""
+        self.path = path
+        self.ttl = ttl
+        self.timer = timer
+        self.flush_interval = flush_interval
+        self.log = log or logging.getLogger(__name__)
+        # changes waiting to be written, by user name: a row, or None for a removal.
+        self._writes = {}
+        self._flushing = {}
+        self._task = None
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            " name TEXT PRIMARY KEY,"
+            " profile TEXT NOT NULL,"
+            " admin INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def __len__(self):
+        """Return the number of changes waiting to be written."""
+        return len(self._writes) + len(self._flushing)
+
+    def get(self, name):
+        """Retrieve a valid entry.
+
+        Args:
+            name (str): User name.
+
+        Returns:
+            Union[None, dict]: Dict with the ``profile`` and ``admin`` decision, or None if
+                               there is no valid entry.
+        """
+        for writes in (self._writes, self._flushing):
+            if name in writes:
+                row = writes[name]
+                if row is None or row[2] <= self.timer():
+                    return None
+                return dict(profile=json.loads(row[0]), admin=bool(row[1]))
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT profile, admin FROM profiles WHERE name = ? AND expires_at > ?",
+                (name, self.timer()),
+            ).fetchone()
+
+        if row is None:
+            return None
+        return dict(profile=json.loads(row[0]), admin=bool(row[1]))
+
+    def put(self, name, profile, admin):
+        """Store the profile of a user that was allowed to login.
+
+        Args:
+            name (str): User name.
+
+            profile (dict): User profile.
+
+            admin (bool): Admin decision.
+        """
+        self._change(name, (json.dumps(profile), int(admin), self.timer() + self.ttl))
+
+    def delete(self, name):
+        """Remove the entry of a user."""
+        self._change(name, None)
+
+    def _change(self, name, row):
+        """Queue a change, written now when there is no event loop."""
+        self._writes[name] = row
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            writes, self._writes = self._writes, {}
+            self._write(writes)
+            return
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        """Write the queued changes until there is none."""
+        while self._writes:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Write the queued changes now, in a thread."""
+        if not self._writes:
+            return
+
+        self._flushing, self._writes = self._writes, {}
+        try:
+            await IOLoop.current().run_in_executor(None, self._write, self._flushing)
+        except Exception as e:
+            self.log.error(f"Could not write {len(self._flushing)} warm cache entries: {e}")
+        finally:
+            self._flushing = {}
+
+    def _write(self, writes):
+        """Write the changes in a single transaction."""
+        puts = [(name, *row) for name, row in writes.items() if row is not None]
+        deletes = [(name,) for name, row in writes.items() if row is None]
+
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO profiles (name, profile, admin, expires_at) VALUES (?, ?, ?, ?)",
+                puts,
+            )
+            self._db.executemany("DELETE FROM profiles WHERE name = ?", deletes)
+
+    def purge_expired(self):
+        """Remove the expired entries.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "DELETE FROM profiles WHERE expires_at <= ?", (self.timer(),)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        """Write the queued changes and close the database."""
+        writes, self._writes = self._writes, {}
+        if writes:
+            self._write(writes)
+        self._db.close()
+
+
+class Revalidator:
+    """Validate users in background, at a bounded rate.
+
+    Args:
+        revalidate (Callable): Coroutine function called with the user to validate.
+
+        rate (float): Maximum number of validations per second.
+
+        log (logging.Logger): Logger for the validation errors.
+    """
+
+    def __init__(self, revalidate, rate=5, log=None):
+        """Build an idle revalidator, that starts with the first submitted user."""
+        self.revalidate = revalidate
+        self.rate = rate
+        self.log = log or logging.getLogger(__name__)
+        self._queue = asyncio.Queue()
+        self._pending = set()
+        self._task = None
+
+    def __len__(self):
+        """Return the number of users waiting for validation."""
+        return len(self._pending)
+
+    def submit(self, user):
+        """Queue the validation of a user, once."""
+        if user.name in self._pending:
+            return
+
+        self._pending.add(user.name)
+        self._queue.put_nowait(user)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        """Validate the queued users."""
+        while not self._queue.empty():
+            user = self._queue.get_nowait()
+            try:
+                await self.revalidate(user)
+            except Exception as e:
+                self.log.warning(f"Could not validate {user.name} again: {e}")
+            finally:
+                self._pending.discard(user.name)
+
+            if self.rate > 0:
+                await asyncio.sleep(1 / self.rate)
+
+    async def join(self):
+        """Wait until the queued users are validated."""
+        if self._task is not None:
+            await self._task
@@ -0,0 +1,90 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Measurement helpers shared by the benchmarks."""
+
+import asyncio
+import math
+import time
+
+
+def percentile(values, q):
+    """Return the ``q`` percentile (0-100) of the values, with the nearest-rank method."""
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    """Return the p50, p95, p99 and max of the values.
+
+    Returns:
+        dict: Dict with the percentiles of the values.
+    """
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values, default=0.0),
+    }
+
+
+class EventLoopLagMonitor:
+    """Measure how late the event loop wakes up a sleeping task.
+
+    A healthy hub wakes the monitor on time; a lag of hundreds of milliseconds
+    means that every request of the hub waits as long.
+
+    Args:
+        interval (float): Seconds between two samples.
+    """
+
+    def __init__(self, interval=0.01):
+        """Build an idle monitor."""
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        """Sample the event loop lag until cancelled."""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(time.perf_counter() - start - self.interval, 0.0))
+
+    def start(self):
+        """Start sampling."""
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stop sampling."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def summary(self):
+        """Return the percentiles of the sampled lags."""
+        return summarize(self.lags)
+
+
+def print_report(title, report):
+    """Print a benchmark report, with the durations in milliseconds."""
+    print(title)
+    for section, values in report.items():
+        if isinstance(values, dict):
+            formatted = ", ".join(f"{k}={v * 1000:.2f}ms" for k, v in values.items())
+            print(f"  {section:<18} {formatted}")
+        else:
+            print(f"  {section:<18} {values}")
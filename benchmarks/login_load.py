@@ -0,0 +1,146 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Login load test of ``BrazilDataCubeOAuthenticator.authenticate`` against a local mock OAuth.
+
+Usage::
+
+    python -m benchmarks.login_load --logins 2000 --concurrency 200 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from bdc_jupyterhub_oauth import BrazilDataCubeOAuthenticator
+
+from .common import EventLoopLagMonitor, print_report, summarize
+from .mock_server import MockOAuthServer, MockSettings
+
+
+class LoginCallbackHandler:
+    """Stand-in for the OAuth callback handler, carrying the authorization code."""
+
+    def __init__(self, code):
+        """Keep the authorization code."""
+        self.code = code
+
+    def get_argument(self, name, default=None):
+        """Return the authorization code."""
+        return self.code if name == "code" else default
+
+
+def build_authenticator(server, **config):
+    """Build an authenticator that talks with the mock server."""
+    return BrazilDataCubeOAuthenticator(
+        token_url=server.token_url,
+        userdata_url=server.userdata_url,
+        oauth_callback_url="http://127.0.0.1/hub/oauth_callback",
+        client_id="benchmark",
+        client_secret="benchmark",
+        **config,
+    )
+
+
+async def run_logins(authenticator, logins, concurrency):
+    """Authenticate ``logins`` distinct users, at most ``concurrency`` at a time.
+
+    Returns:
+        tuple: The latency of each successful login and the number of failures.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def login(i):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await authenticator.authenticate(LoginCallbackHandler(f"user{i}@inpe.br"))
+            except Exception:
+                failures += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    return latencies, failures
+
+
+async def benchmark(logins=1000, concurrency=100, settings=None, **config):
+    """Run the login load test.
+
+    Args:
+        logins (int): Number of logins.
+
+        concurrency (int): Number of concurrent logins.
+
+        settings (MockSettings): Behaviour of the mocked OAuth.
+
+        config: Traits of the authenticator.
+
+    Returns:
+        dict: Report with latency percentiles, throughput and event loop lag.
+    """
+    server = MockOAuthServer(settings)
+    server.start()
+    authenticator = build_authenticator(server, **config)
+
+    monitor = EventLoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    try:
+        latencies, failures = await run_logins(authenticator, logins, concurrency)
+    finally:
+        elapsed = time.perf_counter() - start
+        await monitor.stop()
+        server.stop()
+
+    return {
+        "logins": logins,
+        "concurrency": concurrency,
+        "failures": failures,
+        "upstream requests": sum(
+            count for path, count in server.settings.requests.items() if path != "errors"
+        ),
+        "throughput": f"{len(latencies) / elapsed:.1f} logins/s",
+        "latency": summarize(latencies),
+        "event loop lag": monitor.summary(),
+    }
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02, help="mean upstream latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="upstream latency jitter (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream 503s")
+    parser.add_argument("--http-client", default="auto", help="http_client_kind of the authenticator")
+    parser.add_argument("--verbose", action="store_true", help="show the request logs")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.getLogger("tornado").setLevel(logging.CRITICAL)
+
+    settings = MockSettings(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    report = asyncio.run(
+        benchmark(
+            args.logins,
+            args.concurrency,
+            settings,
+            http_client_kind=args.http_client,
+            http_max_clients=args.concurrency,
+        )
+    )
+    print_report("Login load test", report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Local stand-in for the Brazil Data Cube OAuth token and user data endpoints."""
+
+import asyncio
+import json
+import random
+import uuid
+from collections import Counter
+from urllib.parse import parse_qs
+
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.web import Application, HTTPError, RequestHandler
+
+TOKEN_PATH = "/auth/v1/oauth/token"
+USERDATA_PATH = "/auth/v1/users/me"
+
+
+class MockSettings:
+    """Behaviour of the mocked Brazil Data Cube OAuth.
+
+    Args:
+        latency (float): Mean latency of each response, in seconds.
+
+        jitter (float): Maximum random variation added to the latency, in seconds.
+
+        error_rate (float): Fraction of the requests answered with ``503``.
+
+        roles (list): Roles of the mocked users.
+
+        expires_in (int): Lifetime of the issued access tokens, in seconds.
+    """
+
+    def __init__(self, latency=0.02, jitter=0.01, error_rate=0.0, roles=None, expires_in=3600):
+        """Build the settings."""
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.roles = ["jupyter:user"] if roles is None else roles
+        self.expires_in = expires_in
+        self.requests = Counter()
+        self.users = {}  # access and refresh tokens -> user email
+
+
+class MockHandler(RequestHandler):
+    """Base handler, adding the configured latency and errors."""
+
+    def initialize(self, settings):
+        """Keep the mock settings."""
+        self.mock = settings
+
+    async def prepare(self):
+        """Wait for the latency and fail the configured fraction of the requests."""
+        self.mock.requests[self.request.path] += 1
+
+        delay = self.mock.latency + random.uniform(0, self.mock.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if random.random() < self.mock.error_rate:
+            self.mock.requests["errors"] += 1
+            raise HTTPError(503)
+
+    def write_json(self, data):
+        """Write a JSON response."""
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(data))
+
+
+class TokenHandler(MockHandler):
+    """Token endpoint, with the ``authorization_code`` and ``refresh_token`` grants.
+
+    Any authorization code is accepted and identifies the user: ``<email>``.
+    """
+
+    def post(self):
+        """Issue a new access token."""
+        params = {k: v[0] for k, v in parse_qs(self.request.body.decode("utf8")).items()}
+        grant_type = params.get("grant_type")
+
+        if grant_type == "authorization_code":
+            email = params.get("code")
+        elif grant_type == "refresh_token":
+            email = self.mock.users.get(params.get("refresh_token"))
+        else:
+            email = None
+
+        if not email:
+            self.set_status(400)
+            return self.write_json({"error": "invalid_grant"})
+
+        access_token, refresh_token = uuid.uuid4().hex, uuid.uuid4().hex
+        self.mock.users[access_token] = email
+        self.mock.users[refresh_token] = email
+
+        self.write_json(
+            {
+                "access_token": access_token,
+                "refresh_token": refresh_token,
+                "token_type": "Bearer",
+                "expires_in": self.mock.expires_in,
+                "scope": "openid email",
+            }
+        )
+
+
+class UserDataHandler(MockHandler):
+    """User data endpoint (``/users/me``)."""
+
+    def get(self):
+        """Return the profile of the token owner."""
+        token = self.request.headers.get("Authorization", "").split(" ")[-1]
+        email = self.mock.users.get(token)
+
+        if email is None:
+            raise HTTPError(401)
+
+        self.write_json(
+            {
+                "email": email,
+                "id": abs(hash(email)) % 100000,
+                "name": email.split("@")[0],
+                "profile": {"institution": "INPE", "occupation": "Researcher"},
+                "roles": self.mock.roles,
+            }
+        )
+
+
+class MockOAuthServer:
+    """Local HTTP server mocking the Brazil Data Cube OAuth.
+
+    Args:
+        settings (MockSettings): Behaviour of the mocked endpoints.
+
+    Example:
+        server = MockOAuthServer(MockSettings(latency=0.05)); server.start(); server.token_url
+    """
+
+    def __init__(self, settings=None):
+        """Build the server, that listens after ``start``."""
+        self.settings = settings or MockSettings()
+        self.app = Application(
+            [
+                (TOKEN_PATH, TokenHandler, dict(settings=self.settings)),
+                (USERDATA_PATH, UserDataHandler, dict(settings=self.settings)),
+            ]
+        )
+        self.server = None
+        self.port = None
+
+    @property
+    def base_url(self):
+        """URL of the running server."""
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def token_url(self):
+        """Token endpoint URL."""
+        return self.base_url + TOKEN_PATH
+
+    @property
+    def userdata_url(self):
+        """User data endpoint URL."""
+        return self.base_url + USERDATA_PATH
+
+    def start(self):
+        """Listen in an unused local port, in the current IOLoop."""
+        sock, self.port = bind_unused_port()
+        self.server = HTTPServer(self.app)
+        self.server.add_sockets([sock])
+
+    def stop(self):
+        """Stop listening."""
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
@@ -0,0 +1,182 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Refresh storm of ``BrazilDataCubeOAuthenticator.refresh_user`` against a local mock OAuth.
+
+It simulates the existing users of a restarted hub (or after a proxy reconnect),
+all of them refreshing their tokens at once, from several browser tabs.
+
+Usage::
+
+    python -m benchmarks.refresh_storm --users 5000 --calls-per-user 3 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+import tracemalloc
+import uuid
+
+from .common import EventLoopLagMonitor, print_report, summarize
+from .login_load import build_authenticator
+from .mock_server import MockOAuthServer, MockSettings
+
+
+class StormUser:
+    """Stand-in for ``jupyterhub.user.User``, with the auth state in memory."""
+
+    class _DB:
+        """Database session that commits nothing."""
+
+        def commit(self):
+            """Do nothing."""
+
+    def __init__(self, name, auth_state):
+        """Keep the user name and auth state."""
+        self.name = name
+        self.auth_state = auth_state
+        self.admin = False
+        self.db = self._DB()
+
+    async def get_auth_state(self):
+        """Return the auth state."""
+        return self.auth_state
+
+    async def save_auth_state(self, auth_state):
+        """Replace the auth state."""
+        self.auth_state = auth_state
+
+
+def seed_users(settings, users):
+    """Create users with a valid refresh token in the mock server.
+
+    Returns:
+        list: The users.
+    """
+    seeded = []
+    for i in range(users):
+        email = f"user{i}@inpe.br"
+        refresh_token = uuid.uuid4().hex
+        settings.users[refresh_token] = email
+        seeded.append(
+            StormUser(
+                email.replace("@", "_").replace(".", "_"),
+                {"access_token": uuid.uuid4().hex, "refresh_token": refresh_token},
+            )
+        )
+    return seeded
+
+
+async def run_storm(authenticator, users, calls_per_user):
+    """Call ``refresh_user`` ``calls_per_user`` times for each user, all at once.
+
+    Returns:
+        tuple: The latency of each successful call, the number of failures and
+               the number of users asked to login again.
+    """
+    latencies, failures, logouts = [], 0, 0
+
+    async def refresh(user):
+        nonlocal failures, logouts
+        start = time.perf_counter()
+        try:
+            result = await authenticator.refresh_user(user)
+        except Exception:
+            failures += 1
+            return
+
+        latencies.append(time.perf_counter() - start)
+        if result is False:
+            logouts += 1
+        elif isinstance(result, dict):
+            await user.save_auth_state(result["auth_state"])
+
+    await asyncio.gather(*(refresh(user) for user in users for _ in range(calls_per_user)))
+    return latencies, failures, logouts
+
+
+async def benchmark(users=1000, calls_per_user=2, settings=None, **config):
+    """Run the refresh storm.
+
+    Args:
+        users (int): Number of existing users.
+
+        calls_per_user (int): Concurrent ``refresh_user`` calls of each user.
+
+        settings (MockSettings): Behaviour of the mocked OAuth.
+
+        config: Traits of the authenticator.
+
+    Returns:
+        dict: Report with completion time, upstream requests, peak memory and event loop lag.
+    """
+    server = MockOAuthServer(settings)
+    server.start()
+    authenticator = build_authenticator(server, **config)
+    storm_users = seed_users(server.settings, users)
+
+    monitor = EventLoopLagMonitor()
+    monitor.start()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        latencies, failures, logouts = await run_storm(authenticator, storm_users, calls_per_user)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await monitor.stop()
+        server.stop()
+
+    return {
+        "users": users,
+        "calls": users * calls_per_user,
+        "failures": failures,
+        "logouts": logouts,
+        "upstream requests": sum(
+            count for path, count in server.settings.requests.items() if path != "errors"
+        ),
+        "completion time": f"{elapsed:.2f}s",
+        "peak memory": f"{peak_memory / 2 ** 20:.1f} MiB",
+        "latency": summarize(latencies),
+        "event loop lag": monitor.summary(),
+    }
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--calls-per-user", type=int, default=2, help="concurrent refreshes of each user")
+    parser.add_argument("--latency", type=float, default=0.02, help="mean upstream latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="upstream latency jitter (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream 503s")
+    parser.add_argument("--http-client", default="auto", help="http_client_kind of the authenticator")
+    parser.add_argument("--max-clients", type=int, default=64, help="http_max_clients of the authenticator")
+    parser.add_argument("--verbose", action="store_true", help="show the request logs")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.getLogger("tornado").setLevel(logging.CRITICAL)
+
+    settings = MockSettings(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    report = asyncio.run(
+        benchmark(
+            args.users,
+            args.calls_per_user,
+            settings,
+            http_client_kind=args.http_client,
+            http_max_clients=args.max_clients,
+        )
+    )
+    print_report("Refresh storm", report)
+
+
+if __name__ == "__main__":
+    main()
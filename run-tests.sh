@@ -7,8 +7,8 @@
 # under the terms of the MIT License; see LICENSE file for more details.
 #
 
-pydocstyle bdc_jupyterhub_oauth examples tests setup.py && \
-isort bdc_jupyterhub_oauth examples tests setup.py --check-only --diff && \
+pydocstyle bdc_jupyterhub_oauth benchmarks examples tests setup.py && \
+isort bdc_jupyterhub_oauth benchmarks examples tests setup.py --check-only --diff && \
 check-manifest --ignore ".travis.yml,.drone.yml,.readthedocs.yml,development_config.py" && \
 sphinx-build -qnW --color -b doctest docs/sphinx/ docs/sphinx/_build/doctest && \
 pytest
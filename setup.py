@@ -36,15 +36,30 @@ tests_require = [
     "pytest-asyncio==0.15.1",
     "mwoauth >= 0.3.7",
     "pre-commit",
-    "pyjwt",
+    "pyjwt[crypto]>=2.0",
     "requests-mock",
 ]
 
 examples_require = []
 
+jwt_require = [
+    "pyjwt[crypto]>=2.0",
+]
+
+curl_require = [
+    "pycurl>=7.43",
+]
+
+opentelemetry_require = [
+    "opentelemetry-api>=1.0",
+]
+
 extras_require = {
+    "curl": curl_require,
     "docs": docs_require,
     "examples": examples_require,
+    "jwt": jwt_require,
+    "opentelemetry": opentelemetry_require,
     "tests": tests_require,
 }
 
@@ -54,7 +69,12 @@ setup_requires = [
     "pytest-runner>=5.2",
 ]
 
-install_requires = ["oauthenticator==14.0.0", "traitlets>=4.3.2", "tornado>=5.1"]
+install_requires = [
+    "oauthenticator==14.0.0",
+    "prometheus_client>=0.4",
+    "traitlets>=4.3.2",
+    "tornado>=5.1",
+]
 
 packages = find_packages()
 
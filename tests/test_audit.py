@@ -0,0 +1,110 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Unit-test for Brazil Data Cube JupyterHub OAuth audit log."""
+
+import asyncio
+import json
+
+from pytest import mark
+
+from bdc_jupyterhub_oauth.audit import (
+    AuditLog,
+    RotatingJSONLinesSink,
+    collect_upstream_timings,
+    record_upstream_timing,
+)
+
+
+class ListSink:
+    """Keep the written batches in memory."""
+
+    def __init__(self):
+        self.batches = []
+
+    def write(self, records):
+        self.batches.append(records)
+
+
+@mark.asyncio
+async def test_audit_log_should_write_full_batches_without_waiting():
+    sink = ListSink()
+    audit = AuditLog(sink, batch_size=2, flush_interval=60)
+
+    assert all(audit.record({"n": n}) for n in range(5))
+    await asyncio.sleep(0.05)
+
+    assert sink.batches == [[{"n": 0}, {"n": 1}], [{"n": 2}, {"n": 3}], [{"n": 4}]]
+    assert len(audit) == 0
+
+    audit.record({"n": 5})
+    await audit.close()
+
+    assert sink.batches[-1] == [{"n": 5}]
+
+
+@mark.asyncio
+async def test_audit_log_should_write_partial_batches_after_the_flush_interval():
+    sink = ListSink()
+    audit = AuditLog(sink, batch_size=100, flush_interval=0.01)
+
+    audit.record({"n": 0})
+    await asyncio.sleep(0.1)
+    audit.record({"n": 1})
+    await asyncio.sleep(0.1)
+
+    assert sink.batches == [[{"n": 0}], [{"n": 1}]]
+
+
+@mark.asyncio
+async def test_audit_log_should_drop_the_records_it_cannot_keep():
+    class BrokenSink:
+        def write(self, records):
+            raise OSError("disk full")
+
+    drops = []
+    audit = AuditLog(BrokenSink(), batch_size=10, flush_interval=60, max_queue=3, on_drop=drops.append)
+
+    assert [audit.record({"n": n}) for n in range(4)] == [True, True, True, False]
+
+    await audit.close()
+
+    assert audit.dropped == 4
+    assert drops == [1, 3]
+
+
+@mark.asyncio
+async def test_upstream_timings_should_be_collected_per_task():
+    async def login(endpoints):
+        timings = collect_upstream_timings()
+        for endpoint in endpoints:
+            await asyncio.sleep(0)
+            record_upstream_timing(endpoint, 0.5)
+        return timings
+
+    first, second = await asyncio.gather(login(["token", "userdata"]), login(["token", "token"]))
+
+    assert first == {"token": 0.5, "userdata": 0.5}
+    assert second == {"token": 1.0}
+    record_upstream_timing("token", 1)
+
+
+def test_rotating_sink_should_write_json_lines_and_rotate(tmp_path):
+    path = tmp_path / "audit.jsonl"
+    sink = RotatingJSONLinesSink(str(path), max_bytes=200, backup_count=2)
+
+    for n in range(20):
+        sink.write([{"user": f"user{n}@inpe.br", "outcome": "allowed"}])
+    sink.close()
+
+    lines = path.read_text().splitlines()
+
+    assert json.loads(lines[-1]) == {"user": "user19@inpe.br", "outcome": "allowed"}
+    assert (tmp_path / "audit.jsonl.1").exists()
+    assert (tmp_path / "audit.jsonl.2").exists()
+    assert not (tmp_path / "audit.jsonl.3").exists()
@@ -8,11 +8,31 @@
 
 """Unit-test for Brazil Data Cube JupyterHub OAuth Client"""
 
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+from urllib.parse import parse_qs
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from oauthenticator.oauth2 import OAuthLogoutHandler
 from oauthenticator.tests.conftest import client, io_loop
 from oauthenticator.tests.mocks import setup_oauth_mock
-from pytest import fixture, mark
+from prometheus_client import REGISTRY
+from pytest import fixture, mark, raises
+from tornado import web
+from tornado.httpclient import HTTPClientError
 
 from bdc_jupyterhub_oauth import BrazilDataCubeOAuthenticator
+from bdc_jupyterhub_oauth.cache import token_cache_key
+from bdc_jupyterhub_oauth.concurrency import AdmissionRejected
+from bdc_jupyterhub_oauth.handlers import AccessTokenHandler, LogoutHandler
+from bdc_jupyterhub_oauth.httpclient import CircuitBreaker
+from bdc_jupyterhub_oauth.tracing import InMemoryExporter
+from bdc_jupyterhub_oauth.utils import auth_state_size_report
 
 
 def user_model(role):
@@ -44,6 +64,124 @@ def bdc_client(client):
     return client
 
 
+@fixture
+def bdc_refresh_client(bdc_client):
+    """Extend the mocked token endpoint with the ``refresh_token`` grant."""
+    bdc_client.refresh_requests = []
+    bdc_client.refresh_tokens = {}
+
+    paths = bdc_client.hosts["brazildatacube.dpi.inpe.br"]
+    token_path, access_token = paths[0]
+
+    def token(request):
+        query = parse_qs(request.body.decode("utf8"))
+        if query.get("grant_type") != ["refresh_token"]:
+            return access_token(request)
+
+        bdc_client.refresh_requests.append(query)
+        user = bdc_client.refresh_tokens.get(query["refresh_token"][0])
+        if user is None:
+            return 400
+
+        token = uuid.uuid4().hex
+        bdc_client.access_tokens[token] = user
+        return {"access_token": token, "token_type": "Bearer", "expires_in": 3600}
+
+    paths[0] = (token_path, token)
+    return bdc_client
+
+
+SIGNING_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def signed_token(claims, kid="bdc-key", key=SIGNING_KEY, expires_in=600):
+    """Return a JWT signed with the test key."""
+    claims = dict(iss="https://brazildatacube.dpi.inpe.br", exp=int(time.time()) + expires_in, **claims)
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+@fixture
+def bdc_jwt_client(client):
+    """Mock the Brazil Data Cube OAuth with id_token in the token response and a JWKS endpoint."""
+    setup_oauth_mock(
+        client,
+        host="brazildatacube.dpi.inpe.br",
+        access_token_path="/auth/v1/oauth/token",
+        user_path="/auth/v1/users/me",
+        token_request_style="jwt",
+    )
+    client.jwks_requests = 0
+    client.jwks_status = None
+
+    client.jwks_kid = "bdc-key"
+
+    def jwks(request):
+        client.jwks_requests += 1
+        if client.jwks_status:
+            return client.jwks_status
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(SIGNING_KEY.public_key()))
+        return {"keys": [dict(jwk, kid=client.jwks_kid, use="sig", alg="RS256")]}
+
+    client.hosts["brazildatacube.dpi.inpe.br"].append(("/auth/v1/jwks", jwks))
+    return client
+
+
+def jwt_authenticator(**kwargs):
+    """Return an authenticator that builds the user profile from the id_token."""
+    return BrazilDataCubeOAuthenticator(
+        id_token_profile=True,
+        jwks_url="https://brazildatacube.dpi.inpe.br/auth/v1/jwks",
+        **kwargs
+    )
+
+
+@fixture
+def bdc_introspection_client(bdc_client):
+    """Mock the token introspection endpoint of the Brazil Data Cube OAuth."""
+    bdc_client.introspection_requests = []
+
+    def introspect(request):
+        assert request.headers["Authorization"].startswith("Basic ")
+        token = parse_qs(request.body.decode("utf8"))["token"][0]
+        bdc_client.introspection_requests.append(token)
+
+        user = bdc_client.access_tokens.get(token)
+        if user is None:
+            return {"active": False}
+        return dict(active=True, exp=int(time.time()) + 600, client_id="jupyter", **user)
+
+    bdc_client.hosts["brazildatacube.dpi.inpe.br"].append(("/auth/v1/oauth/introspect", introspect))
+    return bdc_client
+
+
+def introspection_authenticator(**kwargs):
+    """Return an authenticator in token introspection mode."""
+    return BrazilDataCubeOAuthenticator(
+        token_introspection=True,
+        introspection_url="https://brazildatacube.dpi.inpe.br/auth/v1/oauth/introspect",
+        **kwargs,
+    )
+
+
+class MockUser:
+    """Minimal stand-in for ``jupyterhub.user.User``."""
+
+    def __init__(self, name, auth_state, admin=False):
+        self.name = name
+        self.auth_state = auth_state
+        self.admin = admin
+        self.active = False
+        self.last_activity = datetime.utcnow()
+        self.db = Mock()
+
+    async def get_auth_state(self):
+        await asyncio.sleep(0)
+        return self.auth_state
+
+    async def save_auth_state(self, auth_state):
+        self.auth_state = auth_state
+
+
 @mark.asyncio
 async def test_user_authenticated_informations(bdc_client):
     authenticator = BrazilDataCubeOAuthenticator()
@@ -103,3 +241,739 @@ async def test_when_user_role_is_not_allowed_jupyterhub_should_deny_the_user_acc
     user_info = await authenticator.authenticate(handler)
 
     assert user_info is None
+
+
+@mark.asyncio
+async def test_refresh_user_should_exchange_the_refresh_token(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator(admin_roles=["admin"])
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("admin")
+    user = MockUser("user_email_com", {"access_token": "old", "refresh_token": "refresh-me"})
+
+    user_info = await authenticator.refresh_user(user)
+
+    assert user_info["admin"]
+    assert user_info["auth_state"]["access_token"] != "old"
+    assert user_info["auth_state"]["refresh_token"] == "refresh-me"
+
+
+@mark.asyncio
+async def test_refresh_user_should_keep_the_access_token_until_it_is_about_to_expire(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator(access_token_min_validity=60)
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("user")
+    auth_state = {"access_token": "old", "refresh_token": "refresh-me", "expires_at": time.time() + 3600}
+    user = MockUser("user_email_com", auth_state)
+
+    assert await authenticator.refresh_user(user) is True
+    assert bdc_refresh_client.refresh_requests == []
+
+    user.auth_state["expires_at"] = time.time() + 30
+
+    assert isinstance(await authenticator.refresh_user(user), dict)
+    assert len(bdc_refresh_client.refresh_requests) == 1
+
+
+@mark.asyncio
+async def test_refresh_user_should_coalesce_concurrent_refreshes(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator()
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("user")
+    user = MockUser("user_email_com", {"access_token": "old", "refresh_token": "refresh-me"})
+
+    results = await asyncio.gather(*[authenticator.refresh_user(user) for _ in range(5)])
+
+    assert len(bdc_refresh_client.refresh_requests) == 1
+    assert all(result == results[0] for result in results)
+
+    await authenticator.refresh_user(user)
+
+    assert len(bdc_refresh_client.refresh_requests) == 2
+
+
+@mark.asyncio
+async def test_refresh_user_without_refresh_token_should_keep_auth_state(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator()
+    user = MockUser("user_email_com", {"access_token": "old", "refresh_token": None})
+
+    assert await authenticator.refresh_user(user) is True
+    assert bdc_refresh_client.refresh_requests == []
+
+
+@mark.asyncio
+async def test_refresh_user_with_revoked_refresh_token_should_require_login(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator()
+    user = MockUser("user_email_com", {"access_token": "old", "refresh_token": "revoked"})
+
+    assert await authenticator.refresh_user(user) is False
+
+
+@mark.asyncio
+async def test_user_data_should_be_cached_by_access_token(bdc_client):
+    authenticator = BrazilDataCubeOAuthenticator()
+    token = uuid.uuid4().hex
+    bdc_client.access_tokens[token] = user_model("user")
+    token_response = {"access_token": token, "token_type": "Bearer"}
+
+    first = await authenticator._get_user_data(token_response)
+    del bdc_client.access_tokens[token]
+    second = await authenticator._get_user_data(token_response)
+
+    assert first == second
+    assert authenticator.userdata_cache.stats() == dict(hits=1, misses=1, size=1)
+
+
+@mark.asyncio
+async def test_refresh_user_should_invalidate_the_rotated_access_token(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator()
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("user")
+    authenticator.userdata_cache.set(token_cache_key("old"), user_model("admin"))
+    user = MockUser("user_email_com", {"access_token": "old", "refresh_token": "refresh-me"})
+
+    await authenticator.refresh_user(user)
+
+    assert authenticator.userdata_cache.get(token_cache_key("old")) is None
+
+
+@mark.asyncio
+async def test_id_token_profile_should_skip_the_user_data_request(bdc_jwt_client):
+    authenticator = jwt_authenticator(admin_roles=["admin"])
+    user = dict(user_model("admin"), id_token=signed_token({"email": "token@email.com", "roles": ["jupyter:admin"]}))
+    handler = bdc_jwt_client.handler_for_user(user)
+    bdc_jwt_client.hosts["brazildatacube.dpi.inpe.br"][1] = ("/auth/v1/users/me", lambda request: 500)
+
+    user_info = await authenticator.authenticate(handler)
+
+    assert user_info["name"] == "token@email.com"
+    assert user_info["admin"]
+    assert "exp" not in user_info["auth_state"]["oauth_user"]
+
+
+@mark.asyncio
+async def test_id_token_profile_without_required_claims_should_fetch_user_data(bdc_jwt_client):
+    authenticator = jwt_authenticator()
+    user = dict(user_model("user"), id_token=signed_token({"email": "token@email.com"}))
+    handler = bdc_jwt_client.handler_for_user(user)
+
+    user_info = await authenticator.authenticate(handler)
+
+    assert user_info["name"] == "user@email.com"
+
+
+@mark.asyncio
+async def test_id_token_with_invalid_signature_should_fetch_user_data(bdc_jwt_client):
+    authenticator = jwt_authenticator()
+    forged_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    id_token = signed_token({"email": "forged@email.com", "roles": ["jupyter:user"]}, key=forged_key)
+    handler = bdc_jwt_client.handler_for_user(dict(user_model("user"), id_token=id_token))
+
+    user_info = await authenticator.authenticate(handler)
+
+    assert user_info["name"] == "user@email.com"
+
+
+@mark.asyncio
+async def test_refresh_user_with_valid_access_token_should_not_call_the_oauth_service(bdc_jwt_client):
+    authenticator = jwt_authenticator(access_token_validation=True)
+    access_token = signed_token({"sub": "99"})
+    user = MockUser("user_email_com", {"access_token": access_token, "refresh_token": "refresh-me"})
+
+    assert await authenticator.refresh_user(user) is True
+    assert await authenticator.refresh_user(user) is True
+    assert bdc_jwt_client.jwks_requests == 1
+
+
+@mark.asyncio
+async def test_refresh_user_with_access_token_about_to_expire_should_refresh_it(bdc_jwt_client):
+    authenticator = jwt_authenticator(access_token_validation=True, access_token_min_validity=60)
+    access_token = signed_token({"sub": "99"}, expires_in=30)
+    user = MockUser("user_email_com", {"access_token": access_token, "refresh_token": "revoked"})
+
+    assert await authenticator.refresh_user(user) is False
+
+
+@mark.asyncio
+async def test_refresh_user_without_signing_keys_should_use_the_refresh_token(bdc_jwt_client):
+    authenticator = jwt_authenticator(access_token_validation=True, upstream_retries=0)
+    bdc_jwt_client.jwks_status = 503
+    access_token = signed_token({"sub": "99"})
+    user = MockUser("user_email_com", {"access_token": access_token, "refresh_token": "revoked"})
+
+    assert await authenticator.refresh_user(user) is False
+    assert bdc_jwt_client.jwks_requests == 1
+
+
+@mark.asyncio
+async def test_expired_signing_keys_should_be_kept_while_the_oauth_service_is_down(bdc_jwt_client):
+    authenticator = jwt_authenticator(jwks_background_refresh=False, upstream_retries=0)
+    assert await authenticator._validate_access_token(signed_token({"sub": "99"}))
+
+    bdc_jwt_client.jwks_status = 503
+    authenticator.jwks._expires_at = 0
+
+    assert await authenticator._validate_access_token(signed_token({"sub": "99"}))
+    assert await authenticator._validate_access_token(signed_token({"sub": "99"}))
+    assert bdc_jwt_client.jwks_requests == 2
+
+
+@mark.asyncio
+async def test_access_token_with_unknown_key_should_fetch_the_keys_once_again(bdc_jwt_client):
+    authenticator = jwt_authenticator(jwks_background_refresh=False)
+
+    assert await authenticator._validate_access_token(signed_token({"sub": "99"}))
+
+    bdc_jwt_client.jwks_kid = "rotated-key"
+    authenticator.jwks.min_refresh_interval = 0
+    assert await authenticator._validate_access_token(signed_token({"sub": "99"}, kid="rotated-key"))
+    assert bdc_jwt_client.jwks_requests == 2
+
+    authenticator.jwks.min_refresh_interval = 60
+    assert await authenticator._validate_access_token(signed_token({"sub": "99"}, kid="unknown")) is None
+    assert bdc_jwt_client.jwks_requests == 2
+
+
+def sample(name, **labels):
+    """Return the current value of a metric sample."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@mark.asyncio
+async def test_authenticate_should_record_the_metrics(bdc_client):
+    authenticator = BrazilDataCubeOAuthenticator(allowed_roles=["user", "admin"], admin_roles=["admin"])
+    outcomes = "jupyterhub_bdc_oauth_authentication_outcomes_total"
+    responses = "jupyterhub_bdc_oauth_upstream_responses_total"
+    durations = "jupyterhub_bdc_oauth_upstream_request_duration_seconds_count"
+    before = {
+        outcome: sample(outcomes, outcome=outcome)
+        for outcome in ["allowed", "admin", "denied", "upstream_error"]
+    }
+    token_ok = sample(responses, endpoint="token", code="200")
+    token_forbidden = sample(responses, endpoint="token", code="403")
+    userdata_requests = sample(durations, endpoint="userdata")
+
+    await authenticator.authenticate(bdc_client.handler_for_user(user_model("user")))
+    await authenticator.authenticate(bdc_client.handler_for_user(user_model("admin")))
+    await authenticator.authenticate(bdc_client.handler_for_user(user_model("anotherole")))
+
+    handler = bdc_client.handler_for_user(user_model("user"))
+    handler.get_argument.return_value = "unknown-code"
+    with raises(HTTPClientError):
+        await authenticator.authenticate(handler)
+
+    for outcome in before:
+        assert sample(outcomes, outcome=outcome) == before[outcome] + 1
+    assert sample(responses, endpoint="token", code="200") == token_ok + 3
+    assert sample(responses, endpoint="token", code="403") == token_forbidden + 1
+    assert sample(durations, endpoint="userdata") == userdata_requests + 3
+
+
+@mark.asyncio
+async def test_compact_auth_state_should_keep_only_the_selected_profile(bdc_client):
+    authenticator = BrazilDataCubeOAuthenticator(compact_auth_state=True, admin_roles=["admin"])
+    user = dict(user_model("admin"), roles=["jupyter:admin", "bdc:user", "wtss:reader"])
+    handler = bdc_client.handler_for_user(user)
+
+    user_info = await authenticator.authenticate(handler)
+
+    assert user_info["admin"]
+    assert user_info["auth_state"]["oauth_user"] == {
+        "email": "user@email.com",
+        "id": 99,
+        "name": "User Name",
+        "roles": ["jupyter:admin"],
+    }
+
+
+@mark.asyncio
+async def test_compact_auth_state_should_always_keep_the_email(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator(compact_auth_state=True, auth_state_profile_keys=["id"])
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("user")
+
+    user_info = await authenticator.authenticate(bdc_refresh_client.handler_for_user(user_model("user")))
+
+    assert user_info["name"] == "user@email.com"
+    assert user_info["auth_state"]["oauth_user"] == {"email": "user@email.com", "id": 99, "roles": ["jupyter:user"]}
+
+    user = MockUser("user_email_com", {"access_token": "old", "refresh_token": "refresh-me"})
+
+    assert (await authenticator.refresh_user(user))["name"] == "user@email.com"
+
+
+@mark.asyncio
+async def test_compact_auth_state_should_keep_the_roles_of_other_applications_in_the_policy(
+    bdc_refresh_client, tmp_path
+):
+    path = tmp_path / "policy.json"
+    path.write_text(json.dumps({"allowed_roles": ["bdc-stac:user"]}))
+    authenticator = BrazilDataCubeOAuthenticator(
+        role_policy_file=str(path),
+        compact_auth_state=True,
+        degraded_grace_period=3600,
+        circuit_breaker_threshold=0,
+    )
+    profile = dict(user_model("user"), roles=["bdc-stac:user"])
+    bdc_refresh_client.refresh_tokens["refresh-me"] = profile
+    user = MockUser("user_email_com", {"access_token": "old", "refresh_token": "refresh-me"})
+
+    user.auth_state = (await authenticator.refresh_user(user))["auth_state"]
+    user.auth_state["expires_at"] = time.time()
+
+    assert user.auth_state["oauth_user"]["roles"] == ["bdc-stac:user"]
+    assert authenticator.decide_user_roles([user.auth_state["oauth_user"]]) == [(True, False)]
+
+    paths = bdc_refresh_client.hosts["brazildatacube.dpi.inpe.br"]
+    paths[0] = (paths[0][0], lambda request: 503)
+
+    assert await authenticator.refresh_user(user) is True
+    authenticator.role_policy.stop()
+
+
+def test_auth_state_size_report_should_measure_each_key():
+    auth_state = {"access_token": "token", "oauth_user": user_model("user")}
+
+    report = auth_state_size_report(auth_state)
+
+    assert report["access_token"] == len('"token"')
+    assert report["total"] > report["access_token"] + report["oauth_user"]
+
+
+@mark.asyncio
+async def test_proactive_refresh_should_refresh_the_tokens_before_they_expire(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator(
+        proactive_refresh=True, proactive_refresh_lead_time=60, proactive_refresh_jitter=0, admin_roles=["admin"]
+    )
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("admin")
+    auth_state = {"access_token": "old", "refresh_token": "refresh-me", "expires_at": time.time() + 30}
+    user = MockUser("user_email_com", auth_state)
+
+    await authenticator.pre_spawn_start(user, Mock())
+    assert user.name in authenticator.refresh_scheduler
+
+    await authenticator.refresh_scheduler.run_due()
+
+    assert len(bdc_refresh_client.refresh_requests) == 1
+    assert user.auth_state["access_token"] != "old"
+    assert user.auth_state["expires_at"] > time.time() + 3000
+    assert user.admin
+    user.db.commit.assert_called_once()
+
+    await authenticator.refresh_scheduler.run_due()
+
+    assert len(bdc_refresh_client.refresh_requests) == 1
+    authenticator.refresh_scheduler.stop()
+
+
+@mark.asyncio
+async def test_proactive_refresh_should_drop_the_idle_users(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator(proactive_refresh=True, proactive_refresh_idle_timeout=600)
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("user")
+    auth_state = {"access_token": "old", "refresh_token": "refresh-me", "expires_at": time.time() - 10}
+    idle = MockUser("idle", dict(auth_state))
+    idle.last_activity = datetime.utcnow() - timedelta(hours=1)
+    running = MockUser("running", dict(auth_state))
+    running.last_activity = idle.last_activity
+    running.active = True
+
+    for user in (idle, running):
+        await authenticator.pre_spawn_start(user, Mock())
+    await authenticator.refresh_scheduler.run_due()
+
+    assert len(bdc_refresh_client.refresh_requests) == 1
+    assert idle.auth_state["access_token"] == "old"
+    assert "idle" not in authenticator.refresh_scheduler
+    assert "running" in authenticator.refresh_scheduler
+    authenticator.refresh_scheduler.stop()
+
+
+@mark.asyncio
+async def test_logout_should_stop_the_background_refresh(bdc_client, monkeypatch):
+    authenticator = BrazilDataCubeOAuthenticator(proactive_refresh=True)
+    user = MockUser("user_email_com", {"access_token": "token", "refresh_token": "refresh-me"})
+    authenticator.refresh_scheduler.schedule(user, time.time() + 3600)
+
+    async def default_handle_logout(handler):
+        pass
+
+    monkeypatch.setattr(OAuthLogoutHandler, "default_handle_logout", default_handle_logout)
+
+    handler = LogoutHandler.__new__(LogoutHandler)
+    handler._jupyterhub_user = user
+    handler.application = Mock(settings={"authenticator": authenticator})
+    await handler.default_handle_logout()
+
+    assert user.name not in authenticator.refresh_scheduler
+    assert LogoutHandler in dict(authenticator.get_handlers(None)).values()
+    authenticator.refresh_scheduler.stop()
+
+
+@mark.asyncio
+async def test_warm_cache_should_serve_the_first_refresh_after_a_restart(bdc_refresh_client, tmp_path):
+    config = dict(warm_cache_path=str(tmp_path / "warm.sqlite"), admin_roles=["admin"])
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("admin")
+    user = MockUser("user_email_com", {"access_token": "old", "refresh_token": "refresh-me"}, admin=True)
+
+    authenticator = BrazilDataCubeOAuthenticator(**config)
+    assert await authenticator.refresh_user(user)
+    assert len(bdc_refresh_client.refresh_requests) == 1
+    await authenticator.warm_cache.flush()
+
+    restarted = BrazilDataCubeOAuthenticator(**config)
+
+    assert await restarted.refresh_user(user) is True
+    assert len(bdc_refresh_client.refresh_requests) == 1
+
+    await restarted.revalidator.join()
+
+    assert len(bdc_refresh_client.refresh_requests) == 2
+    assert user.auth_state["access_token"] != "old"
+
+    await restarted.refresh_user(user)
+    assert len(bdc_refresh_client.refresh_requests) == 2
+
+    user.auth_state["expires_at"] = time.time()
+    await restarted.refresh_user(user)
+
+    assert len(bdc_refresh_client.refresh_requests) == 3
+
+
+@mark.asyncio
+async def test_warm_cache_should_not_serve_users_denied_by_the_current_roles(bdc_refresh_client, tmp_path):
+    path = str(tmp_path / "warm.sqlite")
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("user")
+    user = MockUser("user_email_com", {"access_token": "old", "refresh_token": "refresh-me"})
+
+    authenticator = BrazilDataCubeOAuthenticator(warm_cache_path=path)
+    assert await authenticator.refresh_user(user)
+    await authenticator.warm_cache.flush()
+
+    restarted = BrazilDataCubeOAuthenticator(warm_cache_path=path, allowed_roles=["admin"])
+
+    assert await restarted.refresh_user(user) is False
+    assert restarted.warm_cache.get(user.name) is None
+
+
+@mark.asyncio
+async def test_warm_cache_should_not_serve_the_refresh_after_a_login(bdc_refresh_client, tmp_path):
+    authenticator = BrazilDataCubeOAuthenticator(warm_cache_path=str(tmp_path / "warm.sqlite"))
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("user")
+    user_info = await authenticator.authenticate(bdc_refresh_client.handler_for_user(user_model("user")))
+    user = MockUser(
+        authenticator.normalize_username(user_info["name"]),
+        dict(user_info["auth_state"], refresh_token="refresh-me"),
+    )
+
+    assert isinstance(await authenticator.refresh_user(user), dict)
+    assert len(bdc_refresh_client.refresh_requests) == 1
+    assert len(authenticator.revalidator) == 0
+
+
+@mark.asyncio
+async def test_token_introspection_should_replace_the_user_data_request(bdc_introspection_client):
+    authenticator = introspection_authenticator(admin_roles=["admin"])
+    authenticator.userdata_url = "https://brazildatacube.dpi.inpe.br/not-called"
+    handler = bdc_introspection_client.handler_for_user(user_model("admin"))
+
+    user_info = await authenticator.authenticate(handler)
+
+    assert user_info["name"] == "user@email.com"
+    assert user_info["admin"]
+    assert "active" not in user_info["auth_state"]["oauth_user"]
+    assert "client_id" not in user_info["auth_state"]["oauth_user"]
+
+
+@mark.asyncio
+async def test_token_introspection_should_be_cached_until_the_token_expires(bdc_introspection_client):
+    authenticator = introspection_authenticator()
+    token = uuid.uuid4().hex
+    bdc_introspection_client.access_tokens[token] = user_model("user")
+    token_response = {"access_token": token, "token_type": "Bearer"}
+
+    first = await authenticator._get_user_profile(token_response)
+    second = await authenticator._get_user_profile(token_response)
+
+    assert first == second
+    assert bdc_introspection_client.introspection_requests == [token]
+
+    authenticator.introspection_cache.timer = lambda: time.monotonic() + 601
+
+    await authenticator._get_user_profile(token_response)
+
+    assert bdc_introspection_client.introspection_requests == [token, token]
+
+
+@mark.asyncio
+async def test_token_introspection_with_inactive_token_should_deny_the_user(bdc_introspection_client):
+    authenticator = introspection_authenticator()
+
+    profile = await authenticator._get_user_profile({"access_token": "revoked", "token_type": "Bearer"})
+
+    assert profile is None
+    assert authenticator._build_user_info({"access_token": "revoked"}, profile) is None
+
+
+@mark.asyncio
+async def test_login_over_the_admission_limit_should_be_asked_to_retry(bdc_client):
+    authenticator = BrazilDataCubeOAuthenticator(admission_max_concurrency=1, admission_max_wait=0.01)
+    rejections = sample("jupyterhub_bdc_oauth_admission_rejections_total", endpoint="token")
+    outcomes = "jupyterhub_bdc_oauth_authentication_outcomes_total"
+    rejected, upstream_errors = sample(outcomes, outcome="rejected"), sample(outcomes, outcome="upstream_error")
+    await authenticator.admission.acquire()
+
+    with raises(web.HTTPError) as e:
+        await authenticator.authenticate(bdc_client.handler_for_user(user_model("user")))
+
+    assert e.value.status_code == 503
+    assert sample(outcomes, outcome="rejected") == rejected + 1
+    assert sample(outcomes, outcome="upstream_error") == upstream_errors
+    assert "Retry-After" in e.value.headers
+    assert sample("jupyterhub_bdc_oauth_admission_rejections_total", endpoint="token") == rejections + 1
+    assert sample("jupyterhub_bdc_oauth_admission_queue_depth") == 0
+
+    authenticator.admission.release()
+    assert await authenticator.authenticate(bdc_client.handler_for_user(user_model("user")))
+
+
+@mark.asyncio
+async def test_rejected_probe_of_a_half_open_circuit_should_not_keep_it_open(bdc_client):
+    now = [0]
+    authenticator = BrazilDataCubeOAuthenticator(
+        admission_max_concurrency=1,
+        admission_max_wait=0.01,
+        circuit_breaker=CircuitBreaker(failure_threshold=1, reset_timeout=10, timer=lambda: now[0]),
+    )
+    authenticator.circuit_breaker.record_failure()
+    now[0] = 10
+    await authenticator.admission.acquire()
+
+    with raises(AdmissionRejected):
+        await authenticator.authenticate(bdc_client.handler_for_user(user_model("user")))
+
+    authenticator.admission.release()
+    assert await authenticator.authenticate(bdc_client.handler_for_user(user_model("user")))
+    assert authenticator.circuit_breaker.state == "closed"
+
+
+@mark.asyncio
+async def test_repeated_callbacks_with_the_same_code_should_share_one_exchange(bdc_client):
+    authenticator = BrazilDataCubeOAuthenticator()
+    handler = bdc_client.handler_for_user(user_model("user"))
+    exchanges = sample("jupyterhub_bdc_oauth_upstream_responses_total", endpoint="token", code="200")
+
+    results = await asyncio.gather(*[authenticator.authenticate(handler) for _ in range(3)])
+    results.append(await authenticator.authenticate(handler))
+
+    assert all(result["name"] == "user@email.com" for result in results)
+    assert sample("jupyterhub_bdc_oauth_upstream_responses_total", endpoint="token", code="200") == exchanges + 1
+
+
+@mark.asyncio
+async def test_code_replayed_with_another_state_should_not_reuse_the_exchange(bdc_client):
+    authenticator = BrazilDataCubeOAuthenticator()
+    handler = bdc_client.handler_for_user(user_model("user"))
+    code = handler.get_argument("code")
+    handler.get_argument = Mock(side_effect=lambda name, default=None: code if name == "code" else "victim")
+
+    assert await authenticator.authenticate(handler)
+
+    replay = bdc_client.handler_for_user(user_model("user"))
+    replay.get_argument = Mock(side_effect=lambda name, default=None: code if name == "code" else "attacker")
+
+    with raises(HTTPClientError) as e:
+        await authenticator.authenticate(replay)
+    assert e.value.code == 403
+
+
+@mark.asyncio
+async def test_failed_code_exchange_should_not_be_reused(bdc_client):
+    authenticator = BrazilDataCubeOAuthenticator()
+    handler = bdc_client.handler_for_user(user_model("user"))
+    code = handler.get_argument("code")
+    user = bdc_client.oauth_codes.pop(code)
+
+    with raises(HTTPClientError):
+        await authenticator.authenticate(handler)
+
+    bdc_client.oauth_codes[code] = user
+
+    assert await authenticator.authenticate(handler)
+
+
+@mark.asyncio
+async def test_authenticate_should_record_the_spans_of_the_login(bdc_client):
+    exporter = InMemoryExporter()
+    authenticator = BrazilDataCubeOAuthenticator(tracing_exporter=exporter)
+    handler = bdc_client.handler_for_user(user_model("user"))
+
+    await authenticator.authenticate(handler)
+
+    spans = {span.name: span for span in exporter.spans}
+    root = spans["authenticate"]
+
+    assert sorted(spans) == [
+        "authenticate", "create_auth_state", "evaluate_roles", "get_token", "get_user_data", "upstream_request"
+    ]
+    assert root.parent_id is None and root.attributes == {"cache_hit": False, "outcome": "allowed"}
+    assert spans["get_token"].parent_id == root.span_id
+    assert spans["get_user_data"].attributes == {"cache_hit": False}
+    assert spans["upstream_request"].attributes["status_code"] == 200
+    assert spans["upstream_request"].attributes["payload_size"] > 0
+    assert spans["create_auth_state"].attributes["payload_size"] > 0
+    assert all(span.trace_id == root.trace_id for span in exporter.spans)
+
+
+@mark.asyncio
+async def test_authenticate_should_audit_each_decision(bdc_client):
+    class ListSink:
+        def __init__(self):
+            self.records = []
+
+        def write(self, records):
+            self.records.extend(records)
+
+    sink = ListSink()
+    authenticator = BrazilDataCubeOAuthenticator(
+        allowed_roles=["user", "admin"], admin_roles=["admin"], audit_log_sink=sink
+    )
+
+    await authenticator.authenticate(bdc_client.handler_for_user(user_model("admin")))
+    await authenticator.authenticate(bdc_client.handler_for_user(user_model("guest")))
+
+    handler = bdc_client.handler_for_user(user_model("user"))
+    handler.get_argument.return_value = "unknown-code"
+    with raises(HTTPClientError):
+        await authenticator.authenticate(handler)
+
+    await authenticator.audit_log.close()
+    admin, denied, failed = sink.records
+
+    assert admin["event"] == "authenticate" and admin["user"] == "user@email.com"
+    assert admin["outcome"] == "admin" and admin["allowed"] and admin["admin"]
+    assert admin["roles_matched"] == ["jupyter:admin"]
+    assert set(admin["upstream"]) == {"token", "userdata"}
+    assert admin["duration"] >= sum(admin["upstream"].values())
+    assert denied["outcome"] == "denied" and not denied["allowed"] and denied["roles_matched"] == []
+    assert failed["outcome"] == "upstream_error" and failed["user"] is None
+    assert set(failed["upstream"]) == {"token"} and "403" in failed["error"]
+
+
+@mark.asyncio
+async def test_audit_records_lost_by_the_sink_should_be_counted(bdc_client):
+    class BrokenSink:
+        def write(self, records):
+            raise OSError("disk full")
+
+    authenticator = BrazilDataCubeOAuthenticator(audit_log_sink=BrokenSink())
+    dropped = sample("jupyterhub_bdc_oauth_audit_dropped_records_total")
+
+    await authenticator.authenticate(bdc_client.handler_for_user(user_model("user")))
+    await authenticator.audit_log.close()
+
+    assert sample("jupyterhub_bdc_oauth_audit_dropped_records_total") == dropped + 1
+
+
+def test_audit_log_should_be_disabled_by_default():
+    assert BrazilDataCubeOAuthenticator().audit_log is None
+
+
+@mark.asyncio
+async def test_access_token_broker_should_refresh_the_expiring_token_once(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator(access_token_broker=True)
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("user")
+    auth_state = {"access_token": "old", "refresh_token": "refresh-me", "expires_at": time.time() + 10}
+    user = MockUser("user_email_com", auth_state)
+
+    tokens = await asyncio.gather(*[authenticator.get_access_token(user) for _ in range(5)])
+
+    assert len(bdc_refresh_client.refresh_requests) == 1
+    assert all(token["access_token"] == user.auth_state["access_token"] != "old" for token in tokens)
+    assert tokens[0]["expires_at"] > time.time() + 3000
+
+    await authenticator.get_access_token(user)
+
+    assert len(bdc_refresh_client.refresh_requests) == 1
+    assert ("/api/bdc/token", AccessTokenHandler) in authenticator.get_handlers(None)
+
+
+@mark.asyncio
+async def test_access_token_broker_with_revoked_refresh_token_should_require_login(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator(access_token_broker=True)
+    auth_state = {"access_token": "old", "refresh_token": "revoked", "expires_at": time.time() - 10}
+
+    assert await authenticator.get_access_token(MockUser("user_email_com", auth_state)) is None
+    assert await authenticator.get_access_token(MockUser("user_email_com", None)) is None
+
+
+@mark.asyncio
+async def test_pre_spawn_start_should_give_the_server_the_access_token(bdc_client):
+    authenticator = BrazilDataCubeOAuthenticator(access_token_broker=True, spawn_access_token=True)
+    user = MockUser("user_email_com", {"access_token": "token", "refresh_token": "refresh-me"})
+    spawner = Mock(environment={})
+    spawner.hub.api_url = "http://127.0.0.1:8081/hub/api"
+
+    await authenticator.pre_spawn_start(user, spawner)
+
+    assert spawner.environment == {
+        "BDC_ACCESS_TOKEN": "token",
+        "BDC_ACCESS_TOKEN_URL": "http://127.0.0.1:8081/hub/api/bdc/token",
+    }
+
+
+@mark.asyncio
+async def test_refresh_during_an_outage_should_accept_the_recently_validated_profile(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator(degraded_grace_period=3600, circuit_breaker_threshold=0)
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("user")
+    user = MockUser("user_email_com", {"access_token": "old", "refresh_token": "refresh-me"})
+    user.auth_state = (await authenticator.refresh_user(user))["auth_state"]
+    user.auth_state["expires_at"] = time.time()
+    accepted = sample("jupyterhub_bdc_oauth_degraded_refreshes_total", outcome="accepted")
+    rejected = sample("jupyterhub_bdc_oauth_degraded_refreshes_total", outcome="rejected")
+
+    paths = bdc_refresh_client.hosts["brazildatacube.dpi.inpe.br"]
+    paths[0] = (paths[0][0], lambda request: 503)
+
+    assert await authenticator.refresh_user(user) is True
+    assert sample("jupyterhub_bdc_oauth_degraded_refreshes_total", outcome="accepted") == accepted + 1
+
+    user.auth_state["validated_at"] -= 7200
+
+    with raises(HTTPClientError):
+        await authenticator.refresh_user(user)
+    assert sample("jupyterhub_bdc_oauth_degraded_refreshes_total", outcome="rejected") == rejected + 1
+
+
+@mark.asyncio
+async def test_refresh_during_internal_server_errors_should_accept_the_recently_validated_profile(
+    bdc_refresh_client
+):
+    authenticator = BrazilDataCubeOAuthenticator(degraded_grace_period=3600, circuit_breaker_threshold=0)
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("user")
+    user = MockUser("user_email_com", {"access_token": "old", "refresh_token": "refresh-me"})
+    user.auth_state = (await authenticator.refresh_user(user))["auth_state"]
+    user.auth_state["expires_at"] = time.time()
+
+    paths = bdc_refresh_client.hosts["brazildatacube.dpi.inpe.br"]
+    paths[0] = (paths[0][0], lambda request: 500)
+
+    assert await authenticator.refresh_user(user) is True
+
+    paths[0] = (paths[0][0], lambda request: 403)
+
+    with raises(HTTPClientError):
+        await authenticator.refresh_user(user)
+
+
+@mark.asyncio
+async def test_refresh_with_user_data_outage_should_keep_the_new_tokens(bdc_refresh_client):
+    authenticator = BrazilDataCubeOAuthenticator(
+        degraded_grace_period=3600, upstream_retries=0, circuit_breaker_threshold=0
+    )
+    validated_at = time.time() - 60
+    auth_state = {
+        "access_token": "old", "refresh_token": "refresh-me", "oauth_user": user_model("user"), "validated_at": validated_at
+    }
+    bdc_refresh_client.refresh_tokens["refresh-me"] = user_model("user")
+    paths = bdc_refresh_client.hosts["brazildatacube.dpi.inpe.br"]
+    paths[1] = (paths[1][0], lambda request: 502)
+
+    user_info = await authenticator.refresh_user(MockUser("user_email_com", auth_state))
+
+    assert user_info["auth_state"]["access_token"] != "old"
+    assert user_info["auth_state"]["oauth_user"] == user_model("user")
+    assert user_info["auth_state"]["validated_at"] == validated_at
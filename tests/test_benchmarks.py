@@ -0,0 +1,46 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Smoke test for the Brazil Data Cube JupyterHub OAuth benchmarks."""
+
+from pytest import mark
+
+from benchmarks import login_load, refresh_storm
+from benchmarks.common import percentile
+from benchmarks.mock_server import MockSettings
+
+
+def test_percentile_should_use_the_nearest_rank():
+    values = list(range(1, 101))
+
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) == 0.0
+
+
+@mark.asyncio
+async def test_login_load_should_report_latency_and_throughput():
+    settings = MockSettings(latency=0, jitter=0)
+
+    report = await login_load.benchmark(logins=20, concurrency=5, settings=settings, http_client_kind="simple")
+
+    assert report["failures"] == 0
+    assert report["upstream requests"] == 40
+    assert set(report["latency"]) == {"p50", "p95", "p99", "max"}
+
+
+@mark.asyncio
+async def test_refresh_storm_should_refresh_each_user_once():
+    settings = MockSettings(latency=0, jitter=0)
+
+    report = await refresh_storm.benchmark(users=20, calls_per_user=3, settings=settings, http_client_kind="simple")
+
+    assert report["calls"] == 60
+    assert report["failures"] == report["logouts"] == 0
+    assert report["upstream requests"] == 40
+    assert report["peak memory"].endswith("MiB")
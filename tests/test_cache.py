@@ -0,0 +1,73 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Unit-test for Brazil Data Cube JupyterHub OAuth Cache."""
+
+from bdc_jupyterhub_oauth.cache import TTLCache, token_cache_key
+
+
+class FakeTimer:
+    """Manually controlled clock."""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_should_count_hits_and_misses():
+    cache = TTLCache(maxsize=2, ttl=10)
+
+    assert cache.get("a") is None
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.stats() == dict(hits=1, misses=1, size=1)
+
+
+def test_cache_should_expire_entries():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=2, ttl=10, timer=timer)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=5)
+
+    timer.now = 6
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+    timer.now = 11
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_cache_should_evict_least_recently_used_entry():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_cache_with_zero_ttl_should_be_disabled():
+    cache = TTLCache(ttl=0)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+
+
+def test_token_cache_key_should_not_expose_the_token():
+    key = token_cache_key("secret-token")
+
+    assert "secret-token" not in key
+    assert key == token_cache_key("secret-token")
+    assert key != token_cache_key("rotated-token")
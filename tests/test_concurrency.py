@@ -0,0 +1,80 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Unit-test for Brazil Data Cube JupyterHub OAuth concurrency helpers."""
+
+import asyncio
+
+from pytest import mark, raises
+
+from bdc_jupyterhub_oauth.concurrency import AdmissionController, AdmissionRejected
+
+
+@mark.asyncio
+async def test_admission_should_limit_the_concurrent_requests():
+    admission = AdmissionController(max_concurrency=2, max_wait=1)
+    running, peak = 0, 0
+
+    async def request():
+        nonlocal running, peak
+        await admission.acquire()
+        try:
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+        finally:
+            admission.release()
+
+    await asyncio.gather(*[request() for _ in range(6)])
+
+    assert peak == 2
+    assert len(admission) == 0
+
+
+@mark.asyncio
+async def test_admission_should_reject_the_requests_that_wait_too_long():
+    admission = AdmissionController(max_concurrency=1, max_wait=0.01)
+    await admission.acquire()
+
+    with raises(AdmissionRejected) as e:
+        await admission.acquire()
+
+    assert e.value.status_code == 503
+    assert e.value.headers == {"Retry-After": "1"}
+
+    admission.release()
+    await admission.acquire()
+
+
+@mark.asyncio
+async def test_admission_should_pace_the_requests_with_the_token_bucket():
+    admission = AdmissionController(rate=100, burst=2, max_wait=0.025)
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+
+    await asyncio.gather(*[admission.acquire() for _ in range(4)])
+
+    assert loop.time() - start >= 0.015
+
+    with raises(AdmissionRejected):
+        await asyncio.gather(*[admission.acquire() for _ in range(4)])
+
+
+@mark.asyncio
+async def test_try_acquire_should_admit_only_without_waiting():
+    admission = AdmissionController(max_concurrency=1, rate=100, burst=2)
+
+    assert await admission.try_acquire()
+    assert not await admission.try_acquire()
+
+    admission.release()
+
+    assert await admission.try_acquire()
+    admission.release()
+    assert not await admission.try_acquire()
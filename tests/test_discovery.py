@@ -0,0 +1,108 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Unit-test for Brazil Data Cube JupyterHub OAuth OpenID Connect Discovery."""
+
+import asyncio
+import json
+import time
+
+from oauthenticator.tests.conftest import client, io_loop
+from pytest import fixture, mark
+
+from bdc_jupyterhub_oauth import BrazilDataCubeOAuthenticator
+
+DISCOVERY_URL = "https://brazildatacube.dpi.inpe.br/auth/v1/.well-known/openid-configuration"
+
+
+def discovery_document(host="https://brazildatacube.dpi.inpe.br"):
+    """Return an OpenID Connect discovery document."""
+    return {
+        "issuer": host,
+        "authorization_endpoint": f"{host}/auth/v1/oauth/authorize",
+        "token_endpoint": f"{host}/auth/v1/oauth/token",
+        "userinfo_endpoint": f"{host}/auth/v1/users/me",
+        "jwks_uri": f"{host}/auth/v1/jwks",
+        "introspection_endpoint": f"{host}/auth/v1/oauth/introspect",
+    }
+
+
+@fixture
+def discovery_client(client):
+    client.discovery_requests = 0
+    client.discovery_document = discovery_document("https://discovered.inpe.br")
+
+    def discovery(request):
+        client.discovery_requests += 1
+        return client.discovery_document
+
+    client.add_host("brazildatacube.dpi.inpe.br", [
+        ("/auth/v1/.well-known/openid-configuration", discovery),
+    ])
+    return client
+
+
+def authenticator(cache_path, **kwargs):
+    """Return an authenticator with discovery and default endpoints."""
+    return BrazilDataCubeOAuthenticator(
+        oidc_discovery_url=DISCOVERY_URL,
+        oidc_discovery_cache_path=str(cache_path),
+        http_client_kind="default",
+        **kwargs
+    )
+
+
+@mark.asyncio
+async def test_discovery_should_fill_the_endpoints_in_background(discovery_client, tmp_path, monkeypatch):
+    monkeypatch.delenv("OAUTH_USERDATA_URL", raising=False)
+    monkeypatch.delenv("OAUTH_ACCESS_TOKEN_URL", raising=False)
+    cache_path = tmp_path / "discovery.json"
+
+    auth = authenticator(cache_path, token_url="https://configured.inpe.br/token")
+    assert auth.userdata_url == "<change-me>"
+
+    await asyncio.sleep(0.01)
+
+    assert discovery_client.discovery_requests == 1
+    assert auth.userdata_url == "https://discovered.inpe.br/auth/v1/users/me"
+    assert auth.jwks_url == "https://discovered.inpe.br/auth/v1/jwks"
+    assert auth.introspection_url == "https://discovered.inpe.br/auth/v1/oauth/introspect"
+    assert auth.token_url == "https://configured.inpe.br/token"
+    assert json.loads(cache_path.read_text())["document"] == discovery_client.discovery_document
+    auth.discovery.stop()
+
+
+@mark.asyncio
+async def test_discovery_should_start_from_the_disk_cache(discovery_client, tmp_path, monkeypatch):
+    monkeypatch.delenv("OAUTH_USERDATA_URL", raising=False)
+    cache_path = tmp_path / "discovery.json"
+    cache_path.write_text(json.dumps(dict(document=discovery_document("https://cached.inpe.br"), fetched_at=time.time())))
+
+    auth = authenticator(cache_path)
+    await asyncio.sleep(0.01)
+
+    assert auth.userdata_url == "https://cached.inpe.br/auth/v1/users/me"
+    assert discovery_client.discovery_requests == 0
+    auth.discovery.stop()
+
+
+@mark.asyncio
+async def test_discovery_failure_should_keep_the_stale_cache(discovery_client, tmp_path, monkeypatch):
+    monkeypatch.delenv("OAUTH_USERDATA_URL", raising=False)
+    cache_path = tmp_path / "discovery.json"
+    cache_path.write_text(json.dumps(dict(document=discovery_document("https://cached.inpe.br"), fetched_at=0)))
+    discovery_client.discovery_document = None
+    discovery_client.hosts["brazildatacube.dpi.inpe.br"][0] = (
+        "/auth/v1/.well-known/openid-configuration", lambda request: 500
+    )
+
+    auth = authenticator(cache_path, upstream_retries=0)
+    await asyncio.sleep(0.01)
+
+    assert auth.userdata_url == "https://cached.inpe.br/auth/v1/users/me"
+    auth.discovery.stop()
@@ -0,0 +1,86 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Unit-test for Brazil Data Cube JupyterHub OAuth group synchronization."""
+
+from unittest.mock import Mock
+
+from jupyterhub import orm
+from oauthenticator.tests.conftest import client, io_loop
+from oauthenticator.tests.mocks import setup_oauth_mock
+from pytest import fixture, mark
+from sqlalchemy import event
+
+from bdc_jupyterhub_oauth import BrazilDataCubeOAuthenticator
+from bdc_jupyterhub_oauth.groups import role_group_names, sync_user_groups
+
+
+@fixture
+def db():
+    session = orm.new_session_factory("sqlite:///:memory:")()
+    yield session
+    session.close()
+
+
+@fixture
+def orm_user(db):
+    user = orm.User(name="user_email_com")
+    db.add(user)
+    other = orm.Group(name="teachers")
+    db.add(other)
+    user.groups.append(other)
+    db.commit()
+    return user
+
+
+def group_names(user):
+    return sorted(group.name for group in user.groups)
+
+
+def test_role_group_names():
+    assert role_group_names({"admin", "user"}, "bdc-") == {"bdc-admin", "bdc-user"}
+    assert role_group_names({"admin", "user"}, "bdc-", ["user"]) == {"bdc-user"}
+
+
+def test_sync_user_groups_should_write_only_the_diff(db, orm_user):
+    assert sync_user_groups(orm_user, {"bdc-user", "bdc-admin"}, "bdc-") == ({"bdc-user", "bdc-admin"}, set())
+    assert group_names(orm_user) == ["bdc-admin", "bdc-user", "teachers"]
+
+    assert sync_user_groups(orm_user, {"bdc-user"}, "bdc-") == (set(), {"bdc-admin"})
+    assert group_names(orm_user) == ["bdc-user", "teachers"]
+
+    flushes = []
+    event.listen(db, "after_flush", lambda *args: flushes.append(args))
+    assert sync_user_groups(orm_user, {"bdc-user"}, "bdc-") == (set(), set())
+    assert flushes == []
+
+
+@mark.asyncio
+async def test_login_should_sync_the_groups_of_new_and_existing_users(client, db, orm_user):
+    setup_oauth_mock(
+        client,
+        host="brazildatacube.dpi.inpe.br",
+        access_token_path="/auth/v1/oauth/token",
+        user_path="/auth/v1/users/me",
+    )
+    authenticator = BrazilDataCubeOAuthenticator(sync_groups=True)
+    profile = {"email": "user@email.com", "roles": ["jupyter:user", "jupyter:gpu", "bdc:admin"]}
+
+    # first login, the user is created after the authentication.
+    handler = client.handler_for_user(profile)
+    await authenticator.authenticate(handler)
+    authenticator.add_user(orm_user)
+
+    assert group_names(orm_user) == ["bdc-gpu", "bdc-user", "teachers"]
+
+    # next login, the user already exists.
+    handler = client.handler_for_user(dict(profile, roles=["jupyter:user"]))
+    handler.find_user.return_value = Mock(orm_user=orm_user)
+    await authenticator.authenticate(handler)
+
+    assert group_names(orm_user) == ["bdc-user", "teachers"]
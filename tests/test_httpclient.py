@@ -0,0 +1,244 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Unit-test for Brazil Data Cube JupyterHub OAuth HTTP Client."""
+
+import asyncio
+
+from oauthenticator.tests.conftest import client, io_loop
+from oauthenticator.tests.mocks import MockAsyncHTTPClient
+from pytest import mark, raises
+from tornado.httpclient import HTTPClientError
+from tornado.simple_httpclient import SimpleAsyncHTTPClient
+
+from bdc_jupyterhub_oauth import BrazilDataCubeOAuthenticator
+from bdc_jupyterhub_oauth.httpclient import (
+    CircuitBreaker,
+    CircuitOpenError,
+    backoff_delays,
+    build_http_client,
+    hedged,
+    is_retriable,
+    is_service_failure,
+)
+
+
+def test_simple_http_client_should_have_its_own_pool():
+    http_client = build_http_client("simple", max_clients=3)
+
+    assert isinstance(http_client, SimpleAsyncHTTPClient)
+    assert http_client.max_clients == 3
+    assert http_client is not build_http_client("simple", max_clients=3)
+
+
+def test_invalid_http_client_kind_should_fail():
+    with raises(ValueError):
+        build_http_client("urllib")
+
+
+def test_authenticator_should_use_the_configured_http_client():
+    authenticator = BrazilDataCubeOAuthenticator(http_client_kind="simple", http_max_clients=8)
+
+    assert isinstance(authenticator.http_client, SimpleAsyncHTTPClient)
+    assert authenticator.http_client.max_clients == 8
+
+
+@mark.asyncio
+async def test_requests_should_use_the_endpoint_timeouts(client):
+    requests = []
+    client.add_host("brazildatacube.dpi.inpe.br", [
+        ("/auth/v1/oauth/token", lambda request: requests.append(request) or {}),
+        ("/auth/v1/users/me", lambda request: requests.append(request) or {}),
+    ])
+    authenticator = BrazilDataCubeOAuthenticator(
+        http_client_kind="default",
+        token_connect_timeout=1,
+        token_request_timeout=2,
+        userdata_connect_timeout=3,
+        userdata_request_timeout=4,
+    )
+    assert isinstance(authenticator.http_client, MockAsyncHTTPClient)
+
+    await authenticator._get_token({}, {})
+    await authenticator._get_user_data({"access_token": "token", "token_type": "Bearer"})
+
+    token_request, userdata_request = requests
+    assert (token_request.connect_timeout, token_request.request_timeout) == (1, 2)
+    assert (userdata_request.connect_timeout, userdata_request.request_timeout) == (3, 4)
+    assert token_request.decompress_response and userdata_request.decompress_response
+
+
+class FakeTimer:
+    """Manually controlled clock."""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_circuit_breaker_should_open_after_consecutive_failures():
+    timer = FakeTimer()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, timer=timer)
+
+    breaker.record_failure()
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with raises(CircuitOpenError):
+        breaker.check()
+
+    timer.now = 10
+    breaker.check()  # a single probe is allowed
+    with raises(CircuitOpenError):
+        breaker.check()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    timer.now = 20
+    breaker.check()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_abandoned_probe_should_let_another_request_probe_the_service():
+    timer = FakeTimer()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, timer=timer)
+
+    assert breaker.check() is False
+    breaker.record_failure()
+
+    timer.now = 10
+    assert breaker.check() is True
+    with raises(CircuitOpenError):
+        breaker.check()
+
+    breaker.abandon_probe()
+    assert breaker.check() is True
+
+
+def test_backoff_delays_should_grow_until_the_cap():
+    delays = list(backoff_delays(5, base=1, cap=3))
+
+    assert len(delays) == 5
+    assert all(0 <= delay <= bound for delay, bound in zip(delays, [1, 2, 3, 3, 3]))
+
+
+def test_retriable_errors():
+    assert is_retriable(HTTPClientError(503))
+    assert is_retriable(HTTPClientError(599))
+    assert is_retriable(ConnectionRefusedError())
+    assert not is_retriable(HTTPClientError(401))
+    assert not is_retriable(CircuitOpenError(1))
+    assert not is_retriable(HTTPClientError(500))
+
+
+def test_service_failures():
+    assert is_service_failure(HTTPClientError(500))
+    assert is_service_failure(HTTPClientError(503))
+    assert is_service_failure(HTTPClientError(429))
+    assert is_service_failure(ConnectionResetError())
+    assert not is_service_failure(HTTPClientError(400))
+    assert not is_service_failure(ValueError())
+
+
+@mark.asyncio
+async def test_hedged_should_keep_the_first_successful_response():
+    calls = []
+
+    async def fetch():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+            return "slow"
+        return "fast"
+
+    assert await hedged(fetch, 0.01) == "fast"
+    assert len(calls) == 2
+
+
+def flaky_host(client, failures, status_code=503):
+    """Mock the user data endpoint failing ``failures`` times before answering."""
+    requests = []
+
+    def userdata(request):
+        requests.append(request)
+        return status_code if len(requests) <= failures else {"email": "user@email.com"}
+
+    client.add_host("brazildatacube.dpi.inpe.br", [("/auth/v1/users/me", userdata)])
+    return requests
+
+
+@mark.asyncio
+async def test_user_data_should_be_retried_on_server_errors(client):
+    requests = flaky_host(client, failures=2)
+    authenticator = BrazilDataCubeOAuthenticator(http_client_kind="default", upstream_retry_backoff=0)
+
+    user_data = await authenticator._get_user_data({"access_token": "token", "token_type": "Bearer"})
+
+    assert user_data == {"email": "user@email.com"}
+    assert len(requests) == 3
+
+
+@mark.asyncio
+async def test_circuit_breaker_should_fail_fast_while_the_service_is_down(client):
+    requests = flaky_host(client, failures=100)
+    authenticator = BrazilDataCubeOAuthenticator(
+        http_client_kind="default", upstream_retries=0, circuit_breaker_threshold=2
+    )
+    token_response = {"access_token": "token", "token_type": "Bearer"}
+
+    for _ in range(2):
+        with raises(HTTPClientError):
+            await authenticator._get_user_data(token_response)
+
+    with raises(CircuitOpenError):
+        await authenticator._get_user_data(token_response)
+    assert len(requests) == 2
+
+
+@mark.asyncio
+async def test_internal_server_errors_should_open_the_circuit_without_retries(client):
+    requests = flaky_host(client, failures=100, status_code=500)
+    authenticator = BrazilDataCubeOAuthenticator(
+        http_client_kind="default", upstream_retries=3, circuit_breaker_threshold=2
+    )
+    token_response = {"access_token": "token", "token_type": "Bearer"}
+
+    for _ in range(2):
+        with raises(HTTPClientError) as e:
+            await authenticator._get_user_data(token_response)
+        assert e.value.code == 500
+
+    assert authenticator.circuit_breaker.state == "open"
+    with raises(CircuitOpenError):
+        await authenticator._get_user_data(token_response)
+    assert len(requests) == 2
+
+
+@mark.asyncio
+async def test_hedged_user_data_request_should_need_its_own_admission_slot():
+    calls = []
+
+    async def slow_fetch(endpoint, req, label):
+        calls.append(endpoint)
+        await asyncio.sleep(0.05)
+        return {"email": "user@email.com"}
+
+    for slots, requests in [(1, 1), (2, 2)]:
+        authenticator = BrazilDataCubeOAuthenticator(admission_max_concurrency=slots, userdata_hedge_delay=0.01)
+        authenticator._fetch_once = slow_fetch
+        calls.clear()
+
+        user_data = await authenticator._get_user_data({"access_token": "token", "token_type": "Bearer"})
+
+        assert user_data == {"email": "user@email.com"}
+        assert len(calls) == requests
+        assert not authenticator.admission._semaphore.locked()
@@ -0,0 +1,99 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Unit-test for Brazil Data Cube JupyterHub OAuth role policy file."""
+
+import json
+import os
+
+from pytest import raises
+
+from bdc_jupyterhub_oauth import BrazilDataCubeOAuthenticator
+from bdc_jupyterhub_oauth.policy import RolePolicyWatcher, load_role_policy
+from bdc_jupyterhub_oauth.roles import RoleDecision
+
+
+def write_policy(path, document, mtime):
+    """Write a policy document with the given modification time."""
+    path.write_text(json.dumps(document) if isinstance(document, dict) else document)
+    os.utime(path, (mtime, mtime))
+
+
+def test_load_role_policy_should_validate_the_document(tmp_path):
+    path = tmp_path / "policy.json"
+
+    write_policy(path, {"admin_roles": ["jupyter:admin"]}, 1000)
+    assert load_role_policy(str(path)) == {"allowed_roles": [], "admin_roles": ["jupyter:admin"]}
+
+    write_policy(path, {"allowed_roles": "jupyter:*"}, 1000)
+    with raises(ValueError):
+        load_role_policy(str(path))
+
+    write_policy(path, {"roles": []}, 1000)
+    with raises(ValueError):
+        load_role_policy(str(path))
+
+
+def test_watcher_should_reload_only_changed_and_valid_policies(tmp_path):
+    path = tmp_path / "policy.json"
+    loaded = []
+    watcher = RolePolicyWatcher(str(path), loaded.append)
+
+    assert not watcher.check()
+
+    write_policy(path, {"allowed_roles": ["jupyter:*"]}, 1000)
+    assert watcher.check()
+    assert not watcher.check()
+
+    write_policy(path, "{invalid", 2000)
+    assert not watcher.check()
+    assert watcher.policy == {"allowed_roles": ["jupyter:*"], "admin_roles": []}
+
+    write_policy(path, {"admin_roles": ["jupyter:admin"]}, 3000)
+    assert watcher.check()
+    assert len(loaded) == 2
+
+
+def test_authenticator_should_apply_the_reloaded_policy(tmp_path):
+    path = tmp_path / "policy.json"
+    write_policy(path, {"allowed_roles": ["jupyter:*"], "admin_roles": ["*:admin"]}, 1000)
+    authenticator = BrazilDataCubeOAuthenticator(role_policy_file=str(path), admin_roles=["nobody"])
+    profile = {"roles": ["stac:admin", "jupyter:user"]}
+
+    assert authenticator.role_matcher.decide(profile) == RoleDecision(True, True)
+
+    write_policy(path, {"allowed_roles": ["re:jupyter:(teacher|admin)"]}, 2000)
+    authenticator.role_policy.check()
+
+    assert authenticator.role_matcher.decide(profile) == RoleDecision(False, False)
+
+    write_policy(path, {"allowed_roles": ["re:jupyter:(unclosed"]}, 3000)
+    authenticator.role_policy.check()
+
+    assert authenticator.role_matcher.decide({"roles": ["jupyter:teacher"]}) == RoleDecision(True, False)
+    authenticator.role_policy.stop()
+
+
+def test_authenticator_with_a_broken_policy_should_deny_every_user(tmp_path):
+    path = tmp_path / "policy.json"
+    path.write_text('{"allowed_roles": ["jupyter:*"')
+    authenticator = BrazilDataCubeOAuthenticator(role_policy_file=str(path))
+    profile = {"roles": ["jupyter:user", "stac:admin"]}
+
+    assert authenticator.role_matcher.decide(profile) == RoleDecision(False, False)
+    assert authenticator.decide_user_roles([profile]) == [RoleDecision(False, False)]
+
+    missing = BrazilDataCubeOAuthenticator(role_policy_file=str(tmp_path / "missing.json"))
+    assert missing.role_matcher.decide(profile) == RoleDecision(False, False)
+
+    write_policy(path, {"allowed_roles": ["jupyter:*"]}, 1000)
+    authenticator.role_policy.check()
+
+    assert authenticator.role_matcher.decide(profile) == RoleDecision(True, False)
+    authenticator.role_policy.stop()
+    missing.role_policy.stop()
@@ -0,0 +1,106 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Unit-test for Brazil Data Cube JupyterHub OAuth Roles."""
+
+from bdc_jupyterhub_oauth import BrazilDataCubeOAuthenticator
+from bdc_jupyterhub_oauth.roles import (
+    PolicyRoleMatcher,
+    RoleDecision,
+    RoleMatcher,
+    RolePatternSet,
+    index_roles,
+    qualified_roles,
+)
+
+
+def test_index_roles_should_group_roles_by_application():
+    index = index_roles(["jupyter:admin", "jupyter:user", "bdc:user", "jupyter:scope:read", "invalid"])
+
+    assert index == {"jupyter": {"admin", "user", "scope"}, "bdc": {"user"}}
+    assert index_roles(None) == {}
+
+
+def test_role_matcher_should_decide_allow_and_admin_at_once():
+    matcher = RoleMatcher("jupyter", ["user", "admin"], ["admin"])
+
+    assert matcher.decide({"roles": ["jupyter:admin"]}) == RoleDecision(True, True)
+    assert matcher.decide({"roles": ["jupyter:user", "bdc:admin"]}) == RoleDecision(True, False)
+    assert matcher.decide({"roles": ["bdc:user"]}) == RoleDecision(False, False)
+    assert matcher.decide({}) == RoleDecision(False, False)
+
+
+def test_role_matcher_without_allowed_roles_should_allow_everyone():
+    matcher = RoleMatcher("jupyter", [], [""])
+
+    assert matcher.decide({"roles": ["bdc:user"]}) == RoleDecision(True, False)
+
+
+def test_authenticator_should_compile_the_roles_again_when_they_change():
+    authenticator = BrazilDataCubeOAuthenticator(admin_roles=["admin"])
+    profile = {"roles": ["jupyterhub:admin"]}
+
+    assert not authenticator._is_user_admin(profile)
+
+    authenticator.oauth_application_name = "jupyterhub"
+    assert authenticator._is_user_admin(profile)
+
+    authenticator.admin_roles = ["owner"]
+    assert not authenticator._is_user_admin(profile)
+    assert authenticator._check_user_roles(profile, ["admin"])
+
+
+def test_decide_user_roles_should_evaluate_many_profiles():
+    authenticator = BrazilDataCubeOAuthenticator(allowed_roles=["user", "admin"], admin_roles=["admin"])
+    profiles = [{"roles": ["jupyter:admin"]}, {"roles": ["jupyter:user"]}, {"roles": ["bdc:admin"]}, None]
+
+    decisions = authenticator.decide_user_roles(profiles)
+
+    assert decisions == [(True, True), (True, False), (False, False), (False, False)]
+    assert decisions == [authenticator.role_matcher.decide(profile or {}) for profile in profiles]
+
+
+def test_qualified_roles_should_keep_the_application_and_role():
+    assert qualified_roles(["jupyter:admin:x", "bdc:user", "invalid"]) == {"jupyter:admin", "bdc:user"}
+    assert qualified_roles(None) == frozenset()
+
+
+def test_role_pattern_set_should_match_exact_wildcard_and_regex_patterns():
+    patterns = RolePatternSet(["admin", "*:superuser", "jupyter:teacher-*", "re:bdc-(stac|wtss):.+"], "jupyter")
+
+    assert patterns.exact == {"jupyter:admin"}
+    assert patterns.matches("jupyter:admin")
+    assert patterns.matches("stac:superuser")
+    assert patterns.matches("jupyter:teacher-geo")
+    assert patterns.matches("bdc-wtss:user")
+    assert not patterns.matches("bdc-wtss:")
+    assert not patterns.matches("bdc:admin")
+    assert not RolePatternSet([], "jupyter")
+
+
+def test_policy_role_matcher_should_decide_with_the_patterns():
+    matcher = PolicyRoleMatcher("jupyter", ["jupyter:*", "re:bdc-.*:user"], ["*:admin"])
+
+    assert matcher.decide({"roles": ["stac:admin", "jupyter:user"]}) == RoleDecision(True, True)
+    assert matcher.decide({"roles": ["bdc-stac:user"]}) == RoleDecision(True, False)
+    assert matcher.decide({"roles": ["bdc:user"]}) == RoleDecision(False, False)
+    assert PolicyRoleMatcher("jupyter", [], []).decide_many([{"roles": ["x:admin"]}, None]) == [
+        RoleDecision(True, False),
+        RoleDecision(True, False),
+    ]
+
+
+def test_matched_roles_should_list_the_roles_used_by_the_decision():
+    profile = {"roles": ["jupyter:user", "jupyter:guest", "bdc:admin"]}
+
+    assert RoleMatcher("jupyter", ["user", "admin"], ["admin"]).matched_roles(profile) == ["jupyter:user"]
+    assert RoleMatcher("jupyter", [], []).matched_roles(profile) == ["jupyter:guest", "jupyter:user"]
+    assert PolicyRoleMatcher("jupyter", ["user"], ["*:admin"]).matched_roles(profile) == [
+        "bdc:admin",
+        "jupyter:user",
+    ]
@@ -0,0 +1,114 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Unit-test for Brazil Data Cube JupyterHub OAuth proactive token refresh."""
+
+import asyncio
+from types import SimpleNamespace
+
+from pytest import mark
+
+from bdc_jupyterhub_oauth.scheduler import TokenRefreshScheduler
+
+
+class FakeTimer:
+    """Manually controlled clock."""
+
+    def __init__(self):
+        self.now = 1000
+
+    def __call__(self):
+        return self.now
+
+
+@mark.asyncio
+async def test_scheduler_should_refresh_only_the_due_users_with_limited_concurrency():
+    timer = FakeTimer()
+    running, peak, refreshed = 0, 0, []
+
+    async def refresh(user):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        refreshed.append(user.name)
+
+    scheduler = TokenRefreshScheduler(refresh, lead_time=60, jitter=0, max_concurrency=2, timer=timer)
+    for i in range(5):
+        scheduler.schedule(SimpleNamespace(name=f"due{i}"), expires_at=1050)
+    scheduler.schedule(SimpleNamespace(name="later"), expires_at=2000)
+
+    await scheduler.run_due()
+
+    assert sorted(refreshed) == [f"due{i}" for i in range(5)]
+    assert peak == 2
+    assert "later" in scheduler and len(scheduler) == 1
+    scheduler.stop()
+
+
+@mark.asyncio
+async def test_scheduler_should_keep_running_when_a_refresh_fails():
+    async def refresh(user):
+        raise RuntimeError("token endpoint is down")
+
+    scheduler = TokenRefreshScheduler(refresh, lead_time=60, jitter=0, timer=FakeTimer())
+    scheduler.schedule(SimpleNamespace(name="user"), expires_at=0)
+
+    await scheduler.run_due()
+
+    assert len(scheduler) == 0
+    scheduler.stop()
+
+
+@mark.asyncio
+async def test_scheduler_should_drop_the_inactive_and_least_recent_users():
+    refreshed = []
+
+    async def refresh(user):
+        refreshed.append(user.name)
+
+    scheduler = TokenRefreshScheduler(
+        refresh,
+        lead_time=60,
+        jitter=0,
+        timer=FakeTimer(),
+        is_active=lambda user: user.name != "idle",
+        max_users=3,
+    )
+    for name in ["evicted", "idle", "active", "evicted"]:
+        scheduler.schedule(SimpleNamespace(name=name), expires_at=0)
+    scheduler.schedule(SimpleNamespace(name="newest"), expires_at=0)
+
+    assert "idle" not in scheduler and len(scheduler) == 3
+
+    scheduler.schedule(SimpleNamespace(name="idle"), expires_at=0)
+    await scheduler.run_due()
+
+    assert sorted(refreshed) == ["evicted", "newest"]
+    assert len(scheduler) == 0
+    scheduler.stop()
+
+
+@mark.asyncio
+async def test_scheduler_should_skip_the_users_unscheduled_during_a_run():
+    refreshed = []
+
+    async def refresh(user):
+        refreshed.append(user.name)
+
+    scheduler = TokenRefreshScheduler(refresh, lead_time=60, jitter=0, timer=FakeTimer())
+    for name in ["first", "logged_out", "third"]:
+        scheduler.schedule(SimpleNamespace(name=name), expires_at=0)
+
+    # e.g. a logout handled before the refresh tasks start.
+    asyncio.get_event_loop().call_soon(scheduler.unschedule, "logged_out")
+    await scheduler.run_due()
+
+    assert sorted(refreshed) == ["first", "third"]
+    scheduler.stop()
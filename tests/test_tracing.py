@@ -0,0 +1,89 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Unit-test for Brazil Data Cube JupyterHub OAuth tracing."""
+
+import asyncio
+import json
+
+from pytest import mark, raises
+
+from bdc_jupyterhub_oauth.tracing import (
+    InMemoryExporter,
+    JSONLinesFileExporter,
+    Tracer,
+)
+
+
+@mark.asyncio
+async def test_tracer_should_nest_the_spans_of_each_task():
+    exporter = InMemoryExporter()
+    tracer = Tracer(exporter)
+
+    async def login(name):
+        with tracer.span("authenticate", user=name):
+            await asyncio.sleep(0.001)
+            with tracer.span("get_token") as span:
+                span.set_attribute("status_code", 200)
+                await asyncio.sleep(0.001)
+
+    await asyncio.gather(login("a"), login("b"))
+
+    roots = {span.span_id: span for span in exporter.spans if span.name == "authenticate"}
+    children = [span for span in exporter.spans if span.name == "get_token"]
+
+    assert len(roots) == len(children) == 2
+    assert {child.parent_id for child in children} == set(roots)
+    assert all(child.trace_id == roots[child.parent_id].trace_id for child in children)
+    assert len({root.trace_id for root in roots.values()}) == 2
+    assert all(span.duration > 0 and span.status == "ok" for span in exporter.spans)
+
+
+def test_tracer_should_record_the_errors_and_ignore_broken_exporters():
+    exporter = InMemoryExporter()
+    tracer = Tracer(exporter)
+
+    with raises(ValueError):
+        with tracer.span("evaluate_roles"):
+            raise ValueError("invalid profile")
+
+    assert exporter.spans[0].status == "error"
+    assert "invalid profile" in exporter.spans[0].attributes["error"]
+
+    class BrokenExporter:
+        def export(self, span):
+            raise OSError("disk full")
+
+    with Tracer(BrokenExporter()).span("authenticate"):
+        pass
+
+
+def test_disabled_tracer_should_not_record_anything():
+    tracer = Tracer()
+
+    with tracer.span("authenticate") as span:
+        span.set_attribute("outcome", "allowed")
+
+    assert not tracer.enabled
+
+
+def test_file_exporter_should_append_json_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = JSONLinesFileExporter(str(path))
+    tracer = Tracer(exporter)
+
+    with tracer.span("authenticate"):
+        with tracer.span("get_user_data", cache_hit=True):
+            pass
+    exporter.close()
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+
+    assert [span["name"] for span in spans] == ["get_user_data", "authenticate"]
+    assert spans[0]["parent_id"] == spans[1]["span_id"]
+    assert spans[0]["attributes"] == {"cache_hit": True}
@@ -0,0 +1,45 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Unit-test for Brazil Data Cube JupyterHub OAuth Utilities."""
+
+from bdc_jupyterhub_oauth import BrazilDataCubeOAuthenticator
+from bdc_jupyterhub_oauth.utils import (
+    convert_user_name_pattern,
+    convert_user_names,
+    find_user_name_collisions,
+)
+
+
+def test_convert_user_name_pattern():
+    assert convert_user_name_pattern("my.email@brazildatacube.org") == "my_email_brazildatacube_org"
+    assert convert_user_name_pattern("a b,c") == "a_b_c"
+
+
+def test_collision_safe_user_names_should_be_distinct_and_stable():
+    first = convert_user_name_pattern("a.b@x", collision_safe=True)
+    second = convert_user_name_pattern("a_b@x", collision_safe=True)
+
+    assert first != second
+    assert first.startswith("a_b_x-")
+    assert convert_user_name_pattern(first, collision_safe=True) == first
+
+
+def test_find_user_name_collisions():
+    names = ["a.b@x", "a_b@x", "c@x"]
+
+    assert find_user_name_collisions(names) == {"a_b_x": ["a.b@x", "a_b@x"]}
+    assert find_user_name_collisions(names, collision_safe=True) == {}
+    assert convert_user_names(names)["c@x"] == "c_x"
+
+
+def test_normalize_username_should_use_the_collision_safe_scheme():
+    authenticator = BrazilDataCubeOAuthenticator(username_collision_safe=True)
+
+    assert authenticator.normalize_username("a.b@x") == convert_user_name_pattern("a.b@x", True)
+    assert BrazilDataCubeOAuthenticator().normalize_username("a.b@x") == "a_b_x"
@@ -0,0 +1,95 @@
+#
+# This file is part of Brazil Data Cube JupyterHub OAuth 2.0.
+# Copyright (C) 2022 INPE.
+#
+# Brazil Data Cube JupyterHub OAuth 2.0 is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+
+"""Unit-test for Brazil Data Cube JupyterHub OAuth persistent warm cache."""
+
+import asyncio
+from types import SimpleNamespace
+
+from pytest import mark
+
+from bdc_jupyterhub_oauth.warmcache import ProfileStore, Revalidator
+
+
+class FakeTimer:
+    """Manually controlled clock."""
+
+    def __init__(self):
+        self.now = 1000
+
+    def __call__(self):
+        return self.now
+
+
+def test_profile_store_should_keep_the_entries_across_connections(tmp_path):
+    path = str(tmp_path / "warm.sqlite")
+    store = ProfileStore(path)
+    store.put("user", {"email": "user@email.com", "roles": ["jupyter:admin"]}, True)
+    store.close()
+
+    entry = ProfileStore(path).get("user")
+
+    assert entry == dict(profile={"email": "user@email.com", "roles": ["jupyter:admin"]}, admin=True)
+
+
+def test_profile_store_should_expire_the_entries(tmp_path):
+    timer = FakeTimer()
+    store = ProfileStore(str(tmp_path / "warm.sqlite"), ttl=60, timer=timer)
+    store.put("old", {}, False)
+    timer.now += 30
+    store.put("new", {}, False)
+
+    timer.now += 45
+
+    assert store.get("old") is None
+    assert store.get("new") is not None
+    assert store.purge_expired() == 1
+
+    store.delete("new")
+    assert store.get("new") is None
+
+
+@mark.asyncio
+async def test_profile_store_should_write_the_changes_in_background(tmp_path):
+    path = str(tmp_path / "warm.sqlite")
+    store = ProfileStore(path, flush_interval=0.01)
+    store.put("user", {"email": "user@email.com"}, False)
+    store.put("removed", {}, False)
+    store.delete("removed")
+
+    assert store.get("user") == dict(profile={"email": "user@email.com"}, admin=False)
+    assert store.get("removed") is None
+    assert ProfileStore(path).get("user") is None
+    assert len(store) == 2
+
+    await asyncio.sleep(0.1)
+
+    assert len(store) == 0
+    assert ProfileStore(path).get("user") == dict(profile={"email": "user@email.com"}, admin=False)
+    assert ProfileStore(path).get("removed") is None
+
+
+@mark.asyncio
+async def test_revalidator_should_validate_each_user_once_at_a_bounded_rate():
+    validated = []
+
+    async def revalidate(user):
+        validated.append((user.name, asyncio.get_event_loop().time()))
+        if user.name == "broken":
+            raise RuntimeError("token endpoint is down")
+
+    revalidator = Revalidator(revalidate, rate=50)
+    for name in ["broken", "a", "a", "b"]:
+        revalidator.submit(SimpleNamespace(name=name))
+    assert len(revalidator) == 3
+
+    await revalidator.join()
+
+    assert [name for name, _ in validated] == ["broken", "a", "b"]
+    assert validated[-1][1] - validated[0][1] >= 2 / 50 * 0.9
+    assert len(revalidator) == 0